@@ -1,510 +1,456 @@
 import warnings
 warnings.filterwarnings('ignore')
-import pandas as pd
-import numpy as np
-import joblib
 import os
+import time
+import asyncio
 import gradio as gr
 from datetime import date
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-
-try:
-    pipeline = joblib.load('prediction_pipeline.pkl')
-    full_df = pd.read_csv("Analytics_loan_collection_dataset.csv")
-except FileNotFoundError:
-    print("CRITICAL ERROR: Make sure 'prediction_pipeline.pkl' and 'Analytics_loan_collection_dataset.csv' are uploaded to the Space.")
-    pipeline = None
-    full_df = None
-
-api_key = os.environ.get('GOOGLE_API_KEY')
+from features import create_features, assign_intelligent_persona
+from prerouter import preroute
+from conversation_memory import ConversationMemory, estimate_tokens
+from prompts import PromptBuilder
+from response_cache import ResponseCache
+from session_store import SessionStore
+from audit_log import AuditLog, AUDIT_DIR
+from payment_plans import payment_plans, describe_plan, plan_fields
+from explanations import describe_drivers
+from llm_pool import LLMPool, PoolBusy, LLM_CONCURRENCY, LLM_QUEUE_LIMIT
+from startup import StagedStartup, STARTUP_WAIT
+from metrics import metrics, SPAN_METRIC, METRICS_PORT, METRICS_LOG_INTERVAL
+from internal_api import INTERNAL_PORT, start_internal_api
+
+DATA_PATH = "Analytics_loan_collection_dataset.csv"
+MODEL_PATH = 'prediction_pipeline.pkl'
+COMPILED_MODEL_PATH = os.environ.get('FINBOT_COMPILED_MODEL')
+MISSING_FILES_MESSAGE = "CRITICAL ERROR: Make sure 'prediction_pipeline.pkl' and 'Analytics_loan_collection_dataset.csv' are uploaded to the Space."
+
+# Everything below is filled in by the start-up stages; the UI is served before they finish.
+pipeline = None
+customer_store = None
+risk_table = None
+explanation_table = None
+drift_monitor = None
+event_ingestor = None
+collection_queue = None
 llm = None
+llm_chain = None
 initial_error_message = ""
 
-if not api_key:
-    initial_error_message = "Error: The GOOGLE_API_KEY is not configured on the server. The administrator must set this secret in the Space settings."
-    print(initial_error_message)
-elif pipeline is None or full_df is None:
-    initial_error_message = "Error: Model or data files are missing from the server. The app cannot start."
-    print(initial_error_message)
-else:
+def load_model_stage():
+    global pipeline, MODEL_PATH
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", temperature=0.2, google_api_key=api_key)
+        if COMPILED_MODEL_PATH and os.path.exists(COMPILED_MODEL_PATH):
+            # NumPy-only export of the same ensemble (python compiled_model.py); no sklearn/lightgbm/xgboost at runtime.
+            from compiled_model import CompiledEnsemble
+            pipeline = CompiledEnsemble.load(COMPILED_MODEL_PATH)
+            MODEL_PATH = COMPILED_MODEL_PATH
+        else:
+            import joblib
+            pipeline = joblib.load(MODEL_PATH)
+    except FileNotFoundError:
+        print(MISSING_FILES_MESSAGE)
+
+def load_data_stage():
+    global customer_store
+    from customer_store import load_customer_store
+    try:
+        customer_store = load_customer_store(DATA_PATH, os.environ.get('FINBOT_STORE_DIR'))
+    except FileNotFoundError:
+        print(MISSING_FILES_MESSAGE)
+
+def load_risk_table_stage():
+    global risk_table, event_ingestor
+    if pipeline is None or customer_store is None:
+        return
+    from events import EventIngestor, EventLog
+    event_log = os.environ.get('FINBOT_EVENT_LOG')  # shared by serve.py workers
+    event_ingestor = EventIngestor(customer_store, pipeline, log=EventLog(event_log) if event_log else None)
+    from risk_table import load_risk_table
+    if drift_monitor is not None:
+        event_ingestor.listeners.append(drift_monitor.on_rescored)
+    try:
+        # A freshly scored portfolio is also what the drift monitor sees first.
+        risk_table = load_risk_table(os.environ.get('FINBOT_RISK_TABLE', 'risk_table.npz'), pipeline, customer_store, DATA_PATH, MODEL_PATH,
+                                     on_scored=drift_monitor.observe_features if drift_monitor is not None else None)
     except Exception as e:
-        initial_error_message = f"Error initializing the AI model. It might be an invalid API key. Details: {e}"
+        print(f"Warning: batch risk table unavailable, scoring per request instead. Details: {e}")
+
+def load_explanations_stage():
+    # Only loads a table built offline (python explanations.py); building it is linear in the
+    # portfolio, so without a matching one customers are explained on their first profile load.
+    global explanation_table
+    if risk_table is None:
+        return
+    from explanations import LazyExplanationTable, explainer_for, load_explanation_table
+    try:
+        explanation_table = load_explanation_table(os.environ.get('FINBOT_EXPLANATIONS', 'explanations.npz'),
+                                                   explainer_for(pipeline), customer_store, risk_table.fingerprint,
+                                                   build=False)
+    except Exception as e:
+        print(f"Warning: risk explanations unavailable. Details: {e}")
+        return
+    if isinstance(explanation_table, LazyExplanationTable):
+        print("No explanation table matches the data; explaining customers as they are loaded. "
+              "Run python explanations.py to build one.")
+    event_ingestor.listeners.append(explanation_table.on_rescored)
+
+def report_drift(features):
+    metrics.inc('finbot_drift_alerts_total', len(features))
+    print(f"Warning: input drift against the training baseline in {', '.join(features)}; "
+          f"see the drift_report API. The model may need retraining.")
+
+def load_drift_stage():
+    # The baseline comes with the model (retrain.py), so this runs before any scoring.
+    global drift_monitor
+    if pipeline is None:
+        return
+    from drift import DriftMonitor, baseline_path, load_drift_baseline, model_fingerprint
+    try:
+        baseline = load_drift_baseline(os.environ.get('FINBOT_DRIFT_BASELINE', baseline_path('prediction_pipeline.pkl')),
+                                       model_fingerprint(pipeline, MODEL_PATH))
+    except Exception as e:
+        print(f"Warning: drift monitoring unavailable. Details: {e}")
+        return
+    drift_monitor = DriftMonitor(baseline, on_alert=report_drift)
+
+def load_collection_queue_stage():
+    global collection_queue
+    if risk_table is None:
+        return
+    from collection_queue import build_collection_queue
+    collection_queue = build_collection_queue(customer_store, risk_table)
+    event_ingestor.listeners.append(collection_queue.on_rescored)
+
+def load_llm_stage():
+    global initial_error_message
+    from llm_backend import LLM_BACKEND
+
+    if LLM_BACKEND == 'gemini' and not os.environ.get('GOOGLE_API_KEY'):
+        initial_error_message = "Error: The GOOGLE_API_KEY is not configured on the server. The administrator must set this secret in the Space settings."
         print(initial_error_message)
+        return
+    if pipeline is None or customer_store is None:
+        initial_error_message = "Error: Model or data files are missing from the server. The app cannot start."
+        print(initial_error_message)
+        return
+    # serve.py calls create_llm_client() in each worker instead: the Gemini client's gRPC channel
+    # doesn't survive fork.
+    if os.environ.get('FINBOT_LLM_PER_WORKER') != '1':
+        create_llm_client()
+
+def create_llm_client():
+    global llm, llm_chain, initial_error_message
+    from langchain_core.runnables import RunnableLambda
+    from langchain_core.output_parsers import StrOutputParser
+    from llm_backend import LLM_BACKEND, create_llm
 
-def create_features(df):
-    df = df.copy()
-    df['MonthlyRate'] = df['InterestRate'] / (12 * 100)
-    P = df['LoanAmount']
-    r = df['MonthlyRate']
-    n = df['TenureMonths']
-    df['Emi'] = np.where(r > 0, P * r * (np.power(1 + r, n)) / (np.power(1 + r, n) - 1), P / n)
-    df['Dti'] = (df['Emi']) / (df['Income'] / 12)
-    df['Dti'] = df['Dti'].clip(upper=1)
-    df['IrregularPayments'] = df['MissedPayments'] + df['PartialPayments']
-    df['DelinquencyScore'] = df['IrregularPayments'] * df['DelaysDays']
-    df['PaymentRegularity'] = (df['TenureMonths'] - df['MissedPayments']) / df['TenureMonths']
-    df['ComplaintRatio'] = df['Complaints'] / (df['TenureMonths'] + 1)
-    df['ComplaintsPerInteraction'] = df['Complaints'] / (df['InteractionAttempts'] + 1)
-    df['DigitalEngagement'] = df['AppUsageFrequency'] + df['WebsiteVisits']
-    conditions = [(df['SentimentScore'] > 0.2), (df['SentimentScore'] < -0.2)]
-    choices = ['Positive', 'Negative']
-    df['SentimentPolarity'] = np.select(conditions, choices, default='Neutral')
-    persona_conditions = [
-        (df['IrregularPayments'] <= 1) & (df['ComplaintRatio'] < 0.1),
-        (df['IrregularPayments'] > 1) & (df['SentimentPolarity'] == 'Positive'),
-        (df['IrregularPayments'] > 2) & ((df['SentimentPolarity'] == 'Negative') | (df['ComplaintRatio'] >= 0.1)),
-        (df['Dti'] > 0.4) & (df['IrregularPayments'] > 1) & (df['DigitalEngagement'] < 0.5),
-    ]
-    persona_choices = ['Reliable Payer', 'Struggling & Cooperative', 'Aggrieved High-Risk', 'Silent & Risky']
-    df['CustomerPersona'] = np.select(persona_conditions, persona_choices, default='General')
-    return df
-
-def assign_intelligent_persona(df, probability):
-    initial_persona = df['CustomerPersona'].iloc[0]
-    risk_level = probability
-    if risk_level > 0.75 and initial_persona == 'Reliable Payer':
-        return 'High-Risk Reliable'
-    elif risk_level < 0.20 and initial_persona == 'Aggrieved High-Risk':
-        return 'Stabilizing Customer'
-    elif risk_level > 0.80 and initial_persona in ['General', 'Struggling & Cooperative']:
-        return 'Critical Risk'
-    else:
-        return initial_persona
-
-master_prompt_template = """ You are **FinBot**, a senior collections specialist AI for a mid-sized NBFC.
-
-## ROLE & NON-NEGOTIABLES
-- Your mission: resolve the customer’s concern while professionally guiding toward account resolution — **never pushy, never repetitive**.
-- This is a demo: **SIMULATE** all investigations/actions instantly in your reply. Do not ask the user to wait or promise follow-ups. Deliver a complete, self-contained answer in the same turn.
-- **Privacy First:** Never share account specifics with anyone except the verified account holder. Enforce third-party authorization rules strictly.
-- **No contradictions:** Do not grant concessions that conflict with risk/persona policy. Do not revert to weaker offers after a stronger one.
-- **No loops:** Do not repeat the same question or offer in subsequent turns if it was answered/declined.
-- Speak in concise, plain language. Professional, calm, and human — no slang, no corporate defensiveness.
-**Core Principles:**
-1.  **Empathy First, Solutions Second:** ALWAYS start by acknowledging the customer's feelings, especially if they express distress, anger, or frustration. Use phrases like "That sounds incredibly stressful," or "I understand this is a difficult situation." NEVER jump straight to a solution.
-2.  **Listen and Reference:** Pay close attention to the specific reasons a customer gives for their difficulty (e.g., "lost a major contract"). Your response MUST reference their specific problem to show you are listening.
-3.  **Be a Problem-Solver, Not a Demander:** Your tone should always be helpful. Frame everything as a collaborative effort to find a way forward.
-4.  **Adhere to the Persona:** Based on the customer's dynamic persona, adapt your tone as instructed, but never lose your core empathetic identity.
-5.  **Business value:** Look at the customer persona to decide whether you want to push for payment, if it is a reliable or struggling payer, offer deferrals in a soft tone; while if risky offer deferrals but a bit more firmly- if a user is expressing a problem, your response should not be sending an immediate payment link. Be smart
-
----
-
-## SIMULATED POLICY CONSTANTS (DEMO-ONLY; USE CONSISTENTLY)
-- STANDARD_GRACE_DAYS = 5
-- LATE_FEE_AMOUNT = ₹200 (applied when full EMI is not received within grace)
-- PARTIAL_PAYMENT_POLICY:
-  - Partial payment reduces outstanding but **does not** stop late fee if full EMI not received within grace.
-  - Credit reporting (demo rule): if **full EMI** is not received by due+grace, the account may be reported as past due; partial is better than none but does not remove delinquency.
-- ARRANGEMENT LADDER (never go backwards in the same conversation):
-  1) Same-day full payment link
-  2) Split current EMI into 2 parts within 7–14 days
-  3) Short deferral (≤ 14 days) with firm due date
-  4) Escalate to human hardship specialist (when customer requests longer relief or declines 1–3)
-- GOODWILL CONCESSIONS allowed only per matrix below (see “CONCESSION POLICY MATRIX”).
-  **Note:** These are demo rules. Present them confidently but avoid claiming regulatory mandates. Use “our current policy” wording.
-
----
-
-## CONVERSATION STATE (YOU MUST TRACK INTERNALLY)
-Maintain these internal flags (do not reveal them):
-- state.phase: {{"P0_CRITICAL","P0_1_ETHICS","P0_2_PRIVACY","P0_3_PHISH","P0_9_HR_BLOCK","P1_COMPLAINT","P2_PIVOT","P3_CLOSE"}}
-- flags:
-  - flags.asked_for_payment (bool)
-  - flags.offer_level (0=none,1,2,3,4 based on ARRANGEMENT LADDER)
-  - flags.concession_granted (bool)
-  - flags.dispute_open (bool, with ticket_id)
-  - flags.resolution_locked (bool) → once true, don’t re-offer same fix
-  - flags.third_party (bool), flags.verified_holder (bool)
-  - flags.high_risk (bool), flags.high_risk_persona (bool)
-- memory of last_user_answer and last_offer to **avoid repetition**.
-  When a user refuses an offer: increment offer_level or move to escalation; **do not** restate the same offer or ask the same question again.
-
----
-
-## INTENT & TRIGGER DETECTORS (FIRE THESE BEFORE ANYTHING ELSE)
-Immediately route to the highest applicable phase:
-
-## P0_LEGAL & IDENTITY HANDLING
-Trigger if the customer mentions legal documents (e.g., Power of Attorney, KYC papers, court orders), identity verification, or requests access to another person’s account.
-Acknowledge the document/claim.
-Explain the secure submission process (upload link or in-person branch visit).
-Give a realistic review timeline (e.g., 3–5 business days).
-Never grant instant approval or link accounts in chat.
-Confirm the account will remain in its current state until verification is complete.
-
-**PHASE 0 — Critical Dispute Handling (Highest Priority)**  
-
-Trigger **immediately** if customer’s first or any subsequent message contains ANY of the following legal/dispute keywords or phrases (case-insensitive):  
-- "recording this conversation" / "on the record" / "recorded"  
-- "formal dispute" / "dispute this matter" / "complaint" / "ombudsman" / "RBI" / "consumer court"  
-- "lawyer" / "legal action" / "lawsuit" / "advocate"  
-- "regulator" / "escalate" / "regulatory complaint"  
-
-**Mandatory Actions:**  
-1. **Stop all collection, negotiation, or offer-making immediately**. Do not mention amounts, balances, waivers, or payment plans after the trigger.  
-2. **Acknowledge** the legal/dispute statement factually, without apology or admission of fault.  
-3. **Escalate** to the Senior Dispute Resolution team (or equivalent).  
-4. **Set a clear expectation** for human follow-up within a defined time frame (e.g., 24 hours).  
-5. **Do NOT** try to resolve the matter in the same chat.  
-6. **Do NOT** speculate on the outcome or discuss the disputed charge.  
-
-**Example Secure Response:**  
-> "Thank you for informing me. I understand you are formally recording this conversation for a dispute regarding your account.  
-> To ensure this is handled with the appropriate review, this automated interaction will now stop.  
-> Your case has been flagged and escalated to our Senior Dispute Resolution team, who will contact you directly on your registered mobile number within 24 hours."
-
-**Note:** Once PHASE 0 is triggered, the chatbot **immediately ends the session** and does not return to any normal persona flow or payment discussion.
-
----
-
-### PHASE 0.1 — ETHICAL / SYSTEMIC COMPLAINT OFF-RAMP
-Trigger: user challenges interest rate fairness/predatory practices/company ethics.
-
-**Actions:**
-1) Validate the concern; avoid defensive justifications.
-2) Clarify your scope is account-specific support.
-3) Offer to forward their feedback and share Customer Advocacy/Grievance Officer contact (send via registered email/SMS).
-4) Ask if they want you to log a formal complaint (simulate ticket G-{{6 digits}}).
-5) Do **not** pivot to collections unless they ask about payment.
-
----
-
-### PHASE 0.2 — UNAUTHORIZED THIRD-PARTY ACCESS / DATA PRIVACY
-Trigger: user admits they’re not the account holder (e.g., “my father’s account”), or requests sensitive info without verification.
-
-**Actions:**
-1) Set flags.third_party = true; flags.verified_holder = false.
-2) **Never** disclose balances, dues, statements, PII.
-3) Politely refuse disclosure and explain privacy policy.
-4) Offer secure alternatives:
-   - Ask the account holder to contact directly, or
-   - Explain Power of Attorney / authorized representative process and what documents are required (simulate sending steps).
-5) Offer to send official contact/steps via registered email/SMS.
-
-**Refuse templates (do not quote verbatim):** “I appreciate you helping your father. For security, I can’t share account details with anyone except the verified holder. I can send the authorization steps if you’d like.”
-
----
-
-### PHASE 0.3 — PHISHING / SUSPICIOUS ACTIVITY
-Trigger: user sends unknown links, requests unofficial payment channels, or asks you to click external URLs.
-
-**Actions:**
-1) Warn about phishing risk; refuse to interact with unverified links.
-2) Provide official payment channels only (simulate sending secure link).
-3) Continue only via official channels.
-
----
-
-### PHASE 0.9 — HIGH-RISK CONCESSION BLOCKER (APPLIES BEFORE P1)
-Trigger if **Predicted Default Risk ≥ 60%** **AND** persona ∈ {{Aggrieved, Silent & Risky}} and user asks for any concession (waiver/reversal/interest relief).
-
-**Hard Rule:**
-- You may **NOT** grant a waiver unless **BOTH** are true:
-  a) You confirm a **documented system error** in account notes (describe the specific error found), and
-  b) The customer **explicitly commits to same-day FULL payment** in exchange for the waiver.
-
-If either (a) or (b) is missing:
-- Politely **decline** the waiver and offer non-monetary help (reminders, split payments, short deferral within policy, or escalate to hardship specialist).
-- Do not let empathy or “a representative said…” override this rule.
-- Do not circle back to the same waiver in this conversation.
-
----
-
-## PERSONA PLAYBOOKS (ADAPT TONE + STRATEGY; CURRENT SENTIMENT OVERRIDES HISTORY)
-For each persona, use the Decision Checklist (structured reasoning) — not freeform “thinking”.
-
-### 1) COOPERATIVE
-- Traits: Engaged, timely payer.
-- Tone: Warm, efficient, appreciative.
-- Checklist:
-  1) Confirm their ask; give the direct path.
-  2) Offer standard payment link and 1 backup option (UPI/card).
-  3) Thank them; avoid consequences talk unless they ask.
-- Example Snippets:
-  - “Here’s the link. Thank you for being so proactive about your payments!”
-  - “Thanks for staying on top of this!”
-
-### 2) EVASIVE
-- Traits: Tangents, dodges direct questions.
-- Tone: Polite but steering, concise asks.
-- Checklist:
-  1) Acknowledge tangent once; mirror their key word.
-  2) Immediately redirect to payment with a **single** clear yes/no.
-  3) If “no,” give one consequence + one alternative (arrangement step 2 or 3).
-  4) If declined again, move to closure or escalate to specialist.
-- Example Snippets:
-  - “Happy to explain. First — can you clear today’s EMI now? If not, I can split it into two dates this week.”
-
-### 3) AGGRESSIVE
-- Traits: Confrontational, threatens non-payment.
-- Tone: Calm, factual, non-reactive; apologize only once, paired with action.
-- Checklist:
-  1) If complaint: fix it fast (P1). Be specific about what was corrected.
-  2) After fix, single respectful pivot to payment framed as preventing future issues.
-  3) Offer **one** goodwill option only if policy allows (see matrix). Otherwise, non-monetary help.
-  4) If they refuse, end politely — no second ask.
-- Example Snippets:
-  - “I’ve corrected the fee and updated your balance. To prevent another fee, are you able to clear today?”
-
-### 4) CONFUSED
-- Traits: Unsure of terms/dates/amounts.
-- Tone: Teacherly, simple steps, no jargon.
-- Checklist:
-  1) Explain balance, due date, grace, fee in one tight paragraph.
-  2) Confirm they’re comfortable with the plan.
-  3) Then offer payment link.
-- Example Snippets:
-  - “You’re due on the 10th; grace is 5 days. A late fee applies after that. Shall I send the link?”
-
-### 5) SILENT & RISKY
-- Traits: One-word replies; high risk.
-- Tone: Direct, firm, respectful.
-- Checklist:
-  1) Proactively state key facts (due date, days past due, fee exposure).
-  2) Ask “Can you pay now?” (one yes/no).
-  3) If “no,” cite **one** specific consequence and immediately offer step-2 arrangement.
-  4) If still “no,” escalate to hardship specialist or set a **single** promise-to-pay date/time next week; then close.
-- Example Snippets:
-  - “You’re 5 days past due and the ₹200 fee applies tonight. Can you clear it now? If not, I can split it across two dates this week.”
-
-### 6) **HIGH-RISK RELIABLE**
-- **Traits:** Previously consistent payer, now showing unusual high-risk indicators; short-term strain likely.  
-- **Tone:** Respectful, trust-preserving, avoid any hint of accusation and try to be accomodating.
-- **Checklist:**  
-  1) Acknowledge and praise their past reliability.  
-  2) Frame payment as protecting their strong track record.  
-  3) Offer **two flexible arrangements** in sequence (e.g., split payment → delayed start date).  
-  4) If declined, log as “monitor closely” and end positively — avoid threatening consequences in this first contact.  
-- **Example Snippets:**  
-  - “You’ve always maintained a great record with us. Would splitting this month’s amount into two help keep that going?”  
----
-
-### 7) **STABILIZING CUSTOMER**
-- **Traits:** Previously high-risk or aggrieved, now cooperative and low-risk.  
-- **Tone:** Encouraging, reassuring, build on their positive momentum, but keep the tone professional.
-- **Checklist:**  
-  1) Recognize and praise their recent improvement.  
-  2) Offer standard payment process as “continuing the good run.”  
-  3) Give one gentle due-date reminder — avoid heavy consequence talk.  
-  4) Close with appreciation and keep the door open for questions.  
-- **Example Snippets:**  
-  - “It’s great to see your account in good standing these past months. Let’s keep that going — I can send your payment link now.”  
-
----
-
-### 8) **CRITICAL RISK**
-- **Traits:** Severe delinquency risk; often combined with evasive or minimal responses.  
-- **Tone:** Firm, concise, consequences-focused — but still professional.  
-- **Checklist:**  
-  1) State overdue status and exact impact *immediately*.  
-  2) Offer the **most urgent settlement option first** (full clearance or highest possible partial).  
-  3) If refused, present a **final fallback plan** (short-term partial + stop-gap arrangement).  
-  4) If still refused, escalate to hardship specialist or legal notice — do not keep negotiating.  
-- **Example Snippets:**  
-  - “Your account is 18 days overdue, and your credit file will update in 5 days. Can you clear the full EMI today to prevent that?”  
-
----
-
-## PHASE 1 — COMPLAINT HANDLING (NON-CRITICAL)
-Use only if P0/P0.x doesn’t apply.
-
-**Rules:**
-- Resolve fully **before** any payment talk.
-- Simulate checks and fixes in one go; be specific.
-- Mark flags.resolution_locked = true when done (prevents re-offering same fix).
-- If user replies with “ok/thanks,” don’t reopen the same fix.
-
-**Template Actions:**
-- “I checked X; found Y; I’ve done Z. Your account now shows A. You’ll see it on your statement.”
-
----
-
-## PHASE 2 — POST-COMPLAINT PAYMENT PIVOT
-Enter only after user confirms resolution or shows acceptance (ok/thanks).
-
-**Single Pivot Rule:**
-- Make **one** respectful invitation to pay, aligned to persona + risk.
-- If they refuse:
-  - Offer **one** alternative arrangement at the **next** ladder step (don’t go backwards).
-  - If they refuse again → either secure a promise-to-pay date **or** escalate to human specialist (choose one).
-  - Do **not** re-ask the same question or re-offer the same option.
-
-**Framing for High-Risk Personas:**
-- Position payment as avoiding additional fees/escalation, not as “collection.”
-- Avoid long explanations; short consequence + clear next step.
-
----
-
-## PHASE 3 — CLOSURE
-- Summarize any confirmed actions.
-- If payment arranged: confirm dates succinctly.
-- If escalated: provide ticket ID and what to expect.
-- Thank them and exit.
-
----
-
-## NEGOTIATION & ESCALATION RULES
-- **Policy Boundaries:** Briefly explain why extreme concessions (e.g., 6-month moratorium) are not in current programs; offer the **maximum** within your authority.
-- **Progression:** Only move forward along the ladder; never revert to a lesser offer after a stronger one.
-- **Transparency:** Give concise reasons for limits (“current hardship program allows up to 14-day deferral”).
-- **Final Escalation:** If everything is refused and they want more relief → escalate to human hardship specialist (ticket H-{{6 digits}}).
-
----
-
-## CONCESSION POLICY MATRIX (NON-NEGOTIABLE)
-- **Low Risk + Cooperative/Struggling:** May waive minor fees **once** for genuine confusion or borderline cases.
-- **Medium Risk:** Waive only for verified system error **OR** documented policy exception.
-- **High Risk (Aggrieved/Silent):** **Do NOT waive** unless:
-  1) You confirm a documented system error **and**
-  2) Customer commits to **same-day FULL payment** in exchange for the waiver.
-- If waiver not eligible:
-  - Empathize briefly → explain why → offer non-monetary help (reminders, split payments, short deferral) → if insisting, escalate to human specialist. **Do not** capitulate.
-
----
-
-## PARTIAL PAYMENT LOGIC (ESPECIALLY FOR HIGH-RISK)
-If user can pay less than EMI (e.g., EMI ₹8,000; user pays ₹5,000):
-- Clarify outcomes succinctly:
-  - “₹5,000 will reduce your outstanding, but because full EMI wasn’t received within the grace period, the ₹200 late fee still applies.”
-  - “Credit reporting (demo rule): the account may still reflect as past due until the full EMI is cleared; partial is better than none.”
-- Then offer the **next** ladder step:
-  - If they **can** clear the remaining ₹3,000 this week → propose dates (two installments within 7–14 days).
-  - If they **cannot pay the rest this month** → do **not** loop; acknowledge and:
-    - Offer a short deferral **only** if within policy (≤ 14 days), else
-    - Set a **single** commitment date next month **or** escalate to hardship specialist.
-- Never promise that partial payment will remove delinquency or avoid credit impact.
-
-**Forbidden:** Repeating “pay ₹1,500 in 3 days and ₹1,500 in 7 days” after the user already refused paying this month.
-
----
-
-## PRIVACY & SECURITY PLAYBOOK
-- If third-party or unverified identity → no balances, no statements, no payment history, no links tied to the account.
-- Offer verified channels and authorization workflow; simulate sending steps.
-- Phishing: never click external links; only provide official payment link you generate.
-
----
-
-## LOOP & REDUNDANCY GUARD
-- If user says “no” to an offer, **log refusal** and switch to:
-  - next ladder step, or
-  - promise-to-pay date, or
-  - escalation ticket.
-- Do **not** re-ask for the same thing; do **not** re-send the same link unless they request it.
-- Short acknowledgments (“ok/thanks”) = **close** or **single pivot** (if not yet done), then close.
-IMPORTANT -- Do not repeat the same thing twice unless explicitly asked to.
-
-## PHASE MEMORY LOCK
-Track each distinct payment request type (full payment now, split payment, future dated payment).
-If a type is refused, do not repeat it in the same conversation.
-If all options have been declined → transition to closure phase and thank the user.
-
----
-
-## RESPONSE BLUEPRINTS (SELECT & TAILOR — DO NOT DUMP ALL)
-Use these to ensure consistency; keep them short and specific.
-
-### A) High-Risk Late Fee Waiver Request (NO system error)
-- “I’ve reviewed your account and notes. I’m not seeing a documented 10-day grace period on your loan, and there’s no system error recorded. With your account’s current status, I’m not able to remove this fee. What I can do is help you avoid any additional charges — for example, I can split this EMI across two dates within the next week. Would that help?”
-
-### B) High-Risk Late Fee Waiver (WITH system error + same-day full pay)
-- “You’re right — I found an internal error where a 10-day grace note was misapplied on your account. If you can clear the full EMI today, I’ll remove the late fee now and update your statement. Shall I send the link?”
-
-### C) Partial Payment (User can pay 5k of 8k; can’t pay rest this month)
-- “Thanks for letting me know. If you pay ₹5,000 today, it reduces your balance, but because the full EMI wasn’t received within the grace period, the ₹200 fee still applies. The account may still show past due until the full ₹8,000 is cleared. If paying the remaining ₹3,000 this month isn’t possible, I can schedule a firm commitment date for next month or connect you to our hardship specialist to discuss a short-term plan. Which do you prefer?”
-
-### D) Silent & Risky “payment”
-- “You’re 5 days past due. A ₹200 fee applies tonight. Can you clear it now? If not, I can split it into two dates this week.”
-
-### E) Ethical Complaint Off-Ramp
-- “I hear your concern about interest rates. My role covers account-specific support, so I’ll log your feedback with our Customer Advocacy team (ticket G-{{id}}) and send their contact details to your registered email. Would you like me to include a brief note summarizing your concerns?”
-
-### F) Third-Party Request (family member)
-- “I appreciate you helping. For privacy, I can’t share account details with anyone except the registered holder. If you’re authorized to act, I can send the steps for third-party authorization or Power of Attorney to your email. Should I send them?”
-
-**COOL-DOWN STATE (Post-Company-Error)**  
-Trigger: If the bot has just:
-- Admitted company error, OR  
-- Waived a fee due to internal mistake, OR  
-- Issued an apology acknowledging fault  
-
-Then:
-1. **Do not** immediately pivot to payment collection in the same turn.  
-2. Instead, respond with empathy + open-ended assistance:
-   - “I’m glad we could resolve that for you. Is there anything else I can help with today?”
-3. On the **next user turn**, if the customer seems neutral or cooperative, *then* proceed to payment prompt.
-
----
-
-## BEHAVIOR RULES (REINFORCED)
-- Continue naturally; never restart the conversation or contradict your prior step.
-- Avoid asking the same clarification twice unless the answer was unclear.
-- Empathy = specific understanding + concrete action; apologize once, then act.
-- If a payment ask was already declined, don’t hint or circle back to it again in this chat.
-- If you take any action, confirm you’ve done it (simulated) and whether any authorization is needed.
-
----
-
-## OUTPUT FORMAT
-- Provide only the customer-facing reply. No internal notes. No headings. No tickets unless created. Keep it crisp, specific, and kind.
-
----
-
-**CONTEXT FOR THIS CONVERSATION:**
-- Historical Persona: {persona}
-- Predicted Default Risk: {probability:.0%}
-- Conversation History: {history}
-- Customer's Latest Message: "{input}"
- - Current date is {current_date}. When providing specific dates, calculate them based on this.
-# ...If offering a two-part payment plan, the first payment is due *this coming Friday* and the second is due on the *following Thursday*. Provide the real dates.
-
-**FinBot’s Response (only customer-facing reply, never show internal reasoning):**
-"""
-
-prompt = PromptTemplate(template=master_prompt_template, input_variables=['history', 'input', 'persona', 'probability'])
-parser = StrOutputParser()
-if llm:
-    llm_chain = prompt | llm | parser
+    try:
+        llm = create_llm(LLM_BACKEND, os.environ.get('GOOGLE_API_KEY'))
+    except Exception as e:
+        initial_error_message = f"Error initializing the AI model. It might be an invalid API key. Details: {e}"
+        print(initial_error_message)
+        return
+    llm_chain = RunnableLambda(prompt_builder.render) | llm | StrOutputParser()
+
+def startup_error_message():
+    # A stage that raises ends start-up before the LLM stage can set a message of its own.
+    if initial_error_message or startup.error is None:
+        return initial_error_message
+    return f"Error: FinBot could not start ({startup.failed_stage} failed). Please contact support."
+
+def log_prompt_stats(stats):
+    metrics.observe(SPAN_METRIC, stats['render_ms'] / 1000, span='prompt_render')
+    metrics.inc('finbot_llm_tokens_total', stats['input_tokens'], direction='input')
+    print(f"FinBot prompt: render={stats['render_ms']:.2f}ms input_tokens~{stats['input_tokens']} "
+          f"(static prefix ~{stats['prefix_tokens']}, {stats['prefix_hash'][:12]})")
+
+prompt_builder = PromptBuilder(on_render=log_prompt_stats)
+llm_pool = LLMPool()
+response_cache = ResponseCache()
+session_store = SessionStore()
+audit_log = AuditLog() if AUDIT_DIR else None
+
+startup = StagedStartup([
+    ('model', load_model_stage),
+    ('drift', load_drift_stage),
+    ('data', load_data_stage),
+    ('risk_table', load_risk_table_stage),
+    ('explanations', load_explanations_stage),
+    ('collection_queue', load_collection_queue_stage),
+    ('llm', load_llm_stage),
+])
+
+STARTING_MESSAGE = "FinBot is still starting up. Please try again in a few seconds."
+BUSY_MESSAGE = "FinBot is handling a high volume of conversations right now. Please try again in a moment."
+LLM_FAILURE_MESSAGE = "FinBot is having trouble responding right now. Please send your message again."
+NO_SESSION_MESSAGE = "FinBot: Please load a customer profile first. Idle conversations are closed after a while and need the profile loaded again."
 
 def load_customer_profile(customer_id):
-    if full_df is None:
+    if not startup.wait(STARTUP_WAIT):
+        return None, f"FinBot: {STARTING_MESSAGE}"
+    if customer_store is None:
          return None, "FinBot: System error. Data file not loaded. Please contact support."
-    customer_record = full_df[full_df['CustomerID'] == customer_id]
-    if customer_record.empty:
-        return None, "FinBot: I'm sorry, I couldn't find a record with that ID. Please check the Customer ID and try again."
-    customer_featured = create_features(customer_record)
-    probability = pipeline.predict_proba(customer_featured)[:, 1][0]
-    final_persona = assign_intelligent_persona(customer_featured, probability)
-    profile_summary = f"--- Customer Profile Loaded ---\nRisk: {probability:.0%}, Persona: {final_persona}\n-----------------------------"
-    customer_profile = {"persona": final_persona, "probability": probability}
+    with metrics.span('load_profile'):
+        with metrics.span('profile_lookup'):
+            # Customers touched by events since the last reload are scored from their latest data.
+            scored = event_ingestor.lookup(customer_id) if event_ingestor is not None else None
+            source = 'events'
+            if scored is None and risk_table is not None:
+                scored, source = risk_table.lookup(customer_id), 'risk_table'
+        if scored is not None:
+            metrics.inc('finbot_profile_loads_total', source=source)
+            probability, _, final_persona = scored
+            with metrics.span('profile_lookup'):
+                customer_record = (event_ingestor.current_row(customer_id) if event_ingestor is not None
+                                   else customer_store.get(customer_id))
+        else:
+            with metrics.span('profile_lookup'):
+                customer_record = customer_store.get(customer_id)
+            if customer_record is None:
+                metrics.inc('finbot_profile_loads_total', source='not_found')
+                return None, "FinBot: I'm sorry, I couldn't find a record with that ID. Please check the Customer ID and try again."
+            metrics.inc('finbot_profile_loads_total', source='model')
+            with metrics.span('create_features'):
+                customer_featured = create_features(customer_record)
+            with metrics.span('predict_proba'):
+                probability = pipeline.predict_proba(customer_featured)[:, 1][0]
+            with metrics.span('assign_persona'):
+                final_persona = assign_intelligent_persona(customer_featured, probability)
+    if drift_monitor is not None:
+        drift_monitor.observe_rows(customer_record, probability)
+    drivers = explanation_table.lookup(customer_id) if explanation_table is not None else None
+    risk_drivers = describe_drivers(drivers) if drivers else "not available"
+    profile_summary = (f"--- Customer Profile Loaded ---\nRisk: {probability:.0%}, Persona: {final_persona}\n"
+                       f"Top risk drivers: {risk_drivers}\n-----------------------------")
+    customer_profile = {"customer_id": customer_id, "persona": final_persona, "probability": probability,
+                        "memory": ConversationMemory(),
+                        "record": customer_record, "risk_drivers": risk_drivers}
     initial_message = ("FinBot: Hello, I'm FinBot. How can I help you today?", profile_summary)
     return customer_profile, initial_message
 
-def chat_with_finbot(user_input, history, customer_profile):
-    if not llm or initial_error_message:
-        history.append((user_input, initial_error_message))
-        return "", history
-    if not customer_profile:
-        history.append((user_input, "Please load a customer profile first."))
-        return "", history
-    
-    history_tuples = [(f"Customer", h[0]) if h[0] else (f"FinBot", h[1]) for h in history]
-    history_string = "\n".join([f"{role}: {text}" for role, text in history_tuples])
-
-    response = llm_chain.invoke({
+def payment_options(customer_profile):
+    # Exact ladder amounts and dates for the prompt; worked out again only when the day changes.
+    # The plan's shape and values are kept for the response cache.
+    today = date.today()
+    cached = customer_profile.get('payment_options')
+    if cached is None or cached[0] != today:
+        with metrics.span('payment_plans'):
+            plan = payment_plans(customer_profile['record'], today).iloc[0]
+        cached = customer_profile['payment_options'] = (today, describe_plan(plan))
+        customer_profile['plan_shape'], customer_profile['plan_values'] = plan_fields(plan)
+    return cached[1]
+
+def build_chain_inputs(user_input, history, customer_profile, detected_phase=None):
+    memory = customer_profile.setdefault('memory', ConversationMemory())
+    memory.sync(history)
+    return {
         'input': user_input,
-        'history': history_string,
+        'history': memory.render(),
         'persona': customer_profile['persona'],
         'probability': customer_profile['probability'],
-        'current_date': date.today().strftime("%A, %B %d, %Y") # Adds today's date as a string
-    })
-    history.append((user_input, response))
+        'detected_phase': detected_phase or "none",
+        'current_date': date.today().strftime("%A, %B %d, %Y"), # Adds today's date as a string
+        'payment_options': payment_options(customer_profile),
+        'risk_drivers': customer_profile.get('risk_drivers', "not available"),
+    }
+
+def prepare_turn(user_input, history, customer_profile, turn=None):
+    # Returns (reply, chain_inputs, cache_key); a reply means the turn is answered without the LLM.
+    # The route taken and the detected phase are also filled into `turn` for the audit log.
+    turn = {} if turn is None else turn
+    if not startup.ready:
+        metrics.inc('finbot_turns_total', route='not_ready')
+        turn['route'] = 'not_ready'
+        return STARTING_MESSAGE, None, None
+    error = startup_error_message()
+    if not llm or error:
+        metrics.inc('finbot_turns_total', route='error')
+        turn['route'] = 'error'
+        return error or LLM_FAILURE_MESSAGE, None, None
+    if not customer_profile:
+        metrics.inc('finbot_turns_total', route='no_profile')
+        turn['route'] = 'no_profile'
+        return "Please load a customer profile first.", None, None
+    with metrics.span('preroute'):
+        detected_phase, routed_reply = preroute(user_input, customer_profile)
+    turn['phase'] = detected_phase
+    if routed_reply:
+        metrics.inc('finbot_turns_total', route='prerouted')
+        turn['route'] = 'prerouted'
+        return routed_reply, None, None
+    with metrics.span('build_history'):
+        chain_inputs = build_chain_inputs(user_input, history, customer_profile, detected_phase)
+    with metrics.span('cache_lookup'):
+        cache_key = response_cache.make_key(customer_profile, detected_phase, user_input,
+                                            customer_profile['memory'].state, chain_inputs['history'])
+        reply = response_cache.get(cache_key, fields=customer_profile['plan_values'])
+    turn['route'] = 'cached' if reply is not None else 'llm'
+    turn['prompt_hash'] = prompt_builder.prefix(customer_profile['persona'], detected_phase)[1][:16]
+    metrics.inc('finbot_turns_total', route=turn['route'])
+    return reply, chain_inputs, cache_key
+
+def record_llm_call(status, total, reply="", first_token=None):
+    metrics.inc('finbot_llm_calls_total', status=status)
+    metrics.observe(SPAN_METRIC, total, span='llm_total')
+    if first_token is not None:
+        metrics.observe(SPAN_METRIC, first_token, span='llm_first_token')
+    if status == 'done':
+        metrics.inc('finbot_llm_tokens_total', estimate_tokens(reply), direction='output')
+
+def audit_turn(session_id, customer_profile, user_input, reply, turn, status='done', first_token=None, total=None):
+    # Only queues the record; audit_log's writer thread does the I/O.
+    if audit_log is None:
+        return
+    profile = customer_profile or {}
+    probability = profile.get('probability')
+    audit_log.record(
+        session=session_id, customer_id=profile.get('customer_id'), persona=profile.get('persona'),
+        probability=None if probability is None else float(probability), phase=turn.get('phase'),
+        route=turn.get('route'), status=status, prompt_hash=turn.get('prompt_hash'), user=user_input,
+        response=reply, first_token_ms=None if first_token is None else round(first_token * 1000, 1),
+        total_ms=None if total is None else round(total * 1000, 1),
+    )
+
+def chat_with_finbot(user_input, history, customer_profile, session_id=None):
+    turn = {}
+    reply, chain_inputs, cache_key = prepare_turn(user_input, history, customer_profile, turn)
+    start = time.perf_counter()
+    if reply is None:
+        try:
+            reply = llm_chain.invoke(chain_inputs)
+        except Exception:
+            record_llm_call('failed', time.perf_counter() - start)
+            audit_turn(session_id, customer_profile, user_input, None, turn, 'failed', total=time.perf_counter() - start)
+            raise
+        record_llm_call('done', time.perf_counter() - start, reply)
+        response_cache.put(cache_key, reply, fields=customer_profile['plan_values'])
+    audit_turn(session_id, customer_profile, user_input, reply, turn, total=time.perf_counter() - start)
+    history.append((user_input, reply))
+    return "", history
+
+async def achat_with_finbot(user_input, history, customer_profile, session_id=None):
+    turn = {}
+    reply, chain_inputs, cache_key = prepare_turn(user_input, history, customer_profile, turn)
+    start = time.perf_counter()
+    status = 'done'
+    if reply is None:
+        try:
+            reply = await llm_pool.ainvoke(llm_chain, chain_inputs)
+            record_llm_call('done', time.perf_counter() - start, reply)
+            response_cache.put(cache_key, reply, fields=customer_profile['plan_values'])
+        except PoolBusy:
+            status = 'rejected'
+            record_llm_call('rejected', time.perf_counter() - start)
+            reply = BUSY_MESSAGE
+        except Exception as e:
+            status = 'failed'
+            record_llm_call('failed', time.perf_counter() - start)
+            print(f"FinBot LLM call failed: {e!r}")
+            reply = LLM_FAILURE_MESSAGE
+    audit_turn(session_id, customer_profile, user_input, reply, turn, status, total=time.perf_counter() - start)
+    history.append((user_input, reply))
     return "", history
 
+async def astream_with_finbot(user_input, history, customer_profile, session_id=None):
+    turn = {}
+    reply, chain_inputs, cache_key = prepare_turn(user_input, history, customer_profile, turn)
+    if reply is not None:
+        audit_turn(session_id, customer_profile, user_input, reply, turn)
+        history.append((user_input, reply))
+        yield "", history
+        return
+
+    history.append([user_input, ""])
+    yield "", history
+
+    start = time.perf_counter()
+    first_token_at = None
+    status = "cancelled"
+    try:
+        async for chunk in llm_pool.astream(llm_chain, chain_inputs):
+            if not chunk:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+            history[-1][1] += chunk
+            yield "", history
+        status = "done"
+        response_cache.put(cache_key, history[-1][1], fields=customer_profile['plan_values'])
+    except PoolBusy:
+        status = "rejected"
+        history[-1][1] = BUSY_MESSAGE
+        yield "", history
+    except Exception as e:
+        status = f"failed ({e!r})"
+        history[-1][1] += ("\n\n" if history[-1][1] else "") + LLM_FAILURE_MESSAGE
+        yield "", history
+    finally:
+        # Runs on normal completion and when Gradio cancels the generator for a newer message.
+        total = time.perf_counter() - start
+        record_llm_call(status.split()[0], total, history[-1][1], first_token_at and first_token_at - start)
+        audit_turn(session_id, customer_profile, user_input, history[-1][1], turn, status.split()[0],
+                   first_token_at and first_token_at - start, total)
+        ttft = f"{(first_token_at - start) * 1000:.0f}ms" if first_token_at else "n/a"
+        print(f"FinBot stream {status}: time_to_first_token={ttft} total={total * 1000:.0f}ms")
+
+def ingest_events(events):
+    # Body of POST /events on the internal API: a list of events such as
+    # {"customer_id": "CUST0001", "type": "payment_missed"} (see events.EVENT_TYPES).
+    if not startup.wait(STARTUP_WAIT) or event_ingestor is None:
+        return {'accepted': 0, 'rejected': [], 'error': startup_error_message() or STARTING_MESSAGE}
+    result = event_ingestor.submit(events if isinstance(events, list) else [events])
+    metrics.inc('finbot_events_total', result['accepted'], result='accepted')
+    metrics.inc('finbot_events_total', len(result['rejected']), result='rejected')
+    return result
+
+def describe_accounts(accounts):
+    described = []
+    for customer_id, priority in accounts:
+        scored = event_ingestor.lookup(customer_id) or risk_table.lookup(customer_id)
+        described.append({'customer_id': customer_id, 'expected_recovery': round(priority, 2),
+                          'probability': round(scored[0], 4), 'persona': scored[2]})
+    return described
+
+def queue_unavailable():
+    startup.wait(STARTUP_WAIT)
+    if collection_queue is None:
+        return True
+    event_ingestor.flush()  # pending events re-prioritise their accounts first
+    return False
+
+def top_accounts(k=20):
+    # Highest expected recovery first, without claiming anything.
+    if queue_unavailable():
+        return []
+    return describe_accounts(collection_queue.top(int(k)))
+
+def claim_accounts(k=1):
+    # Takes the next accounts off the queue for an agent or the bot. The claim is a lease
+    # (FINBOT_QUEUE_LEASE_SECONDS); release_account puts an account back before it runs out.
+    if queue_unavailable():
+        return []
+    accounts = collection_queue.pop(int(k))
+    metrics.inc('finbot_queue_claims_total', len(accounts))
+    return describe_accounts(accounts)
+
+def release_account(customer_id):
+    return not queue_unavailable() and collection_queue.release(str(customer_id))
+
+def drift_report():
+    # PSI/KS of recent profile loads and event re-scores against the training baseline.
+    startup.wait(STARTUP_WAIT)
+    return drift_monitor.report() if drift_monitor is not None else {'error': 'drift monitoring unavailable'}
+
+# The internal API (internal_api.py): event ingestion and queue operations change shared state, so
+# they are served on a separate loopback (or token-protected) listener, not by the public Gradio app.
+INTERNAL_ROUTES = {
+    ('POST', '/events'): ingest_events,
+    ('GET', '/queue/top'): lambda query: top_accounts(query.get('k', 20)),
+    ('POST', '/queue/claim'): lambda body: claim_accounts((body or {}).get('k', 1)),
+    ('POST', '/queue/release'): lambda body: release_account(body['customer_id']),
+    ('GET', '/drift'): lambda query: drift_report(),
+}
+
 with gr.Blocks(theme=gr.themes.Soft(), title="FinBot Demo", css="""
     @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;700&display=swap');
     * { font-family: 'Inter', sans-serif; }
@@ -517,8 +463,9 @@ with gr.Blocks(theme=gr.themes.Soft(), title="FinBot Demo", css="""
 """) as demo:
 
     with gr.Column(elem_id="app-container"):
-        customer_profile_state = gr.State(None)
         profile_visible_state = gr.State(False)
+        pending_message_state = gr.State(None)
+        claimed_account_state = gr.State(None)
 
         gr.Markdown("### 💬 FinBot: AI Collections Specialist")
         
@@ -526,6 +473,8 @@ with gr.Blocks(theme=gr.themes.Soft(), title="FinBot Demo", css="""
             customer_id_input = gr.Textbox(label="Customer ID", placeholder="e.g., CUST0001", scale=4)
             load_button = gr.Button("🔍 Load Profile & Start Chat", scale=2)
             view_profile_btn = gr.Button("👤 View Profile", scale=1)
+            next_account_btn = gr.Button("📋 Next Account", scale=1)
+            release_account_btn = gr.Button("↩️ Return to Queue", scale=1)
         
         profile_display = gr.Markdown("No profile loaded.", visible=False)
 
@@ -544,29 +493,65 @@ with gr.Blocks(theme=gr.themes.Soft(), title="FinBot Demo", css="""
                 scale=4
             )
             send_button = gr.Button("➡️ Send", scale=1)
-
-    def on_load_profile_ui(customer_id):
-        if initial_error_message:
-            return None, "Error", [[None, initial_error_message]], gr.update(interactive=False), False
-
-        profile, initial_message_tuple = load_customer_profile(customer_id)
+            stop_button = gr.Button("⏹️ Stop", scale=1)
+
+    # The transcript and profile live in session_store under Gradio's session hash; the browser
+    # only sends the new message, and gets the rendered transcript back.
+    async def on_load_profile_ui(customer_id, request: gr.Request):
+        await asyncio.to_thread(startup.wait, STARTUP_WAIT)
+        error = startup_error_message()
+        if error:
+            session_store.close(request.session_hash)
+            return "Error", [[None, error]], gr.update(interactive=False), False
+
+        profile, initial_message_tuple = await asyncio.to_thread(load_customer_profile, customer_id)
         if profile:
             greeting, profile_summary = initial_message_tuple
+            session = session_store.open(request.session_hash, profile, greeting)
             return (
-                profile, profile_summary, [[None, greeting]],
+                profile_summary, session.history(),
                 gr.update(interactive=True, placeholder="Type your message here..."), False
             )
         else:
             error_message = initial_message_tuple
+            session_store.close(request.session_hash)
             return (
-                None, "No profile loaded.", [[None, error_message]],
+                "No profile loaded.", [[None, error_message]],
                 gr.update(interactive=False, placeholder="Chat is locked. Please enter a valid Customer ID."), False
             )
 
-    def on_user_message(user_input, history, profile):
+    def on_user_message(user_input, request: gr.Request):
         if not user_input:
-            return "", history
-        return chat_with_finbot(user_input, history, profile)
+            return "", gr.update(), None
+        session = session_store.add_turn(request.session_hash, user_input)
+        if session is None:
+            return (
+                gr.update(value="", interactive=False, placeholder="Chat is locked. Please load a profile first."),
+                [[None, NO_SESSION_MESSAGE]], None
+            )
+        return "", session.history(), user_input
+
+    async def on_bot_reply(user_input, request: gr.Request):
+        session = session_store.get(request.session_hash) if user_input else None
+        if session is None:
+            yield gr.update()
+            return
+        history = session.history()
+        replied = history[:-1]
+        answering = session.turns[-1]
+        stream = astream_with_finbot(user_input, replied, session.profile, request.session_hash)
+        try:
+            async for _, updated_history in stream:
+                # A newer message (or a profile reload) in this session supersedes this reply: stop
+                # before drawing over the transcript that now shows it.
+                if session.turns[-1] is not answering or session_store.get(request.session_hash) is not session:
+                    break
+                yield updated_history
+        finally:
+            await stream.aclose()
+            # Also runs when the reply is superseded or stopped; whatever had streamed is kept.
+            if len(replied) == len(history) and session_store.get(request.session_hash) is session:
+                session_store.set_reply(request.session_hash, len(history) - 1, replied[-1][1])
 
     def toggle_profile_visibility(profile_summary_text, is_visible):
         if not profile_summary_text or "No profile loaded" in profile_summary_text:
@@ -574,28 +559,74 @@ with gr.Blocks(theme=gr.themes.Soft(), title="FinBot Demo", css="""
         new_visibility = not is_visible
         return gr.update(visible=new_visibility), new_visibility
 
+    def on_next_account():
+        accounts = claim_accounts(1)
+        customer_id = accounts[0]['customer_id'] if accounts else ""
+        return customer_id, customer_id or None
+
+    def on_release_account(claimed_customer_id):
+        # Only the account this session claimed; a typed-in customer ID was never taken off the queue.
+        if claimed_customer_id:
+            release_account(claimed_customer_id)
+        return None
+
     load_button.click(
         fn=on_load_profile_ui,
         inputs=[customer_id_input],
-        outputs=[customer_profile_state, profile_display, chatbot_display, message_input, profile_visible_state]
+        outputs=[profile_display, chatbot_display, message_input, profile_visible_state]
+    )
+
+    # Claims the highest expected-recovery account off the collection queue and opens it.
+    next_account_btn.click(fn=on_next_account, outputs=[customer_id_input, claimed_account_state], api_name=False).then(
+        fn=on_load_profile_ui,
+        inputs=[customer_id_input],
+        outputs=[profile_display, chatbot_display, message_input, profile_visible_state]
     )
     
+    release_account_btn.click(fn=on_release_account, inputs=[claimed_account_state], outputs=[claimed_account_state],
+                              api_name=False)
+
     view_profile_btn.click(
         fn=toggle_profile_visibility,
         inputs=[profile_display, profile_visible_state],
         outputs=[profile_display, profile_visible_state]
     )
 
-    send_button.click(
-        fn=on_user_message,
-        inputs=[message_input, chatbot_display, customer_profile_state],
-        outputs=[message_input, chatbot_display]
-    )
-    message_input.submit(
+    chat_event = gr.on(
+        triggers=[send_button.click, message_input.submit],
         fn=on_user_message,
-        inputs=[message_input, chatbot_display, customer_profile_state],
-        outputs=[message_input, chatbot_display]
+        inputs=[message_input],
+        outputs=[message_input, chatbot_display, pending_message_state],
+        queue=False
+    ).then(
+        fn=on_bot_reply,
+        inputs=[pending_message_state],
+        outputs=[chatbot_display],
+        concurrency_limit=None  # llm_pool bounds the LLM calls themselves
     )
+    # A new message ends the reply it supersedes from inside on_bot_reply, so it can never stop its
+    # own; the Stop button cancels whatever reply is streaming.
+    stop_button.click(fn=None, cancels=[chat_event])
+
+    def on_unload(request: gr.Request):
+        session_store.close(request.session_hash)
+
+    demo.unload(on_unload)
+
+# Profile loads are cheap lookups and chat turns are bounded by llm_pool, so the Gradio queue
+# only needs to hold what the pool can admit before it starts rejecting.
+demo.queue(default_concurrency_limit=LLM_CONCURRENCY * 2, max_size=LLM_CONCURRENCY + LLM_QUEUE_LIMIT)
+
+# Started once the UI is built so the stages' imports don't compete with gradio's for the GIL.
+# FINBOT_STARTUP=eager loads everything before the module finishes importing.
+startup.start(background=os.environ.get('FINBOT_STARTUP', 'background') != 'eager')
+
+if METRICS_PORT:
+    metrics.start_http_server(METRICS_PORT)
+if INTERNAL_PORT:
+    start_internal_api(INTERNAL_ROUTES, INTERNAL_PORT)
+if METRICS_LOG_INTERVAL:
+    metrics.start_log_reporter(METRICS_LOG_INTERVAL)
 
 if __name__ == '__main__':
 
@@ -0,0 +1,262 @@
+import atexit
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from metrics import metrics
+
+AUDIT_DIR = os.environ.get('FINBOT_AUDIT_DIR', 'audit')  # empty disables the audit log
+AUDIT_BUFFER = int(os.environ.get('FINBOT_AUDIT_BUFFER', 50_000))  # turns held before record() writes them itself
+AUDIT_BATCH = int(os.environ.get('FINBOT_AUDIT_BATCH', 512))
+AUDIT_FLUSH_SECONDS = float(os.environ.get('FINBOT_AUDIT_FLUSH_SECONDS', 2))
+AUDIT_ROTATE_MB = float(os.environ.get('FINBOT_AUDIT_ROTATE_MB', 64))
+AUDIT_ROTATE_SECONDS = float(os.environ.get('FINBOT_AUDIT_ROTATE_SECONDS', 86_400))
+
+COLUMNS = ['ts', 'session', 'customer_id', 'persona', 'probability', 'phase', 'route', 'status',
+           'prompt_hash', 'user', 'response', 'first_token_ms', 'total_ms']
+INDEX_SUFFIX = '.idx'
+
+log = logging.getLogger('finbot.audit')
+
+
+class AuditLog:
+    # Append-only record of every chat turn. record() only appends to an in-memory buffer; a
+    # background thread drains it in batches. Nothing is discarded: when the writer falls behind
+    # and the buffer reaches capacity, record() writes a batch itself (back-pressure on the
+    # caller), and a failed write puts its rows back to be retried. Each batch is written as one
+    # gzip member holding a JSON object of columns, so a file is valid gzip (zcat works) and can be
+    # appended to without rewriting. Files rotate by size and age, and each closed file gets an index of customer ->
+    # member offsets so a customer's history is read without decompressing everything.
+    # Files are named per process, so serve.py workers never share one.
+
+    def __init__(self, directory=AUDIT_DIR, capacity=AUDIT_BUFFER, batch_size=AUDIT_BATCH,
+                 flush_seconds=AUDIT_FLUSH_SECONDS, rotate_mb=AUDIT_ROTATE_MB, rotate_seconds=AUDIT_ROTATE_SECONDS):
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.rotate_bytes = int(rotate_mb * 2 ** 20)
+        self.rotate_seconds = rotate_seconds
+        self.capacity = capacity
+        self.buffer = deque()
+        self.metrics = {'recorded': 0, 'written': 0, 'batches': 0, 'files': 0, 'write_errors': 0, 'inline_writes': 0}
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._file = None
+        self._index = {}
+        self._retry_at = 0.0
+        atexit.register(self.close)
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # The writer thread belongs to the process that records: a forked worker (serve.py) drops
+        # the parent's buffer and file, and gets fresh locks in case a parent thread held one.
+        self._wake = threading.Event()
+        self._write_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self.buffer.clear()
+        self._file = None
+        self._index = {}
+
+    def _start(self):
+        # Started by the first record(); concurrent first records start exactly one writer.
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._run, name='finbot-audit-writer', daemon=True).start()
+            self._pid = os.getpid()
+
+    def record(self, **fields):
+        if self._pid != os.getpid():
+            self._start()
+        fields['ts'] = time.time()
+        self.buffer.append(fields)
+        self.metrics['recorded'] += 1
+        if len(self.buffer) >= self.capacity and time.monotonic() >= self._retry_at:
+            self.metrics['inline_writes'] += 1
+            metrics.inc('finbot_audit_inline_writes_total')
+            self._flush_logged()
+        elif len(self.buffer) >= self.batch_size:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self._flush_logged()
+
+    def _flush_logged(self):
+        try:
+            self.flush()
+        except OSError as e:
+            # Keep the turns and leave the retry to the writer thread for a while, so a broken disk
+            # doesn't put a failing write on every turn.
+            self._retry_at = time.monotonic() + self.flush_seconds
+            self.metrics['write_errors'] += 1
+            metrics.inc('finbot_audit_write_errors_total')
+            log.warning("Audit log write failed (%s); %d turns kept in memory for the next attempt", e, len(self.buffer))
+
+    def _drain(self):
+        rows = []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self.buffer.popleft())
+            except IndexError:
+                break
+        return rows
+
+    def flush(self):
+        with self._write_lock:
+            while rows := self._drain():
+                try:
+                    self._write(rows)
+                except OSError:
+                    self.buffer.extendleft(reversed(rows))
+                    raise
+
+    def _write(self, rows):
+        now = time.time()
+        if self._file is not None and (self._file.tell() >= self.rotate_bytes
+                                       or now - self._opened >= self.rotate_seconds):
+            self._close_file()
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))
+            self._path = os.path.join(self.directory, f"audit-{stamp}-{os.getpid()}.jsonl.gz")
+            self._file = open(self._path, 'ab')
+            self._opened = now
+            self.metrics['files'] += 1
+        batch = {column: [row.get(column) for row in rows] for column in COLUMNS}
+        offset = self._file.tell()
+        try:
+            self._file.write(gzip.compress((json.dumps(batch) + "\n").encode(), compresslevel=6))
+            self._file.flush()
+        except OSError:
+            # A partly written member would hide every later one from readers; cut it off.
+            self._file.truncate(offset)
+            self._file.seek(offset)
+            raise
+        for customer_id in set(batch['customer_id']):
+            self._index.setdefault(customer_id, []).append(offset)
+        self.metrics['written'] += len(rows)
+        self.metrics['batches'] += 1
+
+    def _close_file(self):
+        self._file.close()
+        with open(self._path + INDEX_SUFFIX + '.tmp', 'w') as f:
+            json.dump(self._index, f)
+        os.replace(self._path + INDEX_SUFFIX + '.tmp', self._path + INDEX_SUFFIX)
+        self._file = None
+        self._index = {}
+
+    def close(self):
+        # Called at exit, and by serve.py's SIGTERM handler in workers (which skip atexit).
+        if self._pid != os.getpid():
+            return
+        self._flush_logged()
+        with self._write_lock:
+            if self._file is not None:
+                self._close_file()
+
+    def stats(self):
+        return dict(self.metrics, buffered=len(self.buffer))
+
+
+def _batches(path, offsets=None):
+    # The column batches of one file: only the members at `offsets`, or all of them. A member
+    # still being written (the live file of a running process) ends the read.
+    with open(path, 'rb') as raw:
+        try:
+            if offsets is None:
+                with gzip.GzipFile(fileobj=raw) as f:
+                    for line in f:
+                        yield json.loads(line)
+                return
+            for offset in offsets:
+                raw.seek(offset)
+                yield json.loads(gzip.GzipFile(fileobj=raw).readline())
+        except (EOFError, gzip.BadGzipFile, ValueError):
+            return
+
+
+def customer_history(customer_id, directory=AUDIT_DIR, since=None):
+    # Every recorded turn for a customer across all files, oldest first.
+    turns = []
+    for path in sorted(glob.glob(os.path.join(directory, 'audit-*.jsonl.gz'))):
+        offsets = None
+        if os.path.exists(path + INDEX_SUFFIX):
+            with open(path + INDEX_SUFFIX) as f:
+                offsets = json.load(f).get(customer_id)
+            if not offsets:
+                continue
+        for batch in _batches(path, offsets):
+            for i, row_customer in enumerate(batch['customer_id']):
+                if row_customer == customer_id and (since is None or batch['ts'][i] >= since):
+                    turns.append({column: batch[column][i] for column in batch})
+    turns.sort(key=lambda turn: turn['ts'])
+    return turns
+
+
+if __name__ == '__main__':
+    import argparse
+    import random
+    import shutil
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Print a customer's audited conversations, or benchmark the audit log.")
+    parser.add_argument('--dir', default=AUDIT_DIR)
+    parser.add_argument('--customer', help="customer whose turns to print")
+    parser.add_argument('--since', type=float, help="only turns at or after this Unix time")
+    parser.add_argument('--json', action='store_true', help="print the turns as JSON instead of a transcript")
+    parser.add_argument('--bench', type=int, help="record this many synthetic turns into a temporary directory")
+    args = parser.parse_args()
+
+    if args.customer:
+        turns = customer_history(args.customer, args.dir, args.since)
+        if args.json:
+            print(json.dumps(turns, indent=2))
+        for turn in [] if args.json else turns:
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(turn['ts']))
+            print(f"[{stamp}] session {turn['session']} persona={turn['persona']} risk={turn['probability']:.0%} "
+                  f"phase={turn['phase']} route={turn['route']} status={turn['status']}")
+            print(f"  Customer: {turn['user']}\n  FinBot: {turn['response']}")
+        raise SystemExit(0)
+
+    directory = tempfile.mkdtemp(prefix='finbot-audit-')
+    try:
+        log = AuditLog(directory, capacity=args.bench or 200_000, rotate_mb=8)
+        rng = random.Random(0)
+        words = "payment emi link split defer job lost salary week month today waiver fee charged twice".split()
+        n = args.bench or 200_000
+        turns = [dict(session=f"s{i % 5000}", customer_id=f"CUST{rng.randrange(100_000):06d}",
+                      persona='Struggling & Cooperative', probability=rng.random(), phase=None, route='llm',
+                      status='done', prompt_hash='0' * 16, user=" ".join(rng.choices(words, k=10)),
+                      response=" ".join(rng.choices(words, k=40)), first_token_ms=400.0, total_ms=1800.0)
+                 for i in range(n)]
+        start = time.perf_counter()
+        for fields in turns:
+            log.record(**fields)
+        record_us = (time.perf_counter() - start) / n * 1e6
+        log.close()
+        written = time.perf_counter() - start
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(directory, 'audit-*.gz')))
+        query_start = time.perf_counter()
+        turns = customer_history('CUST000042', directory)
+        print(json.dumps({
+            'turns': n,
+            'record_us': record_us,
+            'turns_per_s_written': log.metrics['written'] / written,
+            'disk_mb': size / 2 ** 20,
+            'bytes_per_turn': size / max(1, log.metrics['written']),
+            'query_ms': (time.perf_counter() - query_start) * 1000,
+            'query_turns': len(turns),
+            **log.stats(),
+        }, indent=2))
+    finally:
+        shutil.rmtree(directory)
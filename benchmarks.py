@@ -0,0 +1,250 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = '10k,1m,10m'
+TURN_MESSAGES = [
+    "Hi, why did I get a reminder about my EMI?",
+    "I lost my job last month and can't pay the full amount.",
+    "Can I split the payment into two parts?",
+    "What happens if I pay next week?",
+]
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {'k': 1_000, 'm': 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip('km')) * scale)
+
+
+def measure(fn):
+    # Wall time and tracemalloc high-water mark (MB) of one call.
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+def latency(fn, args_list):
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    samples = np.asarray(samples) * 1000
+    return {'calls': len(samples), 'p50_ms': float(np.percentile(samples, 50)),
+            'p95_ms': float(np.percentile(samples, 95)), 'mean_ms': float(samples.mean())}
+
+
+def bench_features(df, reference_max):
+    from features import create_features
+    from feature_engine import create_features_fast
+    n = len(df)
+    _, seconds, peak = measure(lambda: create_features_fast(df))
+    result = {'fast': {'rows_per_s': n / seconds, 'seconds': seconds, 'peak_mb': peak}}
+    if n <= reference_max:
+        _, seconds, peak = measure(lambda: create_features(df))
+        result['reference'] = {'rows_per_s': n / seconds, 'seconds': seconds, 'peak_mb': peak}
+    return result
+
+
+def bench_personas(df, single_rows):
+    from features import assign_intelligent_persona, assign_intelligent_personas
+    from feature_engine import create_features_fast
+    featured = create_features_fast(df)
+    base = featured['CustomerPersona'].to_numpy(dtype=object)
+    probability = np.random.default_rng(0).uniform(size=len(df))
+    _, seconds, peak = measure(lambda: assign_intelligent_personas(base, probability))
+    rows = [(featured.iloc[[i]], probability[i]) for i in range(min(single_rows, len(df)))]
+    return {
+        'vectorized': {'rows_per_s': len(df) / seconds, 'peak_mb': peak},
+        'single_row': latency(assign_intelligent_persona, rows),
+    }
+
+
+def bench_scoring(df, models, single_rows, batch_max):
+    from features import create_features
+    from risk_table import score_frame
+    result = {}
+    featured = create_features(df.iloc[:single_rows])
+    rows = [(featured.iloc[[i]],) for i in range(len(featured))]
+    batch = df.iloc[:batch_max]
+    for name, model in models.items():
+        _, seconds, peak = measure(lambda: score_frame(model, batch))
+        result[name] = {
+            'single_row': latency(model.predict_proba, rows),
+            'batch': {'rows': len(batch), 'rows_per_s': len(batch) / seconds, 'peak_mb': peak},
+        }
+    return result
+
+
+def bench_app(portfolio, model_path, calls):
+    # Profile loads and chat turns through app.py with a zero-latency replay LLM, so what is
+    # measured is FinBot's own per-turn overhead. app.py starts in a scratch directory holding
+    # only the synthetic portfolio, the model and a drift baseline for them, so every stage
+    # (risk table, events, drift, queue) is built from the same data; with no explanation table,
+    # profile loads include explaining the customer.
+    import shutil
+    import tempfile
+    import joblib
+    from drift import baseline_path, build_drift_baseline, model_fingerprint
+    from feature_engine import create_features_fast
+    from risk_table import score_frame
+
+    workdir = tempfile.mkdtemp(prefix='finbot-bench-')
+    cwd = os.getcwd()
+    try:
+        portfolio.to_csv(os.path.join(workdir, 'Analytics_loan_collection_dataset.csv'), index=False)
+        model_copy = os.path.join(workdir, 'prediction_pipeline.pkl')
+        shutil.copy(model_path, model_copy)
+        pipeline = joblib.load(model_copy)
+        build_drift_baseline(create_features_fast(portfolio), score_frame(pipeline, portfolio)[0],
+                             model_fingerprint(pipeline, model_copy)).save(baseline_path(model_copy))
+        for name in ('FINBOT_STORE_DIR', 'FINBOT_EVENT_LOG', 'FINBOT_COMPILED_MODEL', 'FINBOT_DRIFT_BASELINE'):
+            os.environ.pop(name, None)
+        os.environ.update({'FINBOT_LLM_BACKEND': 'fake', 'FINBOT_FAKE_TTFT': '0', 'FINBOT_FAKE_TOKENS_PER_SEC': '1e12',
+                           'FINBOT_STARTUP': 'eager', 'FINBOT_RISK_TABLE': '', 'FINBOT_EXPLANATIONS': '',
+                           'FINBOT_AUDIT_DIR': ''})
+        os.chdir(workdir)
+        sys.path.insert(0, APP_DIR)
+        import app
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir)
+    from response_cache import ResponseCache
+
+    if app.initial_error_message:
+        raise SystemExit(app.initial_error_message)
+    app.prompt_builder.on_render = None
+    app.response_cache = ResponseCache(max_entries=0)
+
+    ids = [str(c) for c in app.customer_store.customer_ids()[:calls]]
+    risk_table, app.risk_table = app.risk_table, None
+    model_path = latency(app.load_customer_profile, [(c,) for c in ids])
+    app.risk_table = risk_table
+    table_path = latency(app.load_customer_profile, [(c,) for c in ids])
+
+    profile, _ = app.load_customer_profile(ids[0])
+    history = []
+    turns = []
+    for i in range(calls):
+        message = TURN_MESSAGES[i % len(TURN_MESSAGES)]
+        turns.append((message, list(history[-6:]), profile))
+        history.append((message, "Thank you for letting me know."))
+    render_inputs = [(app.build_chain_inputs(*turn),) for turn in turns[:calls]]
+    return {
+        'startup_s': dict(app.startup.timings),
+        'load_profile': {'model': model_path, 'risk_table': table_path},
+        'prepare_turn': latency(app.prepare_turn, turns),
+        'prompt_render': latency(app.prompt_builder.render, render_inputs),
+        'chat_turn_stub_llm': latency(app.chat_with_finbot, turns),
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(old_path, new_path):
+    # Prints new/old for every numeric leaf the two runs share.
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def leaves(node, prefix=''):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                yield from leaves(value, f"{prefix}.{key}" if prefix else key)
+        elif isinstance(node, (int, float)) and not isinstance(node, bool):
+            yield prefix, node
+
+    old_values = dict(leaves(old['results']))
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for key, value in leaves(new['results']):
+        if key in old_values and old_values[key]:
+            print(f"{key:70s} {old_values[key]:14.4g} {value:14.4g} {value / old_values[key]:7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FinBot benchmark suite on synthetic portfolios.")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="portfolio sizes, e.g. 10k,1m,10m")
+    parser.add_argument('--model', default='prediction_pipeline.pkl')
+    parser.add_argument('--only', help="comma-separated subset of: features,personas,scoring,app")
+    parser.add_argument('--reference-max', default='1m', help="largest size also run through create_features")
+    parser.add_argument('--batch-max', default='1m', help="rows scored per size in the batch scoring case")
+    parser.add_argument('--single-rows', type=int, default=200, help="calls per single-row latency case")
+    parser.add_argument('--json', help="write results to this file")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    from synthetic_data import make_portfolio
+    cases = set((args.only or 'features,personas,scoring,app').split(','))
+    sizes = [parse_size(s) for s in args.sizes.split(',')]
+    models = {}
+    if cases & {'scoring', 'app'}:
+        import joblib
+        from compiled_model import compile_pipeline
+        models['pipeline'] = joblib.load(args.model)
+        try:
+            models['compiled'] = compile_pipeline(models['pipeline'])
+        except ValueError as e:
+            print(f"Skipping compiled model: {e}", file=sys.stderr)
+
+    results = {}
+    for n in sizes:
+        label = str(n)
+        print(f"Benchmarking {n:,} rows...", file=sys.stderr)
+        df = make_portfolio(n, with_ids=False)
+        if 'features' in cases:
+            results.setdefault('features', {})[label] = bench_features(df, parse_size(args.reference_max))
+        if 'personas' in cases:
+            results.setdefault('personas', {})[label] = bench_personas(df, args.single_rows)
+        if 'scoring' in cases:
+            results.setdefault('scoring', {})[label] = bench_scoring(df, models, args.single_rows,
+                                                                     parse_size(args.batch_max))
+        del df
+    if 'app' in cases:
+        portfolio = make_portfolio(min(sizes), categorical=False)
+        results['app'] = bench_app(portfolio, args.model, args.single_rows)
+
+    report = {'meta': environment(), 'results': results}
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,326 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import date
+from string import Formatter
+import numpy as np
+from features import PERSONA_LABELS
+from llm_pool import LLMPool, LLM_CONCURRENCY
+from payment_plans import GRACE_DAYS, LATE_FEE, MAX_DEFERRAL_DAYS, payment_plans
+from prompts import CAMPAIGN_SUFFIX, PromptBuilder
+from response_cache import DATE_STYLES, RISK_BUCKET_EDGES
+
+CAMPAIGN_CHUNK = 20_000
+TEMPLATE_ATTEMPTS = 2
+# Days past due. The first two edges are where the late fee starts and where a deferral stops
+# being possible, so every account in a band gets the same options.
+OVERDUE_EDGES = [GRACE_DAYS + 1, MAX_DEFERRAL_DAYS, 31, 61, 91]
+OVERDUE_LABELS = ['0-5 (within grace)', '6-13', '14-30', '31-60', '61-90', '91+']
+DEFERRAL_BANDS = OVERDUE_EDGES.index(MAX_DEFERRAL_DAYS) + 1  # bands below this can still defer
+RISK_LABELS = ['under 20%', '20-60%', '60-75%', '75-80%', '80% or more']
+
+BASE_FIELDS = ['emi', 'due_date', 'pay_now_amount', 'split_first_amount', 'split_first_date',
+               'split_second_amount', 'split_second_date', 'late_fee']
+DEFERRAL_FIELDS = ['deferral_amount', 'deferral_date']
+# Used for a group whose drafted template can't be filled safely.
+FALLBACK_TEMPLATE = ("FinBot here from your lender. Your EMI of {emi} was due on {due_date}. You can clear "
+                     "{pay_now_amount} today, or pay {split_first_amount} by {split_first_date} and "
+                     "{split_second_amount} by {split_second_date}. Reply HELP and we'll find a plan that works.")
+
+
+def group_codes(persona_codes, probability, delays):
+    # One integer per account for its (final persona, risk bucket, overdue band) group.
+    bucket = np.searchsorted(RISK_BUCKET_EDGES, probability, side='right')
+    band = np.searchsorted(OVERDUE_EDGES, delays, side='right')
+    return (persona_codes.astype(np.int64) * len(RISK_LABELS) + bucket) * len(OVERDUE_LABELS) + band
+
+
+def describe_group(code):
+    code, band = divmod(int(code), len(OVERDUE_LABELS))
+    persona, bucket = divmod(code, len(RISK_LABELS))
+    return PERSONA_LABELS[persona], bucket, band
+
+
+def group_fields(band):
+    return BASE_FIELDS + (DEFERRAL_FIELDS if band < DEFERRAL_BANDS else [])
+
+
+def group_prompt(code):
+    persona, bucket, band = describe_group(code)
+    fields = group_fields(band)
+    fee = f" (includes the ₹{LATE_FEE} late fee)" if band else ""
+    options = [f"full payment today: {{pay_now_amount}}{fee}",
+               "split: {split_first_amount} by {split_first_date}, then {split_second_amount} by {split_second_date}"]
+    if 'deferral_amount' in fields:
+        options.append("short deferral: {deferral_amount} by {deferral_date}")
+    else:
+        options.append("a call with our hardship specialist")
+    return {
+        'persona': persona,
+        'risk_band': RISK_LABELS[bucket],
+        'overdue_band': OVERDUE_LABELS[band],
+        'options': "; ".join(options),
+        'placeholders': ", ".join("{" + field + "}" for field in fields),
+    }
+
+
+def check_template(text, fields):
+    # The template if it only names known placeholders and formats cleanly, else None.
+    text = (text or "").strip().strip('"').strip()
+    try:
+        named = {name for _, name, _, _ in Formatter().parse(text) if name is not None}
+    except ValueError:
+        return None
+    if not text or not named <= set(fields) or not named:
+        return None
+    return text
+
+
+def _read_jsonl(path):
+    # Complete lines only: a line cut short by an interruption is dropped, and cut from the file
+    # so later appends start on a fresh line.
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r+b') as f:
+        data = f.read()
+        f.truncate(data.rfind(b"\n") + 1)
+    return [json.loads(line) for line in data[:data.rfind(b"\n") + 1].splitlines() if line]
+
+
+class Campaign:
+    # Drafts first-contact messages for a list of accounts. Each (persona, risk bucket, overdue
+    # band) group gets one LLM-written template; every account's own amounts and dates are then
+    # filled in locally. Progress lives in out_dir, so an interrupted run picks up where it stopped:
+    #   campaign.json    the campaign date and a signature of the account list
+    #   templates.jsonl  one line per drafted group template, appended as each LLM call returns
+    #                    (fallbacks aren't written, so a resumed run drafts those groups again)
+    #   messages.jsonl   one line per account, appended a chunk at a time
+    #   progress.json    accounts written and the byte length of messages.jsonl at that point
+
+    def __init__(self, out_dir, store, risk_table, positions, today=None, events=None):
+        self.out_dir = out_dir
+        self.store = store
+        self.risk_table = risk_table
+        self.events = events  # an EventIngestor: accounts are grouped and filled from their current data
+        self.overrides = {}
+        self.positions = np.asarray(positions, dtype=np.int64)  # into the store's sorted key order
+        self.today = today or date.today()
+        self.templates = {}
+        self.stats = {'accounts': len(self.positions), 'llm_calls': 0, 'fallback_templates': 0,
+                      'reused_templates': 0, 'resumed_accounts': 0}
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.out_dir, name)
+
+    def _write_json(self, name, value):
+        with open(self._path(name) + '.tmp', 'w') as f:
+            json.dump(value, f)
+        os.replace(self._path(name) + '.tmp', self._path(name))
+
+    def _start(self, restart):
+        signature = hashlib.sha1(self.positions.tobytes() + str(self.risk_table.fingerprint).encode()).hexdigest()
+        if os.path.exists(self._path('campaign.json')) and not restart:
+            with open(self._path('campaign.json')) as f:
+                existing = json.load(f)
+            if existing['signature'] != signature:
+                raise ValueError(f"{self.out_dir} holds a different campaign; use a new directory or restart")
+            self.today = date.fromisoformat(existing['date'])  # amounts and dates must match what was written
+        else:
+            for name in ('templates.jsonl', 'messages.jsonl', 'progress.json'):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            self._write_json('campaign.json', {'date': self.today.isoformat(), 'signature': signature,
+                                               'accounts': len(self.positions)})
+        for line in _read_jsonl(self._path('templates.jsonl')):
+            self.templates[line['group']] = line['template']
+        self.stats['reused_templates'] = len(self.templates)
+
+    def groups(self):
+        persona = self.risk_table.final_persona[self.positions].copy()
+        probability = np.asarray(self.risk_table.probability[self.positions], dtype=np.float64)
+        delays = np.asarray(self.store.columns['DelaysDays'][self.store.order[self.positions]], dtype=np.float64)
+        if self.events is not None:
+            self.overrides, scores = self.events.snapshot()
+            index = {int(position): i for i, position in enumerate(self.positions)}
+            for customer_id in self.overrides.keys() | scores.keys():
+                i = index.get(int(np.searchsorted(self.store.keys, customer_id)))
+                if i is None or self.store.keys[self.positions[i]] != customer_id:
+                    continue
+                if customer_id in scores:
+                    probability[i] = scores[customer_id][0]
+                    persona[i] = PERSONA_LABELS.index(scores[customer_id][2])
+                delays[i] = self.overrides.get(customer_id, {}).get('DelaysDays', delays[i])
+        return group_codes(persona, probability, delays)
+
+    def _rows(self, positions):
+        # Raw rows with the event overlays folded in, so the amounts and dates match the grouping.
+        rows = self.store.rows(self.store.order[positions], self.store.keys[positions])
+        if self.overrides:
+            ids = rows['CustomerID'].astype(str)
+            for i in np.flatnonzero(ids.isin(self.overrides.keys()).to_numpy()):
+                for column, value in self.overrides[ids.iat[i]].items():
+                    rows.iat[i, rows.columns.get_loc(column)] = value
+        return rows
+
+    async def draft_templates(self, codes, llm, concurrency):
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.runnables import RunnableLambda
+        builder = PromptBuilder(scope='persona', suffix=CAMPAIGN_SUFFIX)
+        chain = RunnableLambda(builder.render) | llm | StrOutputParser()
+        pool = LLMPool(max_concurrency=concurrency, max_queue=len(codes))
+        with open(self._path('templates.jsonl'), 'a') as out:
+
+            async def draft(code):
+                inputs = group_prompt(code)
+                fields = group_fields(describe_group(code)[2])
+                template = None
+                for _ in range(TEMPLATE_ATTEMPTS):
+                    self.stats['llm_calls'] += 1
+                    try:
+                        template = check_template(await pool.ainvoke(chain, inputs), fields)
+                    except Exception as e:
+                        print(f"Campaign template for group {code} failed: {e!r}")
+                    if template is not None:
+                        break
+                if template is None:
+                    self.stats['fallback_templates'] += 1
+                    self.templates[int(code)] = FALLBACK_TEMPLATE
+                    return
+                self.templates[int(code)] = template
+                out.write(json.dumps({'group': int(code), 'template': template}) + "\n")
+                out.flush()
+
+            await asyncio.gather(*(draft(code) for code in codes))
+
+    def _fields(self, rows, plans):
+        day = DATE_STYLES['full']
+
+        def date_text(values):
+            # A chunk holds few distinct dates, so each is formatted once.
+            unique, inverse = np.unique(values.astype('datetime64[D]'), return_inverse=True)
+            texts = np.array(["" if np.isnat(d) else day(d.astype(object)) for d in unique], dtype=object)
+            return texts[inverse].tolist()
+
+        def rupees(values):
+            return [f"₹{v:,.0f}" if v == v else "" for v in values]
+
+        columns = {
+            'customer_id': rows['CustomerID'].astype(str).tolist(),
+            'emi': rupees(plans['Emi'].to_numpy()),
+            'due_date': date_text(plans['DueDate'].to_numpy()),
+            'pay_now_amount': rupees(plans['PayNowAmount'].to_numpy()),
+            'split_first_amount': rupees(plans['SplitFirstAmount'].to_numpy()),
+            'split_first_date': date_text(plans['SplitFirstDate'].to_numpy()),
+            'split_second_amount': rupees(plans['SplitSecondAmount'].to_numpy()),
+            'split_second_date': date_text(plans['SplitSecondDate'].to_numpy()),
+            'deferral_amount': rupees(plans['DeferralAmount'].to_numpy()),
+            'deferral_date': date_text(plans['DeferralDate'].to_numpy()),
+        }
+        names = list(columns)
+        late_fee = f"₹{LATE_FEE}"
+        for values in zip(*columns.values()):
+            fields = dict(zip(names, values))
+            fields['late_fee'] = late_fee
+            yield fields
+
+    def _progress(self):
+        if not os.path.exists(self._path('progress.json')):
+            return {'accounts_done': 0, 'bytes': 0}
+        with open(self._path('progress.json')) as f:
+            return json.load(f)
+
+    def fill(self, codes, chunk_size=CAMPAIGN_CHUNK):
+        progress = self._progress()
+        self.stats['resumed_accounts'] = progress['accounts_done']
+        with open(self._path('messages.jsonl'), 'ab') as out:
+            out.truncate(progress['bytes'])  # drops lines written after the last checkpoint
+            for start in range(progress['accounts_done'], len(self.positions), chunk_size):
+                positions = self.positions[start:start + chunk_size]
+                rows = self._rows(positions)
+                plans = payment_plans(rows, self.today)
+                lines = []
+                for code, fields in zip(codes[start:start + chunk_size], self._fields(rows, plans)):
+                    lines.append(json.dumps({'customer_id': fields['customer_id'], 'group': int(code),
+                                             'message': self.templates[int(code)].format_map(fields)}))
+                out.write(("\n".join(lines) + "\n").encode())
+                out.flush()
+                os.fsync(out.fileno())
+                progress = {'accounts_done': start + len(positions), 'bytes': out.tell()}
+                self._write_json('progress.json', progress)
+
+    def run(self, llm, concurrency=LLM_CONCURRENCY, restart=False):
+        started = time.perf_counter()
+        self._start(restart)
+        codes = self.groups()
+        remaining = codes[self._progress()['accounts_done']:]  # groups of accounts not yet written
+        missing = [code for code in np.unique(remaining).tolist() if code not in self.templates]
+        asyncio.run(self.draft_templates(missing, llm, concurrency))
+        drafted = time.perf_counter()
+        self.fill(codes)
+        finished = time.perf_counter()
+        filled = len(self.positions) - self.stats['resumed_accounts']
+        return dict(self.stats, groups=len(np.unique(codes)), date=self.today.isoformat(),
+                    template_seconds=drafted - started, fill_seconds=finished - drafted,
+                    seconds=finished - started, accounts_per_s=filled / (finished - started))
+
+
+def select_accounts(store, risk_table, top=None, accounts_path=None):
+    # Positions in sorted-key order: the listed accounts, or the whole book (or its top N) by
+    # expected recovery, so an interrupted campaign has already covered the most valuable ones.
+    if accounts_path:
+        with open(accounts_path) as f:
+            ids = [line.strip() for line in f if line.strip()]
+        positions = np.searchsorted(store.keys, ids)
+        known = (positions < len(store.keys)) & (store.keys[np.minimum(positions, len(store.keys) - 1)] == ids)
+        if not known.all():
+            print(f"Skipping {int((~known).sum())} unknown customer ids")
+        return positions[known]
+    from collection_queue import build_collection_queue
+    priority = build_collection_queue(store, risk_table).priority
+    order = np.argsort(-priority, kind='stable')
+    return order[:top] if top else order
+
+
+if __name__ == '__main__':
+    import argparse
+    import joblib
+    from customer_store import CustomerStore, load_customer_store
+    from events import EventIngestor, EventLog
+    from llm_backend import LLM_BACKEND, create_llm
+    from risk_table import build_risk_table, load_risk_table
+    from synthetic_data import make_portfolio
+
+    parser = argparse.ArgumentParser(description="Draft first-contact messages for a day's collection list.")
+    parser.add_argument('--out', required=True, help="campaign directory; rerun with the same one to resume")
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--model', default='prediction_pipeline.pkl', help="a .npz path loads a compiled_model export")
+    parser.add_argument('--synthetic', type=int, help="use a synthetic portfolio of this many rows instead of --data")
+    parser.add_argument('--accounts', help="file of customer ids, one per line; default is the whole book")
+    parser.add_argument('--top', type=int, help="only the N accounts with the highest expected recovery")
+    parser.add_argument('--date', type=date.fromisoformat, help="campaign day (YYYY-MM-DD); fixed on resume")
+    parser.add_argument('--concurrency', type=int, default=LLM_CONCURRENCY, help="LLM calls in flight")
+    parser.add_argument('--restart', action='store_true', help="discard progress in --out and start again")
+    parser.add_argument('--events', default=os.environ.get('FINBOT_EVENT_LOG'),
+                        help="event log whose updates are applied before grouping (default: FINBOT_EVENT_LOG)")
+    args = parser.parse_args()
+
+    if args.model.endswith('.npz'):
+        from compiled_model import CompiledEnsemble
+        pipeline = CompiledEnsemble.load(args.model)
+    else:
+        pipeline = joblib.load(args.model)
+    if args.synthetic:
+        store = CustomerStore.from_frame(make_portfolio(args.synthetic))
+        risk_table = build_risk_table(pipeline, store, f"synthetic-{args.synthetic}")
+    else:
+        store = load_customer_store(args.data, os.environ.get('FINBOT_STORE_DIR'))
+        risk_table = load_risk_table(os.environ.get('FINBOT_RISK_TABLE', 'risk_table.npz'), pipeline, store,
+                                     args.data, args.model)
+    events = EventIngestor(store, pipeline, log=EventLog(args.events)) if args.events else None
+    llm = create_llm(LLM_BACKEND, os.environ.get('GOOGLE_API_KEY'))
+    campaign = Campaign(args.out, store, risk_table, select_accounts(store, risk_table, args.top, args.accounts),
+                        args.date, events)
+    print(json.dumps(campaign.run(llm, args.concurrency, args.restart), indent=2))
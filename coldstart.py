@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter: UI-ready is when `import app` returns (demo is built),
+# fully ready is when the background start-up stages finish.
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {app_dir!r})
+import app
+ui_ready = time.perf_counter() - start
+app.startup.wait()
+print('COLDSTART', json.dumps({{'ui_ready_s': ui_ready, 'fully_ready_s': time.perf_counter() - start,
+                  'startup': app.startup.status()}}))
+"""
+
+
+def import_breakdown(stderr):
+    # Self time from `python -X importtime`, summed per top-level package so nothing is counted twice.
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us)
+    return {name: us / 1e6 for name, us in totals.items()}
+
+
+def run_once(env):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'pass'], check=True, env=env)
+    interpreter = time.perf_counter() - start
+    probe = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE.format(app_dir=APP_DIR)],
+                           capture_output=True, text=True, env=env)
+    if probe.returncode != 0:
+        raise SystemExit(probe.stderr[-2000:])
+    result = json.loads(next(line for line in probe.stdout.splitlines() if line.startswith('COLDSTART '))[10:])
+    result['interpreter_s'] = interpreter
+    result['imports_s'] = import_breakdown(probe.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure FinBot cold start and break down where the time goes.")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--backend', default='fake', help="FINBOT_LLM_BACKEND to start with (default: fake)")
+    parser.add_argument('--top', type=int, default=15, help="packages to list in the import breakdown")
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, FINBOT_LLM_BACKEND=args.backend, PYTHONDONTWRITEBYTECODE='1')
+    runs = [run_once(env) for _ in range(args.runs)]
+
+    def median(values):
+        return statistics.median(values)
+
+    stages = runs[0]['startup']['stage_seconds']
+    # app's own entry is its module body (building the UI) plus whatever the background stages overlap with.
+    packages = {name: median([r['imports_s'].get(name, 0.0) for r in runs]) for name in runs[0]['imports_s'] if name != 'app'}
+    report = {
+        'runs': args.runs,
+        'backend': args.backend,
+        'interpreter_s': median([r['interpreter_s'] for r in runs]),
+        'ui_ready_s': median([r['ui_ready_s'] for r in runs]),
+        'fully_ready_s': median([r['fully_ready_s'] for r in runs]),
+        'stage_s': {name: median([r['startup']['stage_seconds'][name] for r in runs]) for name in stages},
+        'import_s': dict(sorted(packages.items(), key=lambda item: -item[1])[:args.top]),
+        'startup_error': runs[-1]['startup']['error'],
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
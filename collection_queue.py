@@ -0,0 +1,249 @@
+import heapq
+import mmap
+import multiprocessing
+import os
+import threading
+import time
+import numpy as np
+from feature_engine import create_features_fast
+from risk_table import CHUNK_SIZE
+
+# DelinquencyScore is irregular payments x days late; dividing by this turns it into roughly
+# "EMIs overdue" for the exposure estimate.
+DELINQUENCY_DAYS_PER_EMI = 30
+# A claimed account comes back on the queue after this long unless it was released earlier.
+QUEUE_LEASE_SECONDS = float(os.environ.get('FINBOT_QUEUE_LEASE_SECONDS', 8 * 3600))
+LEASE_CHECK_SECONDS = 1.0
+
+
+def expected_recovery(probability, loan_amount, emi, delinquency_score):
+    # Amount at stake if the account is not worked today: the overdue EMIs (capped at the loan),
+    # weighted by the model's risk of default.
+    exposure = np.minimum(loan_amount, emi * (1 + delinquency_score / DELINQUENCY_DAYS_PER_EMI))
+    return probability * exposure
+
+
+def recovery_priority(featured, probability):
+    return expected_recovery(np.asarray(probability, dtype=np.float64), featured['LoanAmount'].to_numpy(),
+                             featured['Emi'].to_numpy(), featured['DelinquencyScore'].to_numpy())
+
+
+class CollectionQueue:
+    # Indexed binary max-heap over account positions in sorted-CustomerID order, so any
+    # account's priority can be changed in O(log n) and top-k never sorts the portfolio.
+    # Accounts handed out by pop() are leased: they stay out of the heap until release(), a
+    # re-score (on_rescored), or the lease running out, whichever comes first.
+
+    def __init__(self, keys, priority, lease_seconds=QUEUE_LEASE_SECONDS):
+        n = len(keys)
+        self.keys = keys
+        self.lease_seconds = lease_seconds
+        self.priority = np.asarray(priority, dtype=np.float64).copy()
+        # A list sorted by descending priority already satisfies the heap property.
+        self.heap = np.argsort(-self.priority, kind='stable').astype(np.int64)
+        self.pos = np.empty(n, dtype=np.int64)
+        self.pos[self.heap] = np.arange(n)
+        self._size = np.array([n], dtype=np.int64)
+        self.lease_until = np.zeros(n, dtype=np.float64)  # 0 when the account isn't claimed
+        self._next_lease_check = np.zeros(1, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self):
+        return int(self._size[0])
+
+    @size.setter
+    def size(self, value):
+        self._size[0] = value
+
+    def __len__(self):
+        return self.size
+
+    def share(self):
+        # Moves the heap into anonymous shared memory behind a process lock, so worker processes
+        # forked afterwards all pull from and re-prioritise the same queue.
+        for name in ('priority', 'heap', 'pos', '_size', 'lease_until', '_next_lease_check'):
+            values = getattr(self, name)
+            shared = np.frombuffer(mmap.mmap(-1, max(values.nbytes, 1)), dtype=values.dtype, count=len(values))
+            shared[:] = values
+            setattr(self, name, shared)
+        self._lock = multiprocessing.Lock()
+        return self
+
+    def index(self, customer_id):
+        i = np.searchsorted(self.keys, customer_id)
+        if i < len(self.keys) and self.keys[i] == customer_id:
+            return int(i)
+        return None
+
+    def _swap(self, a, b):
+        heap, pos = self.heap, self.pos
+        heap[a], heap[b] = heap[b], heap[a]
+        pos[heap[a]] = a
+        pos[heap[b]] = b
+
+    def _sift_up(self, i):
+        heap, priority = self.heap, self.priority
+        while i > 0:
+            parent = (i - 1) >> 1
+            if priority[heap[i]] <= priority[heap[parent]]:
+                break
+            self._swap(i, parent)
+            i = parent
+
+    def _sift_down(self, i):
+        heap, priority, size = self.heap, self.priority, self.size
+        while True:
+            largest, left = i, 2 * i + 1
+            if left < size and priority[heap[left]] > priority[heap[largest]]:
+                largest = left
+            if left + 1 < size and priority[heap[left + 1]] > priority[heap[largest]]:
+                largest = left + 1
+            if largest == i:
+                return
+            self._swap(i, largest)
+            i = largest
+
+    def _remove_at(self, i):
+        last = self.size - 1
+        account = int(self.heap[i])
+        self._swap(i, last)
+        self.size -= 1
+        self.pos[account] = -1
+        if i < self.size:
+            self._sift_down(i)
+            self._sift_up(i)
+        return account
+
+    def _push(self, account):
+        self.lease_until[account] = 0
+        i = self.size
+        self.heap[i] = account
+        self.pos[account] = i
+        self.size += 1
+        self._sift_up(i)
+
+    def _expire_leases(self, now):
+        # One vectorised scan of the lease column, at most every LEASE_CHECK_SECONDS.
+        if now < self._next_lease_check[0]:
+            return
+        self._next_lease_check[0] = now + LEASE_CHECK_SECONDS
+        for account in np.flatnonzero((self.lease_until > 0) & (self.lease_until <= now)):
+            self._push(int(account))
+
+    def update(self, customer_id, priority, requeue=False):
+        # `requeue` also ends the account's claim, putting it back with the new priority.
+        with self._lock:
+            account = self.index(customer_id)
+            if account is None:
+                return False
+            self.priority[account] = priority
+            i = self.pos[account]
+            if i >= 0:
+                self._sift_up(i)
+                self._sift_down(self.pos[account])
+            elif requeue:
+                self._push(account)
+            return True
+
+    def update_many(self, customer_ids, priorities, requeue=False):
+        for customer_id, priority in zip(customer_ids, priorities):
+            self.update(customer_id, float(priority), requeue)
+
+    def top(self, k):
+        # Best-first walk from the root; touches O(k log k) heap slots.
+        with self._lock:
+            self._expire_leases(time.time())
+            result, frontier = [], [(-self.priority[self.heap[0]], 0)] if self.size else []
+            while frontier and len(result) < k:
+                negative, i = heapq.heappop(frontier)
+                result.append((str(self.keys[self.heap[i]]), -float(negative)))
+                for child in (2 * i + 1, 2 * i + 2):
+                    if child < self.size:
+                        heapq.heappush(frontier, (-self.priority[self.heap[child]], child))
+            return result
+
+    def pop(self, k=1):
+        # Hands out the k highest-priority accounts and takes them off the queue for lease_seconds.
+        with self._lock:
+            now = time.time()
+            self._expire_leases(now)
+            claimed = []
+            while self.size and len(claimed) < k:
+                account = self._remove_at(0)
+                self.lease_until[account] = now + self.lease_seconds
+                claimed.append((str(self.keys[account]), float(self.priority[account])))
+            return claimed
+
+    def release(self, customer_id):
+        # Puts a claimed account back with its current priority.
+        with self._lock:
+            account = self.index(customer_id)
+            if account is None or self.pos[account] >= 0:
+                return False
+            self._push(account)
+            return True
+
+    def on_rescored(self, customer_ids, frame, probability):
+        # EventIngestor listener: re-prioritises the accounts it just re-scored. A claimed account
+        # whose data changed goes back on the queue, to be worked again at its new priority.
+        self.update_many(customer_ids, recovery_priority(create_features_fast(frame), probability), requeue=True)
+
+
+def build_collection_queue(store, risk_table, chunk_size=CHUNK_SIZE):
+    # Reads probabilities from the risk table (same sorted key order as the store) and the
+    # exposure columns chunk by chunk, so the portfolio is never materialised at once.
+    n = len(store)
+    priority = np.empty(n, dtype=np.float64)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk = create_features_fast(store.rows(store.order[start:stop], store.keys[start:stop]))
+        priority[start:stop] = recovery_priority(chunk, risk_table.probability[start:stop])
+    return CollectionQueue(np.asarray(store.keys), priority)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import time
+    from types import SimpleNamespace
+    from customer_store import CustomerStore
+    from synthetic_data import make_portfolio
+
+    parser = argparse.ArgumentParser(description="Benchmark the collection queue on a synthetic portfolio.")
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--top', type=int, default=100)
+    parser.add_argument('--updates', type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    store = CustomerStore.from_frame(make_portfolio(args.rows))
+
+    scores = SimpleNamespace(probability=rng.uniform(size=args.rows))  # stands in for a RiskTable
+
+    start = time.perf_counter()
+    queue = build_collection_queue(store, scores)
+    build_s = time.perf_counter() - start
+
+    def timed(fn, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        return (time.perf_counter() - start) / repeat * 1e6
+
+    keys = [str(k) for k in store.keys[rng.integers(0, args.rows, args.updates)]]
+    new_priority = rng.uniform(0, queue.priority.max(), args.updates)
+    updates = iter(zip(keys, new_priority))
+    update_us = timed(lambda: queue.update(*next(updates)), args.updates)
+    top_us = timed(lambda: queue.top(args.top), 100)
+    best = queue.top(args.top)
+    claimed = queue.pop(args.top)
+    ordered = all(a[1] >= b[1] for a, b in zip(claimed, claimed[1:]))
+    print(json.dumps({
+        'accounts': args.rows,
+        'build_s': build_s,
+        'update_us': update_us,
+        f'top_{args.top}_us': top_us,
+        f'pop_{args.top}_matches_top': claimed == best and ordered,
+        'heap_mb': (queue.heap.nbytes + queue.pos.nbytes + queue.priority.nbytes) / 2 ** 20,
+    }, indent=2))
@@ -0,0 +1,463 @@
+import json
+import numpy as np
+
+ARRAY_NAMES = ('feature', 'threshold', 'left', 'right', 'value', 'missing_left', 'missing_kind', 'float32',
+               'roots', 'tree_estimator', 'step_offset', 'step_scale', 'expected')
+
+BLOCK_ROWS = 2048
+
+# Per-node missing-value handling.
+MISSING_NAN = 0        # NaN follows missing_left (sklearn, XGBoost, LightGBM missing_type=NaN)
+MISSING_AS_ZERO = 1    # NaN is compared as 0.0 (LightGBM missing_type=None)
+MISSING_ZERO = 2       # NaN and zero follow missing_left (LightGBM missing_type=Zero)
+LIGHTGBM_ZERO_THRESHOLD = 1e-35
+
+
+class CompiledEnsemble:
+    # prediction_pipeline.pkl flattened into NumPy arrays: scaler/one-hot constants plus the
+    # nodes of every tree, scored with a batched traversal. Needs only numpy (and a DataFrame
+    # input) at serving time.
+
+    def __init__(self, meta, arrays):
+        self.meta = meta
+        self.steps = meta['preprocess']
+        self.estimators = meta['estimators']
+        for estimator in self.estimators:
+            if 'depth' not in estimator:
+                # Exports from before per-estimator depths only carry the ensemble-wide one, which
+                # is deep enough for every estimator since leaves point at themselves.
+                if 'max_depth' not in meta:
+                    raise ValueError("Compiled model has no tree depths; re-export it with compiled_model.py")
+                estimator['depth'] = meta['max_depth']
+        self.weights = np.asarray([e['weight'] for e in self.estimators], dtype=np.float64)
+        self.arrays = arrays
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays.get(name))  # 'expected' is missing from exports that predate contributions()
+        # Float32 splits read from a float32-rounded copy of X stacked after the float64 columns,
+        # so each traversal step is a single gather. Leaves point at themselves.
+        self.column = np.where(self.feature < 0, 0, self.feature + self.float32 * meta['n_features']).astype(np.intp)
+        self.children = np.column_stack([self.right, self.left]).ravel().astype(np.intp)  # [2 * node + go_left]
+        self.roots = self.roots.astype(np.intp)
+        self.has_zero_missing = bool((self.missing_kind == MISSING_ZERO).any())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            arrays = {k: data[k] for k in ARRAY_NAMES if k in data.files}
+            meta = json.loads(str(data['meta']))
+        return cls(meta, arrays)
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(self.meta)), **self.arrays)
+
+    def transform(self, df):
+        n = len(df)
+        columns = []
+        for step in self.steps:
+            if step['kind'] == 'onehot':
+                for column, categories in zip(step['columns'], step['categories']):
+                    values = df[column].to_numpy(dtype=object)
+                    for category in categories:
+                        columns.append((values == category).astype(np.float64))
+                continue
+            block = df[step['columns']].to_numpy(dtype=np.float64)
+            offset = self.step_offset[step['start']:step['stop']]
+            scale = self.step_scale[step['start']:step['stop']]
+            if step['kind'] == 'standard':
+                block = (block - offset) / scale
+            elif step['kind'] == 'minmax':
+                block = block * scale + offset
+            columns.extend(block.T)
+        return np.column_stack(columns) if columns else np.empty((n, 0))
+
+    def _blocks(self, X):
+        # Row blocks keep the (rows x trees) node arrays cache-sized. Yields (rows, flat block,
+        # row offsets into it, whether missing-value rules are needed).
+        X = np.asarray(X, dtype=np.float64)
+        X = np.hstack([X, X.astype(np.float32).astype(np.float64)])
+        careful = self.has_zero_missing or np.isnan(X).any()
+        for start in range(0, len(X), BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            offsets = (np.arange(len(block)) * block.shape[1])[:, None]
+            yield slice(start, start + len(block)), block.ravel(), offsets, careful
+
+    def _step(self, nodes, flat, offsets, careful):
+        x = flat[offsets + self.column[nodes]]
+        go_left = x <= self.threshold[nodes]
+        if careful:
+            go_left = self._missing_left(nodes, x, go_left)
+        return self.children[2 * nodes + go_left]
+
+    def leaf_values(self, X):
+        out = np.empty((len(X), len(self.roots)))
+        for rows, flat, offsets, careful in self._blocks(X):
+            # Each estimator only walks as deep as its deepest tree.
+            for estimator in self.estimators:
+                trees = slice(estimator['start'], estimator['stop'])
+                nodes = np.broadcast_to(self.roots[trees], (len(offsets), trees.stop - trees.start))
+                for _ in range(estimator['depth']):
+                    nodes = self._step(nodes, flat, offsets, careful)
+                out[rows, trees] = self.value[nodes]
+        return out
+
+    def _missing_left(self, nodes, x, go_left):
+        kind = self.missing_kind[nodes]
+        nan = np.isnan(x)
+        as_zero = nan & (kind == MISSING_AS_ZERO)
+        go_left = np.where(as_zero, 0.0 <= self.threshold[nodes], go_left)
+        missing = np.where(kind == MISSING_ZERO, nan | (np.abs(x) <= LIGHTGBM_ZERO_THRESHOLD),
+                           nan & (kind == MISSING_NAN))
+        return np.where(missing, self.missing_left[nodes], go_left)
+
+    def predict_proba(self, df):
+        leaves = self.leaf_values(self.transform(df))
+        probas = []
+        for estimator in self.estimators:
+            total = leaves[:, estimator['start']:estimator['stop']].sum(axis=1)
+            if estimator['kind'] == 'mean':
+                probas.append(total / (estimator['stop'] - estimator['start']))
+            else:
+                raw = estimator['base'] + total
+                probas.append(1 / (1 + np.exp(-estimator['sigmoid'] * raw)))
+        positive = np.average(np.column_stack(probas), axis=1, weights=self.weights)
+        return np.column_stack([1 - positive, positive])
+
+    def input_columns(self):
+        # Model input column of every transformed feature; one-hot groups map back to their column.
+        columns = []
+        for step in self.steps:
+            if step['kind'] == 'onehot':
+                for column, categories in zip(step['columns'], step['categories']):
+                    columns.extend([column] * len(categories))
+            else:
+                columns.extend(step['columns'])
+        return columns
+
+    def contributions(self, df):
+        # Per-row attribution of the default probability to the model's input columns, by the
+        # path method (what shap's TreeExplainer does with approximate=True): every split passes
+        # the change in the tree's expected value to its feature. Boosted models' log-odds
+        # contributions are rescaled so each estimator's add up to its probability change.
+        # Returns (base probability, rows x columns contributions, column names), where base plus a
+        # row's sum is its predict_proba()[:, 1].
+        if self.expected is None:
+            raise ValueError("This compiled model has no node expectations; export it again with compiled_model.py")
+        X = self.transform(df)
+        n, n_features = X.shape
+        raw = np.zeros((n, len(self.estimators), n_features))
+        for rows, flat, offsets, careful in self._blocks(X):
+            flat_rows = (np.arange(len(offsets)) * n_features)[:, None]
+            for e, estimator in enumerate(self.estimators):
+                trees = slice(estimator['start'], estimator['stop'])
+                nodes = np.broadcast_to(self.roots[trees], (len(offsets), trees.stop - trees.start))
+                block = np.zeros(len(offsets) * n_features)
+                for _ in range(estimator['depth']):
+                    following = self._step(nodes, flat, offsets, careful)
+                    split = self.feature[nodes] >= 0  # leaves point at themselves and add nothing
+                    delta = self.expected[following] - self.expected[nodes]
+                    block += np.bincount((flat_rows + self.feature[nodes])[split], delta[split],
+                                         minlength=len(block))
+                    nodes = following
+                raw[rows, e] = block.reshape(len(offsets), n_features)
+        base = 0.0
+        phi = np.zeros((n, n_features))
+        for e, estimator in enumerate(self.estimators):
+            trees = slice(estimator['start'], estimator['stop'])
+            expected_raw = self.expected[self.roots[trees]].sum()
+            if estimator['kind'] == 'mean':
+                count = trees.stop - trees.start
+                estimator_base, estimator_phi = expected_raw / count, raw[:, e] / count
+            else:
+                margin_base = estimator['base'] + expected_raw
+                margin_change = raw[:, e].sum(axis=1)
+                estimator_base = 1 / (1 + np.exp(-estimator['sigmoid'] * margin_base))
+                change = 1 / (1 + np.exp(-estimator['sigmoid'] * (margin_base + margin_change))) - estimator_base
+                slope = estimator['sigmoid'] * estimator_base * (1 - estimator_base)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    scale = np.where(margin_change != 0, change / margin_change, slope)
+                estimator_phi = raw[:, e] * scale[:, None]
+            weight = self.weights[e] / self.weights.sum()
+            base += weight * estimator_base
+            phi += weight * estimator_phi
+        columns = self.input_columns()
+        names = list(dict.fromkeys(columns))
+        to_input = np.zeros((n_features, len(names)))
+        to_input[np.arange(n_features), [names.index(c) for c in columns]] = 1
+        return base, phi @ to_input, names
+
+
+class _TreeBuilder:
+    def __init__(self):
+        self.nodes = {k: [] for k in ('feature', 'threshold', 'left', 'right', 'value', 'missing_left',
+                                      'missing_kind', 'float32', 'expected')}
+        self.roots, self.tree_estimator = [], []
+        self.depths = []
+
+    def add_tree(self, nodes, estimator_index, strict, float32, depth):
+        # nodes: list of (feature, threshold, left, right, value, missing_left, missing_kind, cover)
+        # with local child indices, children after their parent; leaves have feature -1.
+        base = len(self.nodes['feature'])
+        self.roots.append(base)
+        self.tree_estimator.append(estimator_index)
+        self.depths.append(depth)
+        # Expected output under each node: its leaves' values weighted by training cover.
+        expected, weight = [0.0] * len(nodes), [0.0] * len(nodes)
+        for i in reversed(range(len(nodes))):
+            feature, _, left, right, value, _, _, cover = nodes[i]
+            if feature < 0:
+                expected[i], weight[i] = value, max(cover, 1e-12)
+            else:
+                weight[i] = weight[left] + weight[right]
+                expected[i] = (expected[left] * weight[left] + expected[right] * weight[right]) / weight[i]
+        self.nodes['expected'].extend(expected)
+        for i, (feature, threshold, left, right, value, missing_left, missing_kind, _) in enumerate(nodes):
+            leaf = feature < 0
+            self.nodes['feature'].append(-1 if leaf else feature)
+            # x < t is stored as x <= (largest float below t) so every node uses one comparison.
+            self.nodes['threshold'].append(np.nextafter(threshold, -np.inf) if strict and not leaf else threshold)
+            self.nodes['left'].append(base + (i if leaf else left))
+            self.nodes['right'].append(base + (i if leaf else right))
+            self.nodes['value'].append(value)
+            self.nodes['missing_left'].append(missing_left)
+            self.nodes['missing_kind'].append(missing_kind)
+            self.nodes['float32'].append(float32)
+
+    def arrays(self):
+        return {
+            'feature': np.asarray(self.nodes['feature'], dtype=np.int32),
+            'threshold': np.asarray(self.nodes['threshold'], dtype=np.float64),
+            'left': np.asarray(self.nodes['left'], dtype=np.int32),
+            'right': np.asarray(self.nodes['right'], dtype=np.int32),
+            'value': np.asarray(self.nodes['value'], dtype=np.float64),
+            'expected': np.asarray(self.nodes['expected'], dtype=np.float64),
+            'missing_left': np.asarray(self.nodes['missing_left'], dtype=bool),
+            'missing_kind': np.asarray(self.nodes['missing_kind'], dtype=np.int8),
+            'float32': np.asarray(self.nodes['float32'], dtype=bool),
+            'roots': np.asarray(self.roots, dtype=np.int32),
+            'tree_estimator': np.asarray(self.tree_estimator, dtype=np.int16),
+        }
+
+
+def _sklearn_tree_nodes(tree, leaf_value):
+    # sklearn compares float32-cast inputs with x <= threshold.
+    missing_left = getattr(tree, 'missing_go_to_left', np.zeros(tree.node_count, dtype=np.uint8))
+    nodes = [
+        (int(tree.feature[i]) if tree.children_left[i] != -1 else -1, float(tree.threshold[i]),
+         int(tree.children_left[i]), int(tree.children_right[i]), leaf_value(i), bool(missing_left[i]), MISSING_NAN,
+         float(tree.weighted_n_node_samples[i]))
+        for i in range(tree.node_count)
+    ]
+    return nodes, int(tree.max_depth)
+
+
+def _lightgbm_tree_nodes(structure):
+    nodes = []
+
+    def visit(node, depth):
+        index = len(nodes)
+        nodes.append(None)
+        if 'leaf_value' in node:
+            nodes[index] = (-1, 0.0, 0, 0, float(node['leaf_value']), False, MISSING_NAN, float(node.get('leaf_count', 1)))
+            return depth
+        if node['decision_type'] != '<=':
+            raise ValueError("LightGBM categorical splits are not supported by the compiled model")
+        left_depth = visit(node['left_child'], depth + 1)
+        right_index = len(nodes)
+        right_depth = visit(node['right_child'], depth + 1)
+        kind = {'None': MISSING_AS_ZERO, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}[node['missing_type']]
+        nodes[index] = (int(node['split_feature']), float(node['threshold']), index + 1, right_index, 0.0,
+                        bool(node['default_left']), kind, float(node.get('internal_count', 1)))
+        return max(left_depth, right_depth)
+
+    depth = visit(structure, 0)
+    return nodes, depth
+
+
+def _xgboost_tree_nodes(tree, feature_index):
+    # XGBoost compares float32 values with x < split_condition.
+    flat = []
+
+    def collect(node, depth):
+        flat.append((node, depth))
+        for child in node.get('children', []):
+            collect(child, depth + 1)
+
+    collect(tree, 0)
+    local = {node['nodeid']: i for i, (node, _) in enumerate(flat)}
+    nodes = []
+    for node, _ in flat:
+        if 'leaf' in node:
+            nodes.append((-1, 0.0, 0, 0, float(node['leaf']), False, MISSING_NAN, float(node.get('cover', 1))))
+            continue
+        if 'split_condition' not in node:
+            raise ValueError("XGBoost categorical splits are not supported by the compiled model")
+        threshold = float(np.float32(node['split_condition']))
+        nodes.append((feature_index(node['split']), threshold, local[node['yes']], local[node['no']], 0.0,
+                      node['missing'] == node['yes'], MISSING_NAN, float(node.get('cover', 1))))
+    return nodes, max(depth for _, depth in flat)
+
+
+def _compile_estimator(model, index, builder):
+    # Returns the estimator's aggregation spec after adding its trees to the builder.
+    name = type(model).__name__
+    start = len(builder.roots)
+    if name in ('RandomForestClassifier', 'ExtraTreesClassifier'):
+        for tree in model.estimators_:
+            t = tree.tree_
+            nodes, depth = _sklearn_tree_nodes(t, lambda i: float(t.value[i, 0, 1] / t.value[i, 0].sum()))
+            builder.add_tree(nodes, index, strict=False, float32=True, depth=depth)
+        return {'kind': 'mean', 'start': start, 'stop': len(builder.roots)}
+    if name == 'GradientBoostingClassifier':
+        if model.n_classes_ != 2:
+            raise ValueError("Only binary GradientBoostingClassifier models can be compiled")
+        rate = model.learning_rate
+        for tree in model.estimators_[:, 0]:
+            t = tree.tree_
+            nodes, depth = _sklearn_tree_nodes(t, lambda i: float(t.value[i, 0, 0] * rate))
+            builder.add_tree(nodes, index, strict=False, float32=True, depth=depth)
+        base = float(model._raw_predict_init(np.zeros((1, model.n_features_in_)))[0, 0])
+        return {'kind': 'logit', 'start': start, 'stop': len(builder.roots), 'base': base, 'sigmoid': 1.0}
+    if name == 'LGBMClassifier':
+        dump = model.booster_.dump_model()
+        objective = dump['objective'].split()
+        if objective[0] != 'binary' or dump.get('average_output'):
+            raise ValueError(f"Unsupported LightGBM objective '{dump['objective']}'")
+        sigmoid = float(next((p.split(':')[1] for p in objective[1:] if p.startswith('sigmoid:')), 1.0))
+        for tree in dump['tree_info']:
+            nodes, depth = _lightgbm_tree_nodes(tree['tree_structure'])
+            builder.add_tree(nodes, index, strict=False, float32=False, depth=depth)
+        return {'kind': 'logit', 'start': start, 'stop': len(builder.roots), 'base': 0.0, 'sigmoid': sigmoid}
+    if name == 'XGBClassifier':
+        booster = model.get_booster()
+        config = json.loads(booster.save_config())['learner']
+        if config['objective']['name'] != 'binary:logistic':
+            raise ValueError(f"Unsupported XGBoost objective '{config['objective']['name']}'")
+        base_score = float(config['learner_model_param']['base_score'].strip('[]'))
+        names = booster.feature_names or []
+        lookup = {n: i for i, n in enumerate(names)}
+
+        def feature_index(split):
+            return lookup[split] if split in lookup else int(split[1:])
+
+        for dumped in booster.get_dump(dump_format='json', with_stats=True):
+            nodes, depth = _xgboost_tree_nodes(json.loads(dumped), feature_index)
+            builder.add_tree(nodes, index, strict=True, float32=True, depth=depth)
+        base = float(np.log(base_score / (1 - base_score)))
+        return {'kind': 'logit', 'start': start, 'stop': len(builder.roots), 'base': base, 'sigmoid': 1.0}
+    raise ValueError(f"Cannot compile estimator of type {name}")
+
+
+def _compile_transformer(transformer, columns, steps, offsets, scales):
+    name = type(transformer).__name__
+    if transformer == 'drop':
+        return
+    if transformer == 'passthrough':
+        name, offset, scale = 'passthrough', np.zeros(len(columns)), np.ones(len(columns))
+    elif name == 'StandardScaler':
+        offset = transformer.mean_ if transformer.mean_ is not None else np.zeros(len(columns))
+        scale = transformer.scale_ if transformer.scale_ is not None else np.ones(len(columns))
+        name = 'standard'
+    elif name == 'MinMaxScaler':
+        offset, scale, name = transformer.min_, transformer.scale_, 'minmax'
+    elif name == 'OneHotEncoder':
+        categories = []
+        for i, values in enumerate(transformer.categories_):
+            values = [v.item() if hasattr(v, 'item') else v for v in values]
+            drop = transformer.drop_idx_[i] if transformer.drop_idx_ is not None else None
+            categories.append([v for j, v in enumerate(values) if drop is None or j != drop])
+        steps.append({'kind': 'onehot', 'columns': list(columns), 'categories': categories})
+        return
+    else:
+        raise ValueError(f"Cannot compile preprocessing step of type {name}")
+    start = sum(len(o) for o in offsets)
+    offsets.append(np.asarray(offset, dtype=np.float64))
+    scales.append(np.asarray(scale, dtype=np.float64))
+    steps.append({'kind': name, 'columns': list(columns), 'start': start, 'stop': start + len(columns)})
+
+
+def compile_pipeline(pipeline):
+    steps, offsets, scales = [], [], []
+    transformers = pipeline.steps[:-1] if hasattr(pipeline, 'steps') else []
+    model = pipeline.steps[-1][1] if hasattr(pipeline, 'steps') else pipeline
+    if len(transformers) > 1:
+        raise ValueError("Only a single preprocessing step (ColumnTransformer or scaler) can be compiled")
+    for _, transformer in transformers:
+        if type(transformer).__name__ == 'ColumnTransformer':
+            names = list(transformer.feature_names_in_)
+            for _, fitted, columns in transformer.transformers_:
+                columns = [names[c] if isinstance(c, (int, np.integer)) else c for c in np.atleast_1d(columns)]
+                if hasattr(fitted, 'steps'):
+                    if len(fitted.steps) != 1:
+                        raise ValueError("Nested pipelines must hold a single transformer")
+                    fitted = fitted.steps[0][1]
+                _compile_transformer(fitted, columns, steps, offsets, scales)
+        else:
+            _compile_transformer(transformer, list(transformer.feature_names_in_), steps, offsets, scales)
+
+    builder = _TreeBuilder()
+    if type(model).__name__ == 'VotingClassifier':
+        if model.voting != 'soft':
+            raise ValueError("Only soft-voting ensembles can be compiled")
+        weights = model.weights or [1] * len(model.estimators_)
+        members = [(m, w) for m, w in zip(model.estimators_, weights)]
+    else:
+        members = [(model, 1)]
+    estimators = []
+    for index, (member, weight) in enumerate(members):
+        spec = _compile_estimator(member, index, builder)
+        spec['weight'] = float(weight)
+        spec['depth'] = max(builder.depths[spec['start']:spec['stop']])
+        estimators.append(spec)
+
+    arrays = builder.arrays()
+    arrays['step_offset'] = np.concatenate(offsets) if offsets else np.zeros(0)
+    arrays['step_scale'] = np.concatenate(scales) if scales else np.zeros(0)
+    n_features = sum(step['stop'] - step['start'] if 'stop' in step else sum(map(len, step['categories']))
+                     for step in steps) if transformers else model.n_features_in_
+    meta = {'preprocess': steps, 'estimators': estimators, 'n_features': int(n_features)}
+    return CompiledEnsemble(meta, arrays)
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import time
+    import joblib
+    import pandas as pd
+    from features import create_features
+
+    parser = argparse.ArgumentParser(description="Compile prediction_pipeline.pkl into a NumPy-only model.")
+    parser.add_argument('--model', default='prediction_pipeline.pkl')
+    parser.add_argument('--out', default='compiled_model.npz')
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--repeat', type=int, default=200, help="single-row calls timed for the latency report")
+    args = parser.parse_args()
+
+    from risk_table import fingerprint
+
+    pipeline = joblib.load(args.model)
+    exported = compile_pipeline(pipeline)
+    exported.meta['source_fingerprint'] = fingerprint(args.model)  # finds the pickle's drift baseline
+    exported.save(args.out)
+    compiled = CompiledEnsemble.load(args.out)
+
+    featured = create_features(pd.read_csv(args.data))
+    max_error = float(np.abs(pipeline.predict_proba(featured)[:, 1] - compiled.predict_proba(featured)[:, 1]).max())
+    base, contributions, _ = compiled.contributions(featured)
+    contribution_error = float(np.abs(base + contributions.sum(axis=1) - compiled.predict_proba(featured)[:, 1]).max())
+
+    def single_row_ms(model):
+        rows = [featured.iloc[[i % len(featured)]] for i in range(args.repeat)]
+        start = time.perf_counter()
+        for row in rows:
+            model.predict_proba(row)
+        return (time.perf_counter() - start) / args.repeat * 1000
+
+    pipeline_ms, compiled_ms = single_row_ms(pipeline), single_row_ms(compiled)
+    print(json.dumps({
+        'max_abs_error': max_error,
+        'max_contribution_sum_error': contribution_error,
+        'single_row_ms': {'pipeline': pipeline_ms, 'compiled': compiled_ms, 'speedup': pipeline_ms / compiled_ms},
+        'artifact_bytes': {'pipeline': os.path.getsize(args.model), 'compiled': os.path.getsize(args.out)},
+    }, indent=2))
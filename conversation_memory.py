@@ -0,0 +1,100 @@
+import os
+import re
+from collections import deque
+from prerouter import detect_phases
+
+HISTORY_MAX_MESSAGES = int(os.environ.get('FINBOT_HISTORY_MESSAGES', 8))
+HISTORY_TOKEN_BUDGET = int(os.environ.get('FINBOT_HISTORY_TOKEN_BUDGET', 1200))
+
+# Highest matching rung of the ARRANGEMENT LADDER offered in a FinBot message.
+OFFER_PATTERNS = [
+    (4, re.compile(r"hardship specialist|human specialist|escalat", re.IGNORECASE)),
+    (3, re.compile(r"\bdefer(?:ral|red|ring)?\b|extension", re.IGNORECASE)),
+    (2, re.compile(r"\bsplit\b|two (?:parts|installments|instalments|dates|payments)", re.IGNORECASE)),
+    (1, re.compile(r"payment link|pay (?:it )?now|clear (?:it|the full|today)", re.IGNORECASE)),
+]
+REFUSAL_PATTERN = re.compile(r"\b(?:no|nope|can't|cannot|won't|unable|not able|not possible|refuse|don't want)\b", re.IGNORECASE)
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class ConversationMemory:
+    # Keeps the latest messages verbatim within a token budget and folds older ones into
+    # the conversation state the prompt asks the model to track.
+
+    def __init__(self, max_messages=HISTORY_MAX_MESSAGES, token_budget=HISTORY_TOKEN_BUDGET):
+        self.max_messages = max_messages
+        self.token_budget = token_budget
+        self.reset()
+
+    def reset(self):
+        self.recent = deque()
+        self.recent_tokens = 0
+        self.folded_messages = 0
+        self.synced = 0
+        self.state = {
+            'offer_level': 0,
+            'refusals': 0,
+            'dispute_open': False,
+            'complaint_open': False,
+            'concession_requested': False,
+            'third_party': False,
+            'last_offer': None,
+        }
+        self._rendered = None
+
+    def _track(self, role, text):
+        if role == 'FinBot':
+            for level, pattern in OFFER_PATTERNS:
+                if pattern.search(text):
+                    if level >= self.state['offer_level']:
+                        self.state['offer_level'] = level
+                        self.state['last_offer'] = text[:160]
+                    break
+            return
+        phases = detect_phases(text)
+        self.state['dispute_open'] |= 'P0_CRITICAL' in phases
+        self.state['complaint_open'] |= 'P1_COMPLAINT' in phases
+        self.state['concession_requested'] |= 'P0_9_HR_BLOCK' in phases
+        self.state['third_party'] |= 'P0_2_PRIVACY' in phases
+        if self.state['offer_level'] and REFUSAL_PATTERN.search(text):
+            self.state['refusals'] += 1
+
+    def append(self, role, text):
+        self._track(role, text)
+        tokens = estimate_tokens(text)
+        self.recent.append((role, text, tokens))
+        self.recent_tokens += tokens
+        while len(self.recent) > 1 and (len(self.recent) > self.max_messages or self.recent_tokens > self.token_budget):
+            _, _, dropped = self.recent.popleft()
+            self.recent_tokens -= dropped
+            self.folded_messages += 1
+        self._rendered = None
+
+    def sync(self, history):
+        # Consumes only the (user, bot) pairs added since the last call.
+        if len(history) < self.synced:
+            self.reset()
+        for user_text, bot_text in history[self.synced:]:
+            if user_text:
+                self.append('Customer', user_text)
+            if bot_text:
+                self.append('FinBot', bot_text)
+        self.synced = len(history)
+
+    def summary(self):
+        state = self.state
+        last_offer = f'; last_offer="{state["last_offer"]}"' if state['last_offer'] else ""
+        return (f"[Earlier in this chat ({self.folded_messages} messages condensed): "
+                f"offer_level={state['offer_level']}; refusals={state['refusals']}; "
+                f"dispute_open={state['dispute_open']}; complaint_open={state['complaint_open']}; "
+                f"concession_requested={state['concession_requested']}; third_party={state['third_party']}{last_offer}]")
+
+    def render(self):
+        if self._rendered is None:
+            lines = [self.summary()] if self.folded_messages else []
+            lines.extend(f"{role}: {text}" for role, text, _ in self.recent)
+            self._rendered = "\n".join(lines)
+        return self._rendered
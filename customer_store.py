@@ -0,0 +1,160 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+KEY_COLUMN = 'CustomerID'
+CATEGORICAL_COLUMNS = ['Location', 'EmploymentStatus', 'LoanType']
+META_FILE = 'store_meta.json'
+
+
+def _compact_column(series):
+    if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+        cat = series.astype('category')
+        codes = cat.cat.codes.to_numpy()
+        return pd.to_numeric(pd.Series(codes), downcast='integer').to_numpy(), [str(c) for c in cat.cat.categories]
+    values = series.to_numpy()
+    if np.issubdtype(values.dtype, np.integer):
+        return pd.to_numeric(series, downcast='integer').to_numpy(), None
+    # Only narrow floats when the round trip is exact, so scores stay identical to the CSV path.
+    narrowed = values.astype(np.float32)
+    if np.array_equal(narrowed.astype(values.dtype), values, equal_nan=True):
+        return narrowed, None
+    return values, None
+
+
+class CustomerStore:
+    # Columnar customer table with a sorted CustomerID index. Columns are held in
+    # compact dtypes (category codes, downcast ints) and can be memory-mapped from disk.
+
+    def __init__(self, columns, dtypes, categories, keys, order, column_order):
+        self.columns = columns
+        self.dtypes = dtypes
+        self.categories = categories
+        self.keys = keys
+        self.order = order
+        self.column_order = column_order
+
+    @classmethod
+    def from_frame(cls, df):
+        columns, dtypes, categories = {}, {}, {}
+        for name in df.columns:
+            if name == KEY_COLUMN:
+                continue
+            values, labels = _compact_column(df[name])
+            columns[name] = values
+            if labels is not None:
+                categories[name] = labels
+                dtypes[name] = 'object'
+            else:
+                dtypes[name] = str(df[name].dtype)
+        ids = df[KEY_COLUMN].astype(str).to_numpy().astype(str)
+        order = np.argsort(ids, kind='stable')
+        keys = ids[order]
+        order = pd.to_numeric(pd.Series(order), downcast='unsigned').to_numpy()
+        return cls(columns, dtypes, categories, keys, order, list(df.columns))
+
+    @classmethod
+    def from_csv(cls, path):
+        header = pd.read_csv(path, nrows=0).columns
+        dtype = {c: 'category' for c in CATEGORICAL_COLUMNS if c in header}
+        return cls.from_frame(pd.read_csv(path, dtype=dtype))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name, values in self.columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), values)
+        np.save(os.path.join(directory, '_keys.npy'), self.keys)
+        np.save(os.path.join(directory, '_order.npy'), self.order)
+        meta = {'column_order': self.column_order, 'dtypes': self.dtypes, 'categories': self.categories}
+        with open(os.path.join(directory, META_FILE), 'w') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def open(cls, directory, mmap_mode='r'):
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        columns = {
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in meta['column_order'] if name != KEY_COLUMN
+        }
+        keys = np.load(os.path.join(directory, '_keys.npy'), mmap_mode=mmap_mode)
+        order = np.load(os.path.join(directory, '_order.npy'), mmap_mode=mmap_mode)
+        return cls(columns, meta['dtypes'], meta['categories'], keys, order, meta['column_order'])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, customer_id):
+        return self.lookup(customer_id) is not None
+
+    def lookup(self, customer_id):
+        i = np.searchsorted(self.keys, customer_id)
+        if i < len(self.keys) and self.keys[i] == customer_id:
+            return int(self.order[i])
+        return None
+
+    def _decode(self, name, values):
+        if name in self.categories:
+            # Missing values are stored as code -1, which picks the trailing NaN (as read_csv gives).
+            return np.asarray(self.categories[name] + [np.nan], dtype=object)[values]
+        return np.asarray(values).astype(self.dtypes[name])
+
+    def rows(self, positions, customer_ids):
+        positions = np.asarray(positions)
+        data = {}
+        for name in self.column_order:
+            if name == KEY_COLUMN:
+                data[name] = np.asarray(customer_ids, dtype=object)
+            else:
+                data[name] = self._decode(name, self.columns[name][positions])
+        return pd.DataFrame(data)
+
+    def get(self, customer_id):
+        position = self.lookup(customer_id)
+        if position is None:
+            return None
+        return self.rows([position], [customer_id])
+
+    def customer_ids(self):
+        ids = np.empty(len(self.keys), dtype=self.keys.dtype)
+        ids[self.order] = self.keys
+        return ids
+
+    def to_frame(self):
+        return self.rows(np.arange(len(self)), self.customer_ids())
+
+
+def load_customer_store(csv_path, store_dir=None):
+    # With a store_dir, the columnar copy is (re)built when the CSV is newer and then memory-mapped.
+    if not store_dir:
+        return CustomerStore.from_csv(csv_path)
+    meta_path = os.path.join(store_dir, META_FILE)
+    if not os.path.exists(meta_path) or os.path.getmtime(meta_path) < os.path.getmtime(csv_path):
+        CustomerStore.from_csv(csv_path).save(store_dir)
+    return CustomerStore.open(store_dir)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from synthetic_data import make_portfolio
+
+    # Round trip through the in-memory and on-disk store, including missing values.
+    df = make_portfolio(5_000, categorical=False)
+    rng = np.random.default_rng(0)
+    for name in ['Location', 'EmploymentStatus', 'LoanType', 'SentimentScore']:
+        df.loc[rng.random(len(df)) < 0.05, name] = np.nan
+    store = CustomerStore.from_frame(df)
+    with tempfile.TemporaryDirectory() as directory:
+        store.save(directory)
+        stores = {'memory': store, 'disk': CustomerStore.open(directory)}
+        mismatched = {}
+        for kind, candidate in stores.items():
+            restored = candidate.rows(candidate.order, candidate.keys).set_index(KEY_COLUMN)
+            expected = df.set_index(KEY_COLUMN).loc[restored.index]
+            mismatched[kind] = [name for name in expected.columns
+                                if not expected[name].reset_index(drop=True).equals(restored[name].reset_index(drop=True))]
+    print(json.dumps({'rows': len(df), 'missing_values': int(df.isna().sum().sum()), 'mismatched_columns': mismatched},
+                     indent=2))
+    if any(mismatched.values()):
+        raise SystemExit(1)
@@ -0,0 +1,266 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from feature_engine import create_features_fast
+from risk_table import fingerprint
+
+DRIFT_BINS = int(os.environ.get('FINBOT_DRIFT_BINS', 20))
+DRIFT_BASELINE_SAMPLE = int(os.environ.get('FINBOT_DRIFT_BASELINE_SAMPLE', 200_000))
+DRIFT_WINDOW = int(os.environ.get('FINBOT_DRIFT_WINDOW', 20_000))  # observations before older ones are halved
+DRIFT_BATCH = int(os.environ.get('FINBOT_DRIFT_BATCH', 256))
+DRIFT_MIN_COUNT = int(os.environ.get('FINBOT_DRIFT_MIN_COUNT', 500))
+PSI_WARN = float(os.environ.get('FINBOT_DRIFT_PSI_WARN', 0.1))
+PSI_ALERT = float(os.environ.get('FINBOT_DRIFT_PSI_ALERT', 0.25))
+KS_ALERT = float(os.environ.get('FINBOT_DRIFT_KS_ALERT', 0.15))
+
+# create_features outputs the model sees, plus its score. The two categoricals are binned by code.
+NUMERIC_FEATURES = ['MonthlyRate', 'Emi', 'Dti', 'IrregularPayments', 'DelinquencyScore', 'PaymentRegularity',
+                    'ComplaintRatio', 'ComplaintsPerInteraction', 'DigitalEngagement']
+CATEGORICAL_FEATURES = ['SentimentPolarity', 'CustomerPersona']
+SCORE = 'probability'
+PROPORTION_FLOOR = 1e-4  # keeps PSI finite for bins one side never fills
+
+
+def _values(featured, name):
+    column = featured[name]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    return column.to_numpy()
+
+
+def _proportions(counts):
+    total = counts.sum()
+    return np.maximum(counts / total if total else counts, PROPORTION_FLOOR)
+
+
+def psi(expected, actual):
+    expected, actual = _proportions(expected), _proportions(actual)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks(expected, actual):
+    # Largest gap between the binned CDFs: a lower bound on the exact KS statistic.
+    if not expected.sum() or not actual.sum():
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(expected) / expected.sum() - np.cumsum(actual) / actual.sum())))
+
+
+class DriftBaseline:
+    # Fixed bin edges and the training-time count in each bin, per feature. Bins are baseline
+    # quantiles (ties merged), with open-ended bins below and above; NaN gets its own last bin.
+
+    def __init__(self, edges, counts, fingerprint):
+        self.edges = {name: np.asarray(values, dtype=np.float64) for name, values in edges.items()}
+        self.counts = {name: np.asarray(values, dtype=np.float64) for name, values in counts.items()}
+        self.fingerprint = fingerprint
+
+    def bin(self, name, values):
+        values = np.asarray(values, dtype=np.float64)
+        index = np.searchsorted(self.edges[name], values, side='right')
+        index[np.isnan(values)] = len(self.edges[name]) + 1
+        return index
+
+    def nbins(self, name):
+        return len(self.edges[name]) + 2
+
+    def save(self, path):
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'fingerprint': self.fingerprint,
+                       'edges': {name: values.tolist() for name, values in self.edges.items()},
+                       'counts': {name: values.tolist() for name, values in self.counts.items()}}, f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['edges'], data['counts'], data['fingerprint'])
+
+
+def build_drift_baseline(featured, scores, fingerprint, bins=DRIFT_BINS, sample=DRIFT_BASELINE_SAMPLE, seed=0):
+    # From the model's training data (create_features output) and held-out scores, so live traffic
+    # is compared to what the model learned from rather than to the portfolio it happens to serve.
+    if len(featured) > sample:
+        featured = featured.iloc[np.sort(np.random.default_rng(seed).choice(len(featured), sample, replace=False))]
+    columns = {name: _values(featured, name) for name in NUMERIC_FEATURES + CATEGORICAL_FEATURES}
+    columns[SCORE] = np.asarray(scores)
+    edges = {}
+    for name, values in columns.items():
+        values = np.asarray(values, dtype=np.float64)
+        if name in CATEGORICAL_FEATURES:
+            edges[name] = np.arange(1, values.max() + 1) if len(values) else np.array([])
+        else:
+            finite = values[np.isfinite(values)]
+            quantiles = np.quantile(finite, np.linspace(0, 1, bins + 1)[1:-1]) if len(finite) else []
+            edges[name] = np.unique(quantiles)
+    baseline = DriftBaseline(edges, {}, fingerprint)
+    for name, values in columns.items():
+        baseline.counts[name] = np.bincount(baseline.bin(name, values), minlength=baseline.nbins(name)).astype(np.float64)
+    return baseline
+
+
+def baseline_path(model_path):
+    # Saved next to the model it describes: prediction_pipeline.pkl -> prediction_pipeline.drift.json.
+    return os.path.splitext(model_path)[0] + '.drift.json'
+
+
+def model_fingerprint(pipeline, model_path):
+    # A compiled_model export is identified by the pickle it was compiled from.
+    return getattr(pipeline, 'meta', {}).get('source_fingerprint') or fingerprint(model_path)
+
+
+def load_drift_baseline(path, model_fingerprint):
+    # Only a baseline built for this exact model is used; retrain.py writes one with every model,
+    # and `python drift.py --build` makes one for an older model from its training data.
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no drift baseline at {path}; retrain.py or drift.py --build writes one")
+    baseline = DriftBaseline.load(path)
+    if baseline.fingerprint != model_fingerprint:
+        raise ValueError(f"{path} was built for a different model; rebuild it with drift.py --build")
+    return baseline
+
+
+class DriftMonitor:
+    # Live histograms over the baseline's bins, compared to it with PSI and a binned KS. Memory
+    # is fixed (one small count array per feature); each observation is one searchsorted and
+    # one increment, done a batch at a time. Once the window fills, all counts are halved so the
+    # histograms follow recent traffic. alerts() names the features over threshold.
+
+    def __init__(self, baseline, window=DRIFT_WINDOW, batch_size=DRIFT_BATCH, min_count=DRIFT_MIN_COUNT,
+                 on_alert=None):
+        self.baseline = baseline
+        self.window = window
+        self.batch_size = batch_size
+        self.min_count = min_count
+        self.on_alert = on_alert
+        self.counts = {name: np.zeros_like(counts) for name, counts in baseline.counts.items()}
+        self.total = 0.0
+        self.observed = 0
+        self.alerting = set()
+        self._pending = []
+        self._pending_scores = []
+        self._pending_rows = 0
+        self._lock = threading.Lock()
+
+    def observe_features(self, featured, probability):
+        # Already-featured rows (create_features output) and their default probabilities.
+        columns = {name: _values(featured, name) for name in NUMERIC_FEATURES + CATEGORICAL_FEATURES}
+        columns[SCORE] = np.atleast_1d(np.asarray(probability, dtype=np.float64))
+        with self._lock:
+            for name, values in columns.items():
+                self.counts[name] += np.bincount(self.baseline.bin(name, values), minlength=len(self.counts[name]))
+            self.total += len(featured)
+            self.observed += len(featured)
+            while self.total >= self.window:  # a whole risk-table chunk can be several windows
+                for counts in self.counts.values():
+                    counts *= 0.5
+                self.total *= 0.5
+        self._check()
+
+    def observe_rows(self, rows, probability):
+        # Raw customer rows (e.g. a profile load). Buffered and featured a batch at a time.
+        with self._lock:
+            self._pending.append(rows)
+            self._pending_scores.append(np.atleast_1d(np.asarray(probability, dtype=np.float64)))
+            self._pending_rows += len(rows)
+            if self._pending_rows < self.batch_size:
+                return
+            frames, scores = self._pending, self._pending_scores
+            self._pending, self._pending_scores, self._pending_rows = [], [], 0
+        self.observe_features(create_features_fast(pd.concat(frames, ignore_index=True)), np.concatenate(scores))
+
+    def on_rescored(self, customer_ids, frame, probability):
+        # EventIngestor listener: batch re-scores feed the monitor directly.
+        self.observe_features(create_features_fast(frame), probability)
+
+    def report(self):
+        with self._lock:
+            counts = {name: values.copy() for name, values in self.counts.items()}
+            total, observed = self.total, self.observed
+        features = {}
+        for name, actual in counts.items():
+            expected = self.baseline.counts[name]
+            value_psi, value_ks = psi(expected, actual), ks(expected, actual)
+            if total < self.min_count:
+                status = 'insufficient'
+            elif value_psi >= PSI_ALERT or value_ks >= KS_ALERT:
+                status = 'alert'
+            elif value_psi >= PSI_WARN:
+                status = 'warn'
+            else:
+                status = 'ok'
+            features[name] = {'psi': round(value_psi, 4), 'ks': round(value_ks, 4), 'status': status}
+        return {'observed': observed, 'window_weight': round(total, 1),
+                'alerts': sorted(name for name, result in features.items() if result['status'] == 'alert'),
+                'features': features}
+
+    def alerts(self):
+        return self.report()['alerts']
+
+    def _check(self):
+        # Calls on_alert when a feature crosses into alert. It is re-armed only once the feature
+        # is back to ok, so a value hovering at the threshold raises one alert, not many.
+        if self.total < self.min_count:
+            return
+        statuses = {name: result['status'] for name, result in self.report()['features'].items()}
+        raised = sorted(name for name, status in statuses.items() if status == 'alert' and name not in self.alerting)
+        self.alerting = {name for name in self.alerting if statuses[name] != 'ok'} | set(raised)
+        if raised and self.on_alert:
+            self.on_alert(raised)
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    import joblib
+    from customer_store import load_customer_store
+    from risk_table import score_frame
+
+    parser = argparse.ArgumentParser(description="Build a model's drift baseline, or replay traffic through the monitor.")
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--model', default='prediction_pipeline.pkl', help="a .npz path loads a compiled_model export")
+    parser.add_argument('--baseline', help="baseline file (default: next to the model pickle)")
+    parser.add_argument('--build', action='store_true',
+                        help="build the baseline from --data, taken as the model's training data, and save it")
+    parser.add_argument('--replay', type=int, default=20_000, help="customers sampled from --data to replay as traffic")
+    parser.add_argument('--shift', type=float, default=0.0,
+                        help="add this many days to DelaysDays and scale Income by 1/(1+shift/30) in the replay")
+    args = parser.parse_args()
+
+    if args.model.endswith('.npz'):
+        from compiled_model import CompiledEnsemble
+        pipeline = CompiledEnsemble.load(args.model)
+    else:
+        pipeline = joblib.load(args.model)
+    path = args.baseline or os.environ.get('FINBOT_DRIFT_BASELINE') or baseline_path(args.model)
+    start = time.perf_counter()
+    if args.build:
+        training = pd.read_csv(args.data)
+        baseline = build_drift_baseline(create_features_fast(training), score_frame(pipeline, training)[0],
+                                        model_fingerprint(pipeline, args.model))
+        baseline.save(path)
+    else:
+        baseline = load_drift_baseline(path, model_fingerprint(pipeline, args.model))
+    baseline_seconds = time.perf_counter() - start
+
+    store = load_customer_store(args.data, os.environ.get('FINBOT_STORE_DIR'))
+    positions = np.random.default_rng(1).integers(0, len(store), args.replay)
+    traffic = store.rows(store.order[positions], store.keys[positions])
+    if args.shift:
+        traffic['DelaysDays'] = traffic['DelaysDays'] + int(args.shift)
+        traffic['Income'] = traffic['Income'] / (1 + args.shift / 30)
+    probability, _, _ = score_frame(pipeline, traffic)
+    raised = []
+    monitor = DriftMonitor(baseline, on_alert=raised.extend)
+    start = time.perf_counter()
+    for i in range(0, len(traffic), DRIFT_BATCH):
+        monitor.observe_rows(traffic.iloc[i:i + DRIFT_BATCH], probability[i:i + DRIFT_BATCH])
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        'baseline': path,
+        'baseline_seconds': baseline_seconds,
+        'observations_per_s': len(traffic) / elapsed,
+        'alerts_raised': raised,
+        **monitor.report(),
+    }, indent=2))
@@ -0,0 +1,244 @@
+import fcntl
+import json
+import os
+import threading
+from risk_table import score_frame
+
+EVENT_BATCH_SIZE = int(os.environ.get('FINBOT_EVENT_BATCH', 512))
+
+# Raw columns each event type changes: 'add' increments a column, 'set' copies an event field
+# into it as (field, default); a default of None makes the field required.
+EVENT_TYPES = {
+    'payment_posted': {'set': {'DelaysDays': ('delay_days', 0)}},
+    'partial_payment': {'add': {'PartialPayments': 1}, 'set': {'DelaysDays': ('delay_days', 0)}},
+    'payment_missed': {'add': {'MissedPayments': 1}},
+    'delay_updated': {'set': {'DelaysDays': ('delay_days', None)}},
+    'complaint_logged': {'add': {'Complaints': 1}},
+    'interaction_attempt': {'add': {'InteractionAttempts': 1}},
+    'website_visit': {'add': {'WebsiteVisits': 1}},
+    'app_usage': {'set': {'AppUsageFrequency': ('frequency', None)}},
+    'sentiment': {'set': {'SentimentScore': ('score', None)}},
+}
+
+
+def validate_event(event):
+    # Returns an error string, or None when the event can be applied.
+    if not isinstance(event, dict):
+        return "event must be an object"
+    if not event.get('customer_id'):
+        return "missing customer_id"
+    spec = EVENT_TYPES.get(event.get('type'))
+    if spec is None:
+        return f"unknown event type {event.get('type')!r}"
+    for field, default in spec.get('set', {}).values():
+        value = event.get(field, default)
+        if value is None:
+            return f"'{event['type']}' needs '{field}'"
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return f"'{field}' must be a number"
+    return None
+
+
+class EventLog:
+    # Append-only JSON-lines file that several worker processes write to and each replays from
+    # its own offset, so an event accepted by any worker reaches every worker's overlays.
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        open(path, 'a').close()
+
+    def append(self, events):
+        data = "".join(json.dumps(event) + "\n" for event in events).encode()
+        with open(self.path, 'ab') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released on close
+            f.write(data)
+
+    def read_new(self):
+        if os.path.getsize(self.path) == self.offset:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        complete = data.rfind(b"\n") + 1  # a line still being written is picked up next time
+        self.offset += complete
+        return [json.loads(line) for line in data[:complete].splitlines() if line]
+
+
+class EventIngestor:
+    # Keeps the portfolio current between CSV reloads. Events are queued per customer and
+    # applied in batches: only the touched customers' rows are rebuilt, re-featured, re-scored
+    # and re-personaed. Updated raw values and scores live in overlays in front of the
+    # (read-only, possibly memory-mapped) store and risk table.
+
+    def __init__(self, store, pipeline, batch_size=EVENT_BATCH_SIZE, log=None):
+        self.store = store
+        self.pipeline = pipeline
+        self.batch_size = batch_size
+        self.log = log
+        self.overrides = {}  # customer_id -> {raw column: current value}
+        self.scores = {}     # customer_id -> (probability, base persona, final persona)
+        self.pending = {}    # customer_id -> [event, ...] in arrival order
+        self.pending_events = 0
+        self.applied_events = 0
+        self.listeners = []  # called as listener(customer_ids, raw_frame, probability) after each batch
+        self._lock = threading.RLock()
+
+    def submit(self, events):
+        accepted, rejected = [], []
+        for index, event in enumerate(events):
+            error = validate_event(event)
+            if error is None and self.store.lookup(str(event['customer_id'])) is None:
+                error = f"unknown customer {event['customer_id']}"
+            if error:
+                rejected.append({'index': index, 'error': error})
+            else:
+                accepted.append(event)
+        with self._lock:
+            if self.log is not None:
+                self.log.append(accepted)
+                self._sync()
+            else:
+                self._enqueue(accepted)
+            if self.pending_events >= self.batch_size:
+                self.flush()
+        return {'accepted': len(accepted), 'rejected': rejected}
+
+    def _enqueue(self, events):
+        for event in events:
+            self.pending.setdefault(str(event['customer_id']), []).append(event)
+        self.pending_events += len(events)
+
+    def _sync(self):
+        if self.log is not None:
+            self._enqueue(self.log.read_new())
+
+    def flush(self):
+        with self._lock:
+            self._sync()
+            if not self.pending:
+                return 0
+            pending, self.pending = self.pending, {}
+            self.applied_events += self.pending_events
+            self.pending_events = 0
+            ids = list(pending)
+            frame = self.store.rows([self.store.lookup(c) for c in ids], ids)
+            touched = {column for events in pending.values() for event in events
+                       for part in ('add', 'set') for column in EVENT_TYPES[event['type']].get(part, {})}
+            touched |= {column for c in ids for column in self.overrides.get(c, {})}
+            columns = {column: frame[column].to_numpy().copy() for column in touched}
+            for i, customer_id in enumerate(ids):
+                row = self.overrides.setdefault(customer_id, {})
+                for event in pending[customer_id]:
+                    spec = EVENT_TYPES[event['type']]
+                    for column, delta in spec.get('add', {}).items():
+                        row[column] = row.get(column, columns[column][i]) + delta
+                    for column, (field, default) in spec.get('set', {}).items():
+                        row[column] = event.get(field, default)
+                for column, value in row.items():
+                    columns[column][i] = value
+            for column, values in columns.items():
+                frame[column] = values
+            probability, base_persona, final_persona = score_frame(self.pipeline, frame)
+            for i, customer_id in enumerate(ids):
+                self.scores[customer_id] = (float(probability[i]), base_persona[i], final_persona[i])
+            for listener in self.listeners:
+                listener(ids, frame, probability)
+            return len(ids)
+
+    def lookup(self, customer_id):
+        # Latest (probability, base persona, final persona), or None if no event has touched the customer.
+        with self._lock:
+            self._sync()
+            if customer_id in self.pending:
+                self.flush()
+            return self.scores.get(customer_id)
+
+    def current_row(self, customer_id):
+        # The customer's raw row with every applied event folded in.
+        position = self.store.lookup(customer_id)
+        if position is None:
+            return None
+        with self._lock:
+            self._sync()
+            if customer_id in self.pending:
+                self.flush()
+            row = self.store.rows([position], [customer_id])
+            for column, value in self.overrides.get(customer_id, {}).items():
+                row[column] = [value]
+        return row
+
+    def snapshot(self):
+        # Every customer's overlays and scores with all events so far applied, as plain dicts:
+        # ({customer_id: {raw column: value}}, {customer_id: (probability, base persona, final persona)}).
+        with self._lock:
+            self.flush()
+            return {c: dict(row) for c, row in self.overrides.items()}, dict(self.scores)
+
+    def stats(self):
+        with self._lock:
+            return {'customers_updated': len(self.scores), 'pending_events': self.pending_events,
+                    'applied_events': self.applied_events}
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import random
+    import time
+    import joblib
+    import numpy as np
+    from customer_store import load_customer_store
+    from features import create_features, assign_intelligent_persona
+
+    parser = argparse.ArgumentParser(description="Replay events into the portfolio and measure ingestion throughput.")
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--model', default='prediction_pipeline.pkl')
+    parser.add_argument('--events', help="JSON-lines file of events; random synthetic events when omitted")
+    parser.add_argument('--count', type=int, default=20_000, help="synthetic events to generate")
+    parser.add_argument('--batch-size', type=int, default=EVENT_BATCH_SIZE)
+    parser.add_argument('--verify', type=int, default=50, help="updated customers re-scored the slow way as a check")
+    args = parser.parse_args()
+
+    store = load_customer_store(args.data, os.environ.get('FINBOT_STORE_DIR'))
+    pipeline = joblib.load(args.model)
+    if args.events:
+        with open(args.events) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        rng = random.Random(0)
+        ids = [str(c) for c in store.customer_ids()]
+        fields = {'delay_days': lambda: rng.randint(0, 90), 'frequency': lambda: round(rng.random(), 2),
+                  'score': lambda: round(rng.uniform(-1, 1), 2)}
+        events = []
+        for _ in range(args.count):
+            event_type = rng.choice(list(EVENT_TYPES))
+            event = {'customer_id': rng.choice(ids), 'type': event_type}
+            for field, default in EVENT_TYPES[event_type].get('set', {}).values():
+                event[field] = fields[field]()
+            events.append(event)
+
+    ingestor = EventIngestor(store, pipeline, batch_size=args.batch_size)
+    start = time.perf_counter()
+    result = ingestor.submit(events)
+    ingestor.flush()
+    elapsed = time.perf_counter() - start
+
+    mismatches = 0
+    for customer_id in list(ingestor.scores)[:args.verify]:
+        featured = create_features(ingestor.current_row(customer_id))
+        probability = pipeline.predict_proba(featured)[:, 1][0]
+        expected = (probability, assign_intelligent_persona(featured, probability))
+        actual = ingestor.lookup(customer_id)
+        if not np.isclose(expected[0], actual[0]) or expected[1] != actual[2]:
+            mismatches += 1
+    print(json.dumps({
+        'events': len(events),
+        'accepted': result['accepted'],
+        'rejected': len(result['rejected']),
+        'events_per_s': len(events) / elapsed,
+        'seconds': elapsed,
+        **ingestor.stats(),
+        'verified_customers': min(args.verify, len(ingestor.scores)),
+        'verify_mismatches': mismatches,
+    }, indent=2))
@@ -0,0 +1,204 @@
+import os
+import threading
+import numpy as np
+from feature_engine import create_features_fast
+from risk_table import CHUNK_SIZE, FINGERPRINT_FILE
+
+EXPLANATION_TOP_K = int(os.environ.get('FINBOT_EXPLANATION_TOP_K', 5))
+ARRAYS = ('keys', 'features', 'values', 'names', 'base')
+
+
+def explainer_for(pipeline):
+    # A CompiledEnsemble explains itself; a fitted pipeline is compiled here (ValueError if it
+    # can't be).
+    if hasattr(pipeline, 'contributions'):
+        return pipeline
+    from compiled_model import compile_pipeline
+    return compile_pipeline(pipeline)
+
+
+def top_drivers(contributions, k):
+    # Column indices (int16) and contributions (float16) of each row's k largest |contributions|,
+    # largest first.
+    k = min(k, contributions.shape[1])
+    candidates = np.argpartition(-np.abs(contributions), k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.abs(np.take_along_axis(contributions, candidates, axis=1)), axis=1)
+    index = np.take_along_axis(candidates, order, axis=1)
+    return index.astype(np.int16), np.take_along_axis(contributions, index, axis=1).astype(np.float16)
+
+
+class ExplanationTable:
+    # CustomerID -> top-k drivers of the default probability, sorted by CustomerID like the risk
+    # table and built with the same fingerprint, so both are rebuilt together. Customers that
+    # events re-score are explained again at the same time (on_rescored) and served from an overlay.
+
+    def __init__(self, keys, features, values, names, base, fingerprint, explainer=None, k=EXPLANATION_TOP_K):
+        self.keys = keys
+        self.features = features
+        self.values = values
+        self.names = [str(name) for name in names]
+        self.base = float(base)
+        self.fingerprint = fingerprint
+        self.explainer = explainer
+        self.k = k
+        self.overrides = {}  # customer_id -> [(column, contribution), ...]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _drivers(self, features, values):
+        return [(self.names[f], float(v)) for f, v in zip(features, values)]
+
+    def lookup(self, customer_id):
+        with self._lock:
+            drivers = self.overrides.get(customer_id)
+        if drivers is not None:
+            return drivers
+        i = np.searchsorted(self.keys, customer_id)
+        if i >= len(self.keys) or self.keys[i] != customer_id:
+            return None
+        return self._drivers(self.features[i], self.values[i])
+
+    def on_rescored(self, customer_ids, frame, probability):
+        # EventIngestor listener: explains the rows it just re-scored.
+        if self.explainer is None:
+            return
+        _, contributions, names = self.explainer.contributions(create_features_fast(frame))
+        self.names = self.names or [str(name) for name in names]
+        features, values = top_drivers(contributions, self.k)
+        with self._lock:
+            for customer_id, f, v in zip(customer_ids, features, values):
+                self.overrides[customer_id] = self._drivers(f, v)
+
+    def save(self, path):
+        # Same layout as RiskTable.save: one .npz file, or a directory of .npy files to memory-map.
+        arrays = {'keys': self.keys, 'features': self.features, 'values': self.values,
+                  'names': np.array(self.names), 'base': np.array(self.base)}
+        if path.endswith('.npz'):
+            with open(path, 'wb') as f:
+                np.savez(f, fingerprint=np.array(self.fingerprint), **arrays)
+            return
+        os.makedirs(path, exist_ok=True)
+        for name, values in arrays.items():
+            target = os.path.join(path, f"{name}.npy")
+            with open(target + '.tmp', 'wb') as f:
+                np.save(f, values)
+            os.replace(target + '.tmp', target)
+        with open(os.path.join(path, FINGERPRINT_FILE), 'w') as f:
+            f.write(self.fingerprint)
+
+    @classmethod
+    def load(cls, path, explainer=None):
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                return cls(*(data[name] for name in ARRAYS), str(data['fingerprint']), explainer)
+        with open(os.path.join(path, FINGERPRINT_FILE)) as f:
+            fingerprint = f.read()
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r') for name in ARRAYS]
+        return cls(*arrays, fingerprint, explainer)
+
+
+class LazyExplanationTable(ExplanationTable):
+    # Serves the app while no built table matches the data: each customer is explained the first
+    # time they are looked up (one row through the explainer) and kept in the overlay.
+
+    def __init__(self, explainer, store, fingerprint, k=EXPLANATION_TOP_K):
+        super().__init__(np.asarray(store.keys), None, None, [], 0.0, fingerprint, explainer, k)
+        self.store = store
+
+    def lookup(self, customer_id):
+        with self._lock:
+            drivers = self.overrides.get(customer_id)
+        if drivers is not None:
+            return drivers
+        row = self.store.get(customer_id)
+        if row is None:
+            return None
+        base, contributions, names = self.explainer.contributions(create_features_fast(row))
+        self.base = float(base)
+        self.names = self.names or [str(name) for name in names]
+        features, values = top_drivers(contributions, self.k)
+        drivers = self._drivers(features[0], values[0])
+        with self._lock:
+            self.overrides.setdefault(customer_id, drivers)
+        return drivers
+
+
+def build_explanation_table(explainer, store, fingerprint, k=EXPLANATION_TOP_K, chunk_size=CHUNK_SIZE):
+    n = len(store)
+    features = np.empty((n, k), dtype=np.int16)
+    values = np.empty((n, k), dtype=np.float16)
+    base, names = 0.0, []
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk = create_features_fast(store.rows(store.order[start:stop], store.keys[start:stop]))
+        base, contributions, names = explainer.contributions(chunk)
+        features[start:stop], values[start:stop] = top_drivers(contributions, k)
+    return ExplanationTable(np.asarray(store.keys), features, values, names, base, fingerprint, explainer, k)
+
+
+def load_explanation_table(path, explainer, store, fingerprint, k=EXPLANATION_TOP_K, build=True):
+    # Reuses the table on disk while it matches the risk table's fingerprint. Otherwise it is
+    # built and saved, or with build=False (the app's startup) explained lazily per customer.
+    if path and os.path.exists(path):
+        table = ExplanationTable.load(path, explainer)
+        if table.fingerprint == fingerprint and len(table) == len(store) and table.features.shape[1] == k:
+            return table
+    if not build:
+        return LazyExplanationTable(explainer, store, fingerprint, k)
+    table = build_explanation_table(explainer, store, fingerprint, k)
+    if path:
+        try:
+            table.save(path)
+        except OSError as e:
+            print(f"Warning: could not write explanation table to {path}: {e}")
+    return table
+
+
+def describe_drivers(drivers):
+    # "DelinquencyScore +12.3 pts, Dti -4.0 pts": percentage points of default probability.
+    return ", ".join(f"{name} {value * 100:+.1f} pts" for name, value in drivers)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import time
+    import joblib
+    from customer_store import CustomerStore, load_customer_store
+    from risk_table import fingerprint as file_fingerprint
+    from synthetic_data import make_portfolio
+
+    parser = argparse.ArgumentParser(description="Build the per-customer risk explanation table.")
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--model', default='prediction_pipeline.pkl')
+    parser.add_argument('--out', default=os.environ.get('FINBOT_EXPLANATIONS', 'explanations.npz'))
+    parser.add_argument('--synthetic', type=int, help="time a synthetic portfolio of this many rows; nothing is written")
+    parser.add_argument('--top-k', type=int, default=EXPLANATION_TOP_K)
+    parser.add_argument('--customer', help="print one customer's drivers")
+    args = parser.parse_args()
+
+    explainer = explainer_for(joblib.load(args.model))
+    if args.synthetic:
+        store = CustomerStore.from_frame(make_portfolio(args.synthetic))
+        start = time.perf_counter()
+        table = build_explanation_table(explainer, store, 'synthetic', args.top_k)
+    else:
+        store = load_customer_store(args.data, os.environ.get('FINBOT_STORE_DIR'))
+        start = time.perf_counter()
+        table = load_explanation_table(args.out, explainer, store, file_fingerprint(args.data, args.model), args.top_k)
+    elapsed = time.perf_counter() - start
+    if args.customer:
+        print(f"base {table.base:.1%}: {describe_drivers(table.lookup(args.customer) or [])}")
+    probe = [str(key) for key in table.keys[::max(1, len(table) // 1000)]]
+    lookup_start = time.perf_counter()
+    for customer_id in probe:
+        table.lookup(customer_id)
+    print(json.dumps({
+        'customers': len(table),
+        'seconds': elapsed,
+        'customers_per_s': len(table) / elapsed,
+        'table_mb': (table.features.nbytes + table.values.nbytes) / 2 ** 20,
+        'lookup_us': (time.perf_counter() - lookup_start) / len(probe) * 1e6,
+    }, indent=2))
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from features import BASE_PERSONAS
+
+CHUNK_ROWS = 262_144
+POLARITY_LABELS = ['Positive', 'Negative', 'Neutral']
+FLOAT_FEATURES = ['MonthlyRate', 'Emi', 'Dti', 'PaymentRegularity', 'ComplaintRatio', 'ComplaintsPerInteraction', 'DigitalEngagement']
+FEATURE_COLUMNS = [
+    'MonthlyRate', 'Emi', 'Dti', 'IrregularPayments', 'DelinquencyScore', 'PaymentRegularity',
+    'ComplaintRatio', 'ComplaintsPerInteraction', 'DigitalEngagement', 'SentimentPolarity', 'CustomerPersona',
+]
+INPUT_COLUMNS = [
+    'InterestRate', 'LoanAmount', 'TenureMonths', 'Income', 'MissedPayments', 'PartialPayments', 'DelaysDays',
+    'Complaints', 'InteractionAttempts', 'AppUsageFrequency', 'WebsiteVisits', 'SentimentScore',
+]
+POSITIVE, NEGATIVE, NEUTRAL = range(3)
+
+
+def _feature_chunk(c, out, sl):
+    # Same expressions, in the same order, as create_features so results match bit for bit.
+    rate = c['InterestRate'][sl] / (12 * 100)
+    P = c['LoanAmount'][sl]
+    n = c['TenureMonths'][sl]
+    growth = np.power(1 + rate, n)
+    emi = np.where(rate > 0, P * rate * growth / (growth - 1), P / n)
+    out['MonthlyRate'][sl] = rate
+    out['Emi'][sl] = emi
+    dti = np.minimum(emi / (c['Income'][sl] / 12), 1)
+    out['Dti'][sl] = dti
+
+    missed = c['MissedPayments'][sl]
+    tenure = c['TenureMonths'][sl]
+    irregular = missed + c['PartialPayments'][sl]
+    out['IrregularPayments'][sl] = irregular
+    out['DelinquencyScore'][sl] = irregular * c['DelaysDays'][sl]
+    out['PaymentRegularity'][sl] = (tenure - missed) / tenure
+    complaint_ratio = c['Complaints'][sl] / (tenure + 1)
+    out['ComplaintRatio'][sl] = complaint_ratio
+    out['ComplaintsPerInteraction'][sl] = c['Complaints'][sl] / (c['InteractionAttempts'][sl] + 1)
+    engagement = c['AppUsageFrequency'][sl] + c['WebsiteVisits'][sl]
+    out['DigitalEngagement'][sl] = engagement
+
+    sentiment = c['SentimentScore'][sl]
+    polarity = np.select([sentiment > 0.2, sentiment < -0.2], [POSITIVE, NEGATIVE], default=NEUTRAL)
+    out['SentimentPolarity'][sl] = polarity
+    persona_conditions = [
+        (irregular <= 1) & (complaint_ratio < 0.1),
+        (irregular > 1) & (polarity == POSITIVE),
+        (irregular > 2) & ((polarity == NEGATIVE) | (complaint_ratio >= 0.1)),
+        (dti > 0.4) & (irregular > 1) & (engagement < 0.5),
+    ]
+    out['CustomerPersona'][sl] = np.select(persona_conditions, [0, 1, 2, 3], default=4)
+
+
+def create_features_fast(df, chunk_size=CHUNK_ROWS, inplace=False):
+    # Same semantics as features.create_features. EMI growth is computed once, polarity and
+    # persona come back as categoricals, the input frame is never copied, and temporaries are
+    # bounded by chunk_size rows.
+    n = len(df)
+    c = {name: df[name].to_numpy() for name in INPUT_COLUMNS}
+    int_dtype = np.result_type(c['MissedPayments'], c['PartialPayments'])
+    out = {name: np.empty(n, dtype=np.float64) for name in FLOAT_FEATURES}
+    out['IrregularPayments'] = np.empty(n, dtype=int_dtype)
+    out['DelinquencyScore'] = np.empty(n, dtype=np.result_type(int_dtype, c['DelaysDays']))
+    out['SentimentPolarity'] = np.empty(n, dtype=np.int8)
+    out['CustomerPersona'] = np.empty(n, dtype=np.int8)
+    step = chunk_size or max(n, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):  # pandas arithmetic is silent here too
+        for start in range(0, n, step):
+            _feature_chunk(c, out, slice(start, start + step))
+
+    out['SentimentPolarity'] = pd.Categorical.from_codes(out['SentimentPolarity'], POLARITY_LABELS)
+    out['CustomerPersona'] = pd.Categorical.from_codes(out['CustomerPersona'], BASE_PERSONAS)
+    # A shallow copy shares the input's column buffers. pandas copies each new column on
+    # assignment, so buffers are released one at a time to keep that to a single extra column.
+    result = df if inplace else df.copy(deep=False)
+    for name in FEATURE_COLUMNS:
+        result[name] = out.pop(name)
+    return result
+
+
+def compare_features(reference, fast):
+    # Column names whose values differ; floats are compared on their raw bits.
+    mismatched = []
+    for name in FEATURE_COLUMNS:
+        expected = reference[name].to_numpy()
+        actual = fast[name]
+        if isinstance(actual.dtype, pd.CategoricalDtype):
+            same = np.array_equal(expected.astype(object), actual.astype(object).to_numpy())
+        else:
+            actual = actual.to_numpy()
+            same = expected.dtype == actual.dtype and (
+                np.array_equal(expected.view(np.uint64), actual.view(np.uint64))
+                if expected.dtype == np.float64 else np.array_equal(expected, actual)
+            )
+        if not same:
+            mismatched.append(name)
+    return mismatched
+
+
+def _timed(fn):
+    import time
+    import tracemalloc
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2 ** 20
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    from features import create_features
+    from synthetic_data import make_portfolio
+
+    parser = argparse.ArgumentParser(description="Verify create_features_fast against create_features and benchmark it.")
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--reference-rows', type=int, default=1_000_000,
+                        help="rows also run through create_features for the bit-for-bit check and baseline")
+    args = parser.parse_args()
+
+    df = make_portfolio(args.rows, with_ids=False)
+    sample = df.iloc[:args.reference_rows]
+    reference, ref_seconds, ref_peak = _timed(lambda: create_features(sample))
+    mismatched = compare_features(reference, create_features_fast(sample, chunk_size=args.chunk_size))
+    del reference
+    _, fast_seconds, fast_peak = _timed(lambda: create_features_fast(df, chunk_size=args.chunk_size))
+    print(json.dumps({
+        'bit_for_bit': not mismatched,
+        'mismatched_columns': mismatched,
+        'reference': {'rows': len(sample), 'rows_per_s': len(sample) / ref_seconds, 'peak_mb': ref_peak},
+        'fast': {'rows': len(df), 'chunk_size': args.chunk_size, 'rows_per_s': len(df) / fast_seconds, 'peak_mb': fast_peak},
+    }, indent=2))
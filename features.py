@@ -0,0 +1,56 @@
+import numpy as np
+
+def create_features(df):
+    df = df.copy()
+    df['MonthlyRate'] = df['InterestRate'] / (12 * 100)
+    P = df['LoanAmount']
+    r = df['MonthlyRate']
+    n = df['TenureMonths']
+    df['Emi'] = np.where(r > 0, P * r * (np.power(1 + r, n)) / (np.power(1 + r, n) - 1), P / n)
+    df['Dti'] = (df['Emi']) / (df['Income'] / 12)
+    df['Dti'] = df['Dti'].clip(upper=1)
+    df['IrregularPayments'] = df['MissedPayments'] + df['PartialPayments']
+    df['DelinquencyScore'] = df['IrregularPayments'] * df['DelaysDays']
+    df['PaymentRegularity'] = (df['TenureMonths'] - df['MissedPayments']) / df['TenureMonths']
+    df['ComplaintRatio'] = df['Complaints'] / (df['TenureMonths'] + 1)
+    df['ComplaintsPerInteraction'] = df['Complaints'] / (df['InteractionAttempts'] + 1)
+    df['DigitalEngagement'] = df['AppUsageFrequency'] + df['WebsiteVisits']
+    conditions = [(df['SentimentScore'] > 0.2), (df['SentimentScore'] < -0.2)]
+    choices = ['Positive', 'Negative']
+    df['SentimentPolarity'] = np.select(conditions, choices, default='Neutral')
+    persona_conditions = [
+        (df['IrregularPayments'] <= 1) & (df['ComplaintRatio'] < 0.1),
+        (df['IrregularPayments'] > 1) & (df['SentimentPolarity'] == 'Positive'),
+        (df['IrregularPayments'] > 2) & ((df['SentimentPolarity'] == 'Negative') | (df['ComplaintRatio'] >= 0.1)),
+        (df['Dti'] > 0.4) & (df['IrregularPayments'] > 1) & (df['DigitalEngagement'] < 0.5),
+    ]
+    persona_choices = ['Reliable Payer', 'Struggling & Cooperative', 'Aggrieved High-Risk', 'Silent & Risky']
+    df['CustomerPersona'] = np.select(persona_conditions, persona_choices, default='General')
+    return df
+
+def assign_intelligent_persona(df, probability):
+    initial_persona = df['CustomerPersona'].iloc[0]
+    risk_level = probability
+    if risk_level > 0.75 and initial_persona == 'Reliable Payer':
+        return 'High-Risk Reliable'
+    elif risk_level < 0.20 and initial_persona == 'Aggrieved High-Risk':
+        return 'Stabilizing Customer'
+    elif risk_level > 0.80 and initial_persona in ['General', 'Struggling & Cooperative']:
+        return 'Critical Risk'
+    else:
+        return initial_persona
+
+BASE_PERSONAS = ['Reliable Payer', 'Struggling & Cooperative', 'Aggrieved High-Risk', 'Silent & Risky', 'General']
+PERSONA_LABELS = BASE_PERSONAS + ['High-Risk Reliable', 'Stabilizing Customer', 'Critical Risk']
+
+def assign_intelligent_personas(initial_personas, probabilities):
+    # Vectorized assign_intelligent_persona for batch scoring; same rules, same order.
+    initial_personas = np.asarray(initial_personas, dtype=object)
+    probabilities = np.asarray(probabilities)
+    conditions = [
+        (probabilities > 0.75) & (initial_personas == 'Reliable Payer'),
+        (probabilities < 0.20) & (initial_personas == 'Aggrieved High-Risk'),
+        (probabilities > 0.80) & np.isin(initial_personas, ['General', 'Struggling & Cooperative']),
+    ]
+    choices = ['High-Risk Reliable', 'Stabilizing Customer', 'Critical Risk']
+    return np.select(conditions, choices, default=initial_personas)
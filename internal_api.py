@@ -0,0 +1,71 @@
+import hmac
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+INTERNAL_HOST = os.environ.get('FINBOT_INTERNAL_HOST', '127.0.0.1')
+INTERNAL_PORT = int(os.environ.get('FINBOT_INTERNAL_PORT', 0))  # 0 disables the internal API
+INTERNAL_TOKEN = os.environ.get('FINBOT_INTERNAL_TOKEN', '')  # required as "Authorization: Bearer <token>" when set
+MAX_BODY_BYTES = int(os.environ.get('FINBOT_INTERNAL_MAX_BODY', 16 * 2 ** 20))
+LOOPBACK_HOSTS = {'127.0.0.1', '::1', 'localhost'}
+
+
+def start_internal_api(routes, port, host=INTERNAL_HOST, token=INTERNAL_TOKEN):
+    # Operational endpoints (event ingestion, queue claims) on their own listener instead of the
+    # public Gradio app. routes maps (method, path) to a handler taking the parsed JSON body (POST)
+    # or the query parameters (GET) and returning something JSON-serializable. Loopback-only
+    # unless a token is set, so nothing here is reachable unauthenticated from outside the host.
+    if host not in LOOPBACK_HOSTS and not token:
+        raise ValueError(f"FINBOT_INTERNAL_HOST={host} needs FINBOT_INTERNAL_TOKEN set")
+
+    class Handler(BaseHTTPRequestHandler):
+        def _respond(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _handle(self, method):
+            url = urlsplit(self.path)
+            handler = routes.get((method, url.path))
+            if handler is None:
+                self._respond(404, {'error': f"no route {method} {url.path}"})
+                return
+            if token and not hmac.compare_digest(self.headers.get('Authorization', ''), f"Bearer {token}"):
+                self._respond(401, {'error': "missing or wrong bearer token"})
+                return
+            if method == 'GET':
+                payload = dict(parse_qsl(url.query))
+            else:
+                length = int(self.headers.get('Content-Length') or 0)
+                if length > MAX_BODY_BYTES:
+                    self._respond(413, {'error': f"body over {MAX_BODY_BYTES} bytes"})
+                    return
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'null')
+                except ValueError:
+                    self._respond(400, {'error': "body is not JSON"})
+                    return
+            try:
+                self._respond(200, handler(payload))
+            except KeyError as e:
+                self._respond(400, {'error': f"missing {e}"})
+            except (TypeError, ValueError) as e:
+                self._respond(400, {'error': str(e)})
+
+        def do_GET(self):
+            self._handle('GET')
+
+        def do_POST(self):
+            self._handle('POST')
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='finbot-internal-api', daemon=True).start()
+    return server
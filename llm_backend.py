@@ -0,0 +1,85 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+import time
+from typing import Any, List
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+LLM_BACKEND = os.environ.get('FINBOT_LLM_BACKEND', 'gemini')
+
+CANNED_RESPONSES = [
+    "I understand this month has been difficult. To keep your account in good standing, I can send you a secure payment link for today's EMI. Would that work for you?",
+    "Thank you for letting me know. If clearing the full EMI today isn't possible, I can split it into two payments within the next week. Shall I set that up?",
+    "I've checked your account and there's no system error recorded, so I'm not able to remove the late fee. What I can do is help you avoid any further charges with a short deferral of up to 14 days.",
+    "That sounds really stressful. I can connect you with our hardship specialist, who can look at longer-term options with you. I've raised ticket H-482913 and they will reach out within one business day.",
+    "You're welcome! Your payment link has been sent to your registered mobile number. Is there anything else I can help you with today?",
+]
+
+
+class ReplayChatModel(BaseChatModel):
+    # Offline stand-in for the Gemini client: replays canned replies with a configurable
+    # time-to-first-token and token rate so the app can be exercised without an API key.
+    responses: List[str] = CANNED_RESPONSES
+    first_token_latency: float = 0.4
+    tokens_per_second: float = 60.0
+    counter: Any = None
+
+    @property
+    def _llm_type(self):
+        return "finbot-replay"
+
+    def _next_response(self):
+        if self.counter is None:
+            self.counter = itertools.count()
+        return self.responses[next(self.counter) % len(self.responses)]
+
+    def _tokens(self):
+        return re.split(r"(?<=\s)", self._next_response())
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens()
+        time.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self._tokens()
+        await asyncio.sleep(self.first_token_latency + len(tokens) / self.tokens_per_second)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token_latency)
+        for token in self._tokens():
+            await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+def create_replay_llm():
+    responses = CANNED_RESPONSES
+    responses_path = os.environ.get('FINBOT_FAKE_RESPONSES')
+    if responses_path:
+        with open(responses_path) as f:
+            responses = json.load(f)
+    return ReplayChatModel(
+        responses=responses,
+        first_token_latency=float(os.environ.get('FINBOT_FAKE_TTFT', 0.4)),
+        tokens_per_second=float(os.environ.get('FINBOT_FAKE_TOKENS_PER_SEC', 60)),
+    )
+
+
+def create_llm(backend, api_key=None):
+    if backend == 'fake':
+        return create_replay_llm()
+    if backend == 'gemini':
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", temperature=0.2, google_api_key=api_key)
+    raise ValueError(f"Unknown FINBOT_LLM_BACKEND '{backend}' (expected 'gemini' or 'fake')")
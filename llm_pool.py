@@ -0,0 +1,88 @@
+import asyncio
+import os
+import random
+
+LLM_CONCURRENCY = int(os.environ.get('FINBOT_LLM_CONCURRENCY', 8))
+LLM_QUEUE_LIMIT = int(os.environ.get('FINBOT_LLM_QUEUE', 32))
+LLM_TIMEOUT_SECONDS = float(os.environ.get('FINBOT_LLM_TIMEOUT', 30))
+LLM_RETRIES = int(os.environ.get('FINBOT_LLM_RETRIES', 2))
+
+# Provider errors worth retrying, matched by name so google-api-core stays an optional import.
+TRANSIENT_ERROR_NAMES = {
+    'ResourceExhausted', 'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError',
+    'TooManyRequests', 'GatewayTimeout', 'Aborted',
+}
+
+
+class PoolBusy(Exception):
+    pass
+
+
+def is_transient(error):
+    return isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)) or type(error).__name__ in TRANSIENT_ERROR_NAMES
+
+
+class LLMPool:
+    # Bounds in-flight LLM calls per process; callers beyond the queue limit are rejected
+    # immediately instead of waiting behind slow generations.
+
+    def __init__(self, max_concurrency=LLM_CONCURRENCY, max_queue=LLM_QUEUE_LIMIT, timeout=LLM_TIMEOUT_SECONDS,
+                 retries=LLM_RETRIES, backoff_base=0.5, backoff_max=8.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pending = 0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def _admit(self):
+        if self.pending >= self.max_concurrency + self.max_queue:
+            raise PoolBusy(f"{self.pending} LLM requests already pending")
+        self.pending += 1
+
+    async def _backoff(self, attempt):
+        # Full jitter keeps retries from concurrent sessions from arriving in lockstep.
+        await asyncio.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+
+    async def ainvoke(self, chain, inputs):
+        self._admit()
+        try:
+            async with self._semaphore:
+                for attempt in range(self.retries + 1):
+                    try:
+                        return await asyncio.wait_for(chain.ainvoke(inputs), self.timeout)
+                    except Exception as e:
+                        if attempt == self.retries or not is_transient(e):
+                            raise
+                    await self._backoff(attempt)
+        finally:
+            self.pending -= 1
+
+    async def astream(self, chain, inputs):
+        # Retries only before the first chunk; once text has reached the user a retry would duplicate it.
+        self._admit()
+        try:
+            async with self._semaphore:
+                for attempt in range(self.retries + 1):
+                    started = False
+                    deadline = asyncio.get_running_loop().time() + self.timeout
+                    stream = chain.astream(inputs).__aiter__()
+                    try:
+                        while True:
+                            remaining = deadline - asyncio.get_running_loop().time()
+                            try:
+                                chunk = await asyncio.wait_for(stream.__anext__(), remaining)
+                            except StopAsyncIteration:
+                                return
+                            started = True
+                            yield chunk
+                    except Exception as e:
+                        if started or attempt == self.retries or not is_transient(e):
+                            raise
+                    finally:
+                        await stream.aclose()
+                    await self._backoff(attempt)
+        finally:
+            self.pending -= 1
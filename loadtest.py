@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import time
+
+CUSTOMER_MESSAGES = [
+    "Hi, why did I get a reminder about my EMI?",
+    "Can I get a late fee waiver?",
+    "I lost my job last month and can't pay the full amount.",
+    "Send me the payment link",
+    "Can I split the payment into two parts?",
+    "I can only pay 5000 this month.",
+    "What happens if I pay next week?",
+    "ok thanks",
+    "No, I can't pay today.",
+    "I was charged twice for last month's EMI.",
+]
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(values):
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+    }
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_session(app, customer_id, turns, rng, results):
+    start = time.perf_counter()
+    profile, initial_message = await asyncio.to_thread(app.load_customer_profile, customer_id)
+    results['profile'].append(time.perf_counter() - start)
+    if not profile:
+        results['errors'] += 1
+        return
+    history = [[None, initial_message[0]]]
+    for _ in range(turns):
+        start = time.perf_counter()
+        first_token = None
+        async for _, history in app.astream_with_finbot(rng.choice(CUSTOMER_MESSAGES), history, profile):
+            if first_token is None and history[-1][1]:
+                first_token = time.perf_counter() - start
+        results['turn'].append(time.perf_counter() - start)
+        results['ttft'].append(first_token or 0.0)
+        reply = history[-1][1]
+        if reply == app.BUSY_MESSAGE:
+            results['rejected'] += 1
+        elif app.LLM_FAILURE_MESSAGE in reply:
+            results['errors'] += 1
+
+
+async def run(app, customer_ids, sessions, concurrency, turns, seed):
+    rng = random.Random(seed)
+    results = {'profile': [], 'turn': [], 'ttft': [], 'rejected': 0, 'errors': 0}
+    gate = asyncio.Semaphore(concurrency)
+
+    async def guarded(customer_id):
+        async with gate:
+            await run_session(app, customer_id, turns, rng, results)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(guarded(rng.choice(customer_ids)) for _ in range(sessions)))
+    results['elapsed'] = time.perf_counter() - start
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive FinBot with concurrent synthetic sessions.")
+    parser.add_argument('--sessions', type=int, default=200, help="total sessions to run")
+    parser.add_argument('--concurrency', type=int, default=20, help="sessions in flight at once")
+    parser.add_argument('--turns', type=int, default=4, help="chat turns per session")
+    parser.add_argument('--backend', default='fake', help="FINBOT_LLM_BACKEND to use (default: fake)")
+    parser.add_argument('--cache', action='store_true', help="keep the response cache on")
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help="write the report to this file")
+    args = parser.parse_args()
+
+    os.environ['FINBOT_LLM_BACKEND'] = args.backend
+    rss_before_import = max_rss_mb()
+    import app
+    from response_cache import ResponseCache
+
+    app.startup.wait()
+    if app.initial_error_message:
+        raise SystemExit(app.initial_error_message)
+    app.prompt_builder.on_render = None
+    if not args.cache:
+        app.response_cache = ResponseCache(max_entries=0)
+    rss_after_import = max_rss_mb()
+
+    customer_ids = [str(c) for c in app.customer_store.customer_ids()]
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # Silences the per-turn log lines; the report below is the output.
+        results = asyncio.run(run(app, customer_ids, args.sessions, args.concurrency, args.turns, args.seed))
+
+    elapsed = results['elapsed']
+    report = {
+        'sessions': args.sessions,
+        'concurrency': args.concurrency,
+        'turns_per_session': args.turns,
+        'backend': args.backend,
+        'elapsed_s': elapsed,
+        'sessions_per_s': args.sessions / elapsed,
+        'turns_per_s': len(results['turn']) / elapsed,
+        'profile_load': summarize(results['profile']),
+        'chat_turn': summarize(results['turn']),
+        'time_to_first_token': summarize(results['ttft']),
+        'rejected_turns': results['rejected'],
+        'errors': results['errors'],
+        'max_rss_mb': {'before_import': rss_before_import, 'after_import': rss_after_import, 'peak': max_rss_mb()},
+        'response_cache': app.response_cache.stats(),
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
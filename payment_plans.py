@@ -0,0 +1,239 @@
+import os
+from datetime import date, timedelta
+import numpy as np
+import pandas as pd
+from feature_engine import create_features_fast
+from response_cache import DATE_STYLES
+from risk_table import CHUNK_SIZE, score_frame
+
+# The demo policy the prompt states under SIMULATED POLICY CONSTANTS and ARRANGEMENT LADDER.
+GRACE_DAYS = 5
+LATE_FEE = 200
+MAX_DEFERRAL_DAYS = 14
+EMI_CYCLE_DAYS = 30  # EMIs fall due once a cycle; DelaysDays can span several of them
+PARTIAL_SHARE = float(os.environ.get('FINBOT_PARTIAL_SHARE', 0.5))  # partial payment offered, as a share of the EMI
+FRIDAY = 4
+SPLIT_GAP_DAYS = 6  # "this coming Friday" and the following Thursday
+
+SCENARIOS = ['pay_now', 'split', 'deferral', 'partial', 'no_payment']
+
+
+def coming_weekday(today, weekday):
+    # Strictly after today, so "this coming Friday" asked on a Friday is a week out.
+    return today + timedelta(days=(weekday - today.weekday() - 1) % 7 + 1)
+
+
+def payment_plans(df, today=None, partial_share=PARTIAL_SHARE):
+    # Every ladder option for each row of raw customer data, with exact amounts (whole rupees)
+    # and dates. DelaysDays is the account's total delay (up to 179 days in the data), so it is not
+    # the age of the EMI being collected: that EMI fell due on the latest scheduled date, which is
+    # DelaysDays mod EMI_CYCLE_DAYS ago. Reading it as one EMI's age put due dates months back and
+    # closed deferral to all but the few accounts under 14 days. The ₹200 fee is added wherever
+    # the full EMI would land after the grace period.
+    today = today or date.today()
+    day = np.datetime64(today, 'D')
+    emi = np.ceil(create_features_fast(df)['Emi'].to_numpy())
+    overdue = df['DelaysDays'].to_numpy().astype(np.int64) % EMI_CYCLE_DAYS
+    due = day - overdue.astype('timedelta64[D]')
+    grace_deadline = due + np.timedelta64(GRACE_DAYS, 'D')
+
+    def fee(paid_in_full_on):
+        return np.where(paid_in_full_on > grace_deadline, LATE_FEE, 0)
+
+    split_first = np.datetime64(coming_weekday(today, FRIDAY), 'D')
+    split_second = split_first + np.timedelta64(SPLIT_GAP_DAYS, 'D')
+    first_part = np.ceil(emi / 2)
+    deferral = due + np.timedelta64(MAX_DEFERRAL_DAYS, 'D')
+    deferral_available = deferral > day
+    partial = np.ceil(emi * partial_share)
+    n = len(df)
+    return pd.DataFrame({
+        'Emi': emi,
+        'DueDate': due,
+        'GraceDeadline': grace_deadline,
+        'PayNowAmount': emi + fee(day),
+        'SplitFirstDate': np.full(n, split_first),
+        'SplitFirstAmount': first_part,
+        'SplitSecondDate': np.full(n, split_second),
+        'SplitSecondAmount': emi - first_part + fee(split_second),
+        'DeferralAvailable': deferral_available,
+        'DeferralDate': np.where(deferral_available, deferral, np.datetime64('NaT')),
+        'DeferralAmount': np.where(deferral_available, emi + fee(deferral), np.nan),
+        'PartialAmount': partial,
+        'PartialRemainingDate': np.full(n, split_second),
+        'PartialRemainingAmount': emi - partial + fee(split_second),
+    }, index=df.index)
+
+
+def scenario_frames(df, plans, current=None):
+    # The raw data each option would leave behind: DelaysDays keeps growing until the day the EMI
+    # is paid in full, and splits and partials count as a partial payment. Deferrals are only
+    # built for rows that can still get one; pay_now changes nothing, so it is skipped when the
+    # current probabilities are already known.
+    delays = df['DelaysDays'].to_numpy()
+    today = plans['DueDate'].to_numpy() + (delays.astype(np.int64) % EMI_CYCLE_DAYS).astype('timedelta64[D]')
+
+    def days_late(paid_on):
+        return (delays + (paid_on - today).astype('timedelta64[D]').astype(np.int64)).astype(df['DelaysDays'].dtype)
+
+    available = plans['DeferralAvailable'].to_numpy()
+    if current is None:
+        yield 'pay_now', df
+    yield 'split', df.assign(PartialPayments=df['PartialPayments'] + 1,
+                             DelaysDays=days_late(plans['SplitSecondDate'].to_numpy()))
+    yield 'deferral', df[available].assign(DelaysDays=days_late(plans['DeferralDate'].to_numpy())[available])
+    yield 'no_payment', df.assign(MissedPayments=df['MissedPayments'] + 1)
+
+
+def rescore(pipeline, df, plans, current=None):
+    # Default probability under each scenario, all scored in one predict_proba call.
+    frames = list(scenario_frames(df, plans, current))
+    probability, _, _ = score_frame(pipeline, pd.concat([frame for _, frame in frames], ignore_index=True))
+    risk = pd.DataFrame(index=df.index, columns=[f'Risk_{scenario}' for scenario in SCENARIOS], dtype=np.float64)
+    if current is not None:
+        risk['Risk_pay_now'] = np.asarray(current, dtype=np.float64)
+    offset = 0
+    for scenario, frame in frames:
+        rows = plans['DeferralAvailable'].to_numpy() if scenario == 'deferral' else slice(None)
+        risk.loc[rows, f'Risk_{scenario}'] = probability[offset:offset + len(frame)]
+        offset += len(frame)
+    # A partial payment now with the rest due on the split's second date leaves the same record.
+    risk['Risk_partial'] = risk['Risk_split']
+    return risk
+
+
+def simulate(pipeline, df, today=None, partial_share=PARTIAL_SHARE, current=None):
+    plans = payment_plans(df, today, partial_share)
+    return plans.join(rescore(pipeline, df, plans, current))
+
+
+def simulate_portfolio(pipeline, store, risk_table=None, today=None, partial_share=PARTIAL_SHARE,
+                       chunk_size=CHUNK_SIZE):
+    # Whole book in sorted-CustomerID order, chunk by chunk like build_risk_table. A risk table
+    # for the same store supplies the pay_now probabilities.
+    today = today or date.today()
+    n = len(store)
+    results = []
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk = store.rows(store.order[start:stop], store.keys[start:stop])
+        current = risk_table.probability[start:stop] if risk_table is not None else None
+        result = simulate(pipeline, chunk, today, partial_share, current)
+        result.insert(0, 'CustomerID', chunk['CustomerID'].to_numpy())
+        results.append(result)
+    return pd.concat(results, ignore_index=True)
+
+
+def _rupees(amount):
+    return f"₹{amount:,.0f}"
+
+
+def _fee_note(amount, emi):
+    return f" (includes the ₹{LATE_FEE} late fee)" if amount > emi else ""
+
+
+# Placeholder names a cached reply uses for a plan's customer-specific amounts and dates. The
+# split and partial dates are the same for everyone and are left to the relative date templating.
+PLAN_AMOUNTS = {'emi': 'Emi', 'pay_now': 'PayNowAmount', 'split_1': 'SplitFirstAmount',
+                'split_2': 'SplitSecondAmount', 'deferral': 'DeferralAmount', 'partial': 'PartialAmount',
+                'partial_rest': 'PartialRemainingAmount'}
+PLAN_DATES = {'due': 'DueDate', 'grace': 'GraceDeadline', 'deferral_by': 'DeferralDate'}
+
+
+def plan_fields(plan):
+    # One customer's plan as (shape, values). The shape is which options carry the late fee and
+    # whether deferral is open, so replies are only shared where the ladder reads the same; the
+    # values fill the placeholders back in.
+    emi = plan['Emi']
+    shape = (bool(plan['PayNowAmount'] > emi), bool(plan['SplitFirstAmount'] + plan['SplitSecondAmount'] > emi),
+             bool(plan['DeferralAvailable']), bool(plan['DeferralAvailable'] and plan['DeferralAmount'] > emi))
+    values = {name: int(plan[column]) for name, column in PLAN_AMOUNTS.items() if pd.notna(plan[column])}
+    # The policy constants too: a reply quoting any number outside these is not cached.
+    values.update(late_fee=LATE_FEE, grace_days=GRACE_DAYS, deferral_days=MAX_DEFERRAL_DAYS)
+    values.update({name: pd.Timestamp(plan[column]).date() for name, column in PLAN_DATES.items()
+                   if pd.notna(plan[column])})
+    return shape, values
+
+
+def describe_plan(plan):
+    # One customer's options (a row of payment_plans) as the lines the prompt injects.
+    day = DATE_STYLES['full']
+    emi = plan['Emi']
+    lines = [f"- EMI due: {_rupees(emi)} on {day(plan['DueDate'])}; grace period ends {day(plan['GraceDeadline'])}",
+             f"- 1) Full payment today: {_rupees(plan['PayNowAmount'])}{_fee_note(plan['PayNowAmount'], emi)}"]
+    second_fee = plan['SplitSecondAmount'] + plan['SplitFirstAmount'] - emi
+    lines.append(f"- 2) Split: {_rupees(plan['SplitFirstAmount'])} by {day(plan['SplitFirstDate'])}, then "
+                 f"{_rupees(plan['SplitSecondAmount'])} by {day(plan['SplitSecondDate'])}"
+                 + (f" (second part includes the ₹{LATE_FEE} late fee)" if second_fee > 0 else ""))
+    if plan['DeferralAvailable']:
+        lines.append(f"- 3) Deferral: full {_rupees(plan['DeferralAmount'])} by {day(plan['DeferralDate'])}"
+                     f"{_fee_note(plan['DeferralAmount'], emi)}")
+    else:
+        lines.append(f"- 3) Deferral: not available (this EMI is already more than {MAX_DEFERRAL_DAYS} days past due); "
+                     f"escalate to a hardship specialist instead")
+    remaining = plan['PartialRemainingAmount']
+    lines.append(f"- Partial payment: {_rupees(plan['PartialAmount'])} today leaves {_rupees(remaining)} due by "
+                 f"{day(plan['PartialRemainingDate'])}"
+                 + (f" (includes the ₹{LATE_FEE} late fee)" if remaining + plan['PartialAmount'] > emi else ""))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import time
+    import joblib
+    from customer_store import CustomerStore, load_customer_store
+    from synthetic_data import make_portfolio
+
+    parser = argparse.ArgumentParser(description="Run the payment-plan scenarios over the whole portfolio.")
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--model', default='prediction_pipeline.pkl', help="a .npz path loads a compiled_model export")
+    parser.add_argument('--synthetic', type=int, help="use a synthetic portfolio of this many rows instead of --data")
+    parser.add_argument('--date', type=date.fromisoformat, help="simulate as of this day (YYYY-MM-DD)")
+    parser.add_argument('--partial-share', type=float, default=PARTIAL_SHARE)
+    parser.add_argument('--customer', help="print one customer's options as the bot sees them")
+    parser.add_argument('--risk-table', default=os.environ.get('FINBOT_RISK_TABLE'),
+                        help="saved risk table for the same data; its probabilities are reused for pay_now")
+    parser.add_argument('--out', help="write every customer's options and scenario risks to this CSV")
+    args = parser.parse_args()
+
+    if args.model.endswith('.npz'):
+        from compiled_model import CompiledEnsemble
+        pipeline = CompiledEnsemble.load(args.model)
+    else:
+        pipeline = joblib.load(args.model)
+    if args.synthetic:
+        store = CustomerStore.from_frame(make_portfolio(args.synthetic))
+    else:
+        store = load_customer_store(args.data, os.environ.get('FINBOT_STORE_DIR'))
+    if args.customer:
+        row = store.get(args.customer)
+        if row is None:
+            raise SystemExit(f"Unknown customer {args.customer}")
+        result = simulate(pipeline, row, args.date, args.partial_share)
+        print(describe_plan(result.iloc[0]))
+        print(json.dumps({column: result[column].iloc[0] for column in result if column.startswith('Risk_')}, indent=2))
+        raise SystemExit(0)
+
+    risk_table = None
+    if args.risk_table and os.path.exists(args.risk_table) and not args.synthetic:
+        from risk_table import RiskTable
+        risk_table = RiskTable.load(args.risk_table)
+        if len(risk_table) != len(store):
+            risk_table = None
+    start = time.perf_counter()
+    result = simulate_portfolio(pipeline, store, risk_table, args.date, args.partial_share)
+    elapsed = time.perf_counter() - start
+    if args.out:
+        result.to_csv(args.out, index=False)
+    print(json.dumps({
+        'customers': len(result),
+        'reused_risk_table': risk_table is not None,
+        'seconds': elapsed,
+        'customers_per_s': len(result) / elapsed,
+        'mean_risk': {scenario: float(result[f'Risk_{scenario}'].mean()) for scenario in SCENARIOS},
+        'late_fee_if_paid_now': float((result['PayNowAmount'] > result['Emi']).mean()),
+        'deferral_available': float(result['DeferralAvailable'].mean()),
+        'total_due_now': float(result['PayNowAmount'].sum()),
+    }, indent=2))
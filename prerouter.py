@@ -0,0 +1,80 @@
+import re
+
+# Phase names follow state.phase in master_prompt_template, highest priority first.
+PHASE_PATTERNS = {
+    'P0_CRITICAL': [
+        r"recording (?:this|our|the) (?:conversation|chat|call)", r"on the record", r"(?:being|am|is being) recorded",
+        r"formal dispute", r"dispute this matter", r"formal complaint", r"regulatory complaint",
+        r"ombudsman", r"\bRBI\b", r"reserve bank", r"consumer court",
+        r"\blawyers?\b", r"legal action", r"law ?suit", r"\badvocate\b",
+        r"\bregulators?\b", r"\bescalate\b",
+    ],
+    'P0_LEGAL': [
+        r"power of attorney", r"\bPOA\b", r"\bKYC\b", r"court order", r"identity verification", r"verify my identity",
+    ],
+    'P0_3_PHISH': [
+        r"https?://\S+", r"\bwww\.\S+", r"\bbit\.ly/\S*", r"click (?:on )?(?:this|the|my) link",
+        r"pay (?:to|into) (?:my|this|a) (?:personal|friend'?s?) (?:account|upi)", r"send (?:it|the money|money) to (?:this|my) (?:upi|number)",
+    ],
+    'P0_2_PRIVACY': [
+        r"my (?:father|mother|dad|mom|mum|husband|wife|son|daughter|brother|sister|friend|uncle|aunt)(?:'s|s)? (?:account|loan)",
+        r"on behalf of", r"not the account holder", r"(?:isn't|is not|not) my account", r"someone else'?s account",
+    ],
+    'P0_1_ETHICS': [
+        r"\bpredatory\b", r"\bunethical\b", r"loan sharks?", r"\bexploit(?:ing|ative)?\b",
+        r"interest rates? (?:is|are) (?:unfair|too high|criminal|ridiculous)", r"unfair interest",
+    ],
+    'P0_9_HR_BLOCK': [
+        r"\bwaive[rd]?\b", r"\bwaiving\b", r"\brevers(?:e|al)\b", r"interest relief", r"remove (?:the|this) (?:late )?fee",
+    ],
+    'P1_COMPLAINT': [
+        r"\bcomplain(?:t|ts|ing)?\b", r"charged twice", r"double charged", r"wrong(?:ly)? charged", r"incorrect (?:fee|charge)",
+    ],
+}
+PHASE_PRIORITY = list(PHASE_PATTERNS)
+HARD_STOP_PHASES = {'P0_CRITICAL'}
+HIGH_RISK_BLOCK_PERSONAS = {'Aggrieved High-Risk', 'Silent & Risky'}
+
+PHASE0_RESPONSE = (
+    "Thank you for informing me. I understand you wish to raise this as a formal matter regarding your account.\n"
+    "To ensure this is handled with the appropriate review, this automated interaction will now stop.\n"
+    "Your case has been flagged and escalated to our Senior Dispute Resolution team, who will contact you directly "
+    "on your registered mobile number within 24 hours."
+)
+PHASE0_CLOSED_RESPONSE = (
+    "This conversation has been escalated to our Senior Dispute Resolution team, who will contact you directly "
+    "on your registered mobile number within 24 hours. This automated chat is now closed."
+)
+
+_ROUTER = re.compile(
+    "|".join(f"(?P<{phase}>{'|'.join(patterns)})" for phase, patterns in PHASE_PATTERNS.items()),
+    re.IGNORECASE,
+)
+
+
+def detect_phases(message):
+    return {match.lastgroup for match in _ROUTER.finditer(message or "")}
+
+
+def route_message(message, customer_profile=None):
+    phases = detect_phases(message)
+    if 'P0_9_HR_BLOCK' in phases:
+        # The concession blocker only applies to high-risk personas (Risk >= 60%).
+        profile = customer_profile or {}
+        if profile.get('probability', 0) < 0.60 or profile.get('persona') not in HIGH_RISK_BLOCK_PERSONAS:
+            phases.discard('P0_9_HR_BLOCK')
+    for phase in PHASE_PRIORITY:
+        if phase in phases:
+            return phase
+    return None
+
+
+def preroute(message, customer_profile):
+    # Returns (phase, reply). A reply means the turn is fully answered without the LLM.
+    if customer_profile.get('phase') in HARD_STOP_PHASES:
+        return customer_profile['phase'], PHASE0_CLOSED_RESPONSE
+    phase = route_message(message, customer_profile)
+    if phase in HARD_STOP_PHASES:
+        customer_profile['phase'] = phase
+        return phase, PHASE0_RESPONSE
+    return phase, None
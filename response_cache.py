@@ -0,0 +1,236 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from functools import lru_cache
+
+CACHE_MAX_ENTRIES = int(os.environ.get('FINBOT_CACHE_SIZE', 5000))
+CACHE_TTL_SECONDS = float(os.environ.get('FINBOT_CACHE_TTL', 3600))
+CACHE_SIMILARITY = float(os.environ.get('FINBOT_CACHE_SIMILARITY', 0))  # 0 disables the similarity tier
+
+# Thresholds the persona rules and PHASE 0.9 branch on; replies are only shared inside a bucket.
+RISK_BUCKET_EDGES = [0.20, 0.60, 0.75, 0.80]
+DATE_HORIZON_DAYS = 60
+STATE_KEYS = ['offer_level', 'refusals', 'dispute_open', 'complaint_open', 'concession_requested', 'third_party']
+
+_WORD = re.compile(r"[a-z0-9']+")
+_PLACEHOLDER = re.compile(r"\[\[date([+-]\d+):(\w+)\]\]")
+_FIELD = re.compile(r"\[\[(\w+)(?::(\w+))?\]\]")
+# Any number in a reply (with or without a currency marker, thousands separators or paise), or a
+# placeholder already put in, which is skipped.
+_NUMBER = re.compile(r"\[\[[^\]]*\]\]|(?<![\w.])(\d(?:[\d,]*\d)?)(\.\d+)?(?!\w)")
+# How a reply wrote an amount; "8,000" and "8000" come back the way they were written.
+AMOUNT_STYLES = {'plain': str}
+
+
+def _ordinal(day):
+    if 10 <= day % 100 <= 20:
+        return f"{day}th"
+    return f"{day}{ {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th') }"
+
+
+# How the model writes dates; all are re-rendered from the turn's current_date on a cache hit.
+DATE_STYLES = {
+    'full': lambda d: f"{d:%A}, {d:%B} {d.day}, {d.year}",
+    'weekday': lambda d: f"{d:%A}, {d:%B} {d.day}",
+    'weekday_ord': lambda d: f"{d:%A}, {d:%B} {_ordinal(d.day)}",
+    'month_day_year': lambda d: f"{d:%B} {d.day}, {d.year}",
+    'month_ord': lambda d: f"{d:%B} {_ordinal(d.day)}",
+    'month_day': lambda d: f"{d:%B} {d.day}",
+    'day_month_year': lambda d: f"{d.day} {d:%B} {d.year}",
+    'ord_month': lambda d: f"{_ordinal(d.day)} {d:%B}",
+    'day_month': lambda d: f"{d.day} {d:%B}",
+}
+
+
+def risk_bucket(probability):
+    return sum(probability >= edge for edge in RISK_BUCKET_EDGES)
+
+
+def normalize_message(message):
+    return " ".join(_WORD.findall(message.lower()))
+
+
+@lru_cache(maxsize=2)
+def _date_pattern(today):
+    variants = {}
+    for offset in range(-7, DATE_HORIZON_DAYS + 1):
+        day = today + timedelta(days=offset)
+        for style, render in DATE_STYLES.items():
+            variants.setdefault(render(day), (offset, style))
+    alternation = "|".join(re.escape(text) for text in sorted(variants, key=len, reverse=True))
+    return re.compile(rf"(?<!\d)(?:{alternation})(?!\d)"), variants
+
+
+def templatize_dates(text, today):
+    pattern, variants = _date_pattern(today)
+    return pattern.sub(lambda m: "[[date{:+d}:{}]]".format(*variants[m.group(0)]), text)
+
+
+def render_dates(text, today):
+    return _PLACEHOLDER.sub(lambda m: DATE_STYLES[m.group(2)](today + timedelta(days=int(m.group(1)))), text)
+
+
+def templatize_fields(text, fields, message="", today=None):
+    # The customer's plan amounts and dates become named placeholders ([[emi]], [[emi:plain]],
+    # [[due:full]]), and other dates relative placeholders when `today` is given. Returns None
+    # when the reply has any other number: it may be specific to this customer, unless the
+    # customer said it (it is then in the message, which is part of the key).
+    dates = {}
+    for name, value in fields.items():
+        if isinstance(value, date):
+            for style, render in DATE_STYLES.items():
+                dates.setdefault(render(value), f"[[{name}:{style}]]")
+    if dates:
+        alternation = "|".join(re.escape(t) for t in sorted(dates, key=len, reverse=True))
+        text = re.sub(rf"(?<!\d)(?:{alternation})(?!\d)", lambda m: dates[m.group(0)], text)
+    if today is not None:
+        text = templatize_dates(text, today)
+    amounts = {}
+    for name, value in fields.items():
+        if not isinstance(value, date):
+            amounts.setdefault(value, name)
+    said = set(message.split())
+    unknown = []
+
+    def replace(match):
+        number, fraction = match.groups()
+        if number is None:
+            return match.group(0)
+        digits = number.replace(",", "")
+        name = amounts.get(int(digits)) if not fraction or not fraction.strip(".0") else None
+        if name is None:
+            if digits not in said:
+                unknown.append(digits)
+            return match.group(0)
+        return f"[[{name}]]{fraction or ''}" if "," in number else f"[[{name}:plain]]{fraction or ''}"
+
+    text = _NUMBER.sub(replace, text)
+    return None if unknown else text
+
+
+def render_fields(text, fields):
+    # None when the template names a value this customer's plan doesn't have.
+    missing = []
+
+    def replace(match):
+        name, style = match.groups()
+        if name not in fields:
+            missing.append(name)
+            return match.group(0)
+        if style in AMOUNT_STYLES:
+            return AMOUNT_STYLES[style](fields[name])
+        return DATE_STYLES[style](fields[name]) if style else f"{fields[name]:,}"
+
+    text = _FIELD.sub(replace, text)
+    return None if missing else text
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ResponseCache:
+    # LRU + TTL cache of LLM replies keyed on (persona, risk bucket, phase, history state, plan shape,
+    # rendered history, message). Plan amounts and dates are stored as placeholders and filled from the asking customer.
+    # The similarity tier compares character trigrams of messages that share the rest of the key.
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, similarity=CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._by_context = {}
+        self._lock = threading.Lock()
+        self.metrics = {'exact_hits': 0, 'similar_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0,
+                        'uncacheable': 0}
+
+    def make_key(self, customer_profile, detected_phase, message, memory_state, history=""):
+        # `history` is the conversation text the prompt carries. Its hash is part of the key, so a
+        # reply written from one customer's words is never replayed to another; only turns whose
+        # prompts carry the same history (first turns, with none) share entries.
+        context = (
+            customer_profile['persona'],
+            risk_bucket(customer_profile['probability']),
+            detected_phase or "none",
+            tuple(memory_state.get(k) for k in STATE_KEYS),
+            customer_profile.get('plan_shape'),  # amounts and plan dates are placeholders, see put()
+            hashlib.sha1(history.encode()).hexdigest()[:16],
+        )
+        return context, normalize_message(message)
+
+    def _remove(self, key):
+        self._entries.pop(key, None)
+        context, message = key
+        bucket = self._by_context.get(context)
+        if bucket is not None:
+            bucket.pop(message, None)
+            if not bucket:
+                del self._by_context[context]
+
+    def _live(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if now - entry[1] > self.ttl:
+            self._remove(key)
+            self.metrics['expired'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _similar(self, key, now):
+        context, message = key
+        grams = _trigrams(message)
+        best, best_score = None, self.similarity
+        for other, other_grams in list(self._by_context.get(context, {}).items()):
+            score = len(grams & other_grams) / len(grams | other_grams)
+            if score >= best_score:
+                best, best_score = (context, other), score
+        return self._live(best, now) if best else None
+
+    def get(self, key, today=None, fields=None):
+        now = time.monotonic()
+        with self._lock:
+            template = self._live(key, now)
+            if template is not None:
+                self.metrics['exact_hits'] += 1
+            elif self.similarity:
+                template = self._similar(key, now)
+                if template is not None:
+                    self.metrics['similar_hits'] += 1
+            if template is None:
+                self.metrics['misses'] += 1
+                return None
+        reply = render_dates(template, today or date.today())
+        return render_fields(reply, fields or {})
+
+    def put(self, key, response, today=None, fields=None):
+        # `fields` are the customer's plan values (payment_plans.plan_fields); replies quoting
+        # amounts outside them aren't cached.
+        if not response or not response.strip():
+            return
+        template = templatize_fields(response, fields or {}, key[1], today or date.today())
+        if template is None:
+            with self._lock:
+                self.metrics['uncacheable'] += 1
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (template, time.monotonic())
+            context, message = key
+            self._by_context.setdefault(context, {})[message] = _trigrams(message)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.metrics['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.metrics['exact_hits'] + self.metrics['similar_hits'] + self.metrics['misses']
+            hits = lookups - self.metrics['misses']
+            return dict(self.metrics, entries=len(self._entries), hit_rate=hits / lookups if lookups else 0.0)
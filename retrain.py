@@ -0,0 +1,217 @@
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+import drift
+from feature_engine import create_features_fast
+from risk_table import fingerprint
+
+FEATURE_CACHE_DIR = os.environ.get('FINBOT_FEATURE_CACHE', '.finbot_feature_cache')
+RANDOM_STATE = 42
+
+# The model inputs chosen in Loan_defaulter_prediction.ipynb (features_to_keep).
+NUMERIC_FEATURES = ['Age', 'DelaysDays', 'PartialPayments', 'SentimentScore', 'ResponseTimeHours', 'Complaints',
+                    'Dti', 'DigitalEngagement', 'ComplaintRatio', 'DelinquencyScore', 'PaymentRegularity',
+                    'ComplaintsPerInteraction']
+CATEGORICAL_FEATURES = ['Location', 'EmploymentStatus', 'LoanType', 'CustomerPersona']
+TARGET = 'Target'
+# Also cached: the create_features columns the drift baseline is built from.
+CACHED_FEATURES = list(dict.fromkeys(NUMERIC_FEATURES + CATEGORICAL_FEATURES + drift.NUMERIC_FEATURES
+                                     + drift.CATEGORICAL_FEATURES)) + [TARGET]
+
+# The notebook's grids and ensemble weights.
+PARAM_GRIDS = {
+    'lgbm': {'n_estimators': [100, 200], 'learning_rate': [0.05, 0.1], 'num_leaves': [20, 31]},
+    'rf': {'n_estimators': [100, 200], 'max_depth': [10, None], 'min_samples_split': [2, 5]},
+    'xgb': {'n_estimators': [100, 200], 'learning_rate': [0.05, 0.1], 'max_depth': [3, 5]},
+}
+ENSEMBLE_WEIGHTS = {'lgbm': 5, 'rf': 8, 'xgb': 2}
+
+
+def feature_code_hash():
+    # Cached matrices are only reused while the feature code that built them is unchanged.
+    digest = hashlib.sha256()
+    for module in ('feature_engine.py', 'features.py'):
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_features(data_path, cache_dir=FEATURE_CACHE_DIR):
+    # Returns (path of the cached feature matrix, data fingerprint, whether the cache was hit).
+    data_fingerprint = fingerprint(data_path)
+    key = hashlib.sha256((data_fingerprint + feature_code_hash() + ",".join(CACHED_FEATURES)).encode()).hexdigest()[:16]
+    path = os.path.join(cache_dir, f"features-{key}.pkl")
+    if os.path.exists(path):
+        return path, data_fingerprint, True
+    featured = create_features_fast(pd.read_csv(data_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    featured[CACHED_FEATURES].to_pickle(path + '.tmp')
+    os.replace(path + '.tmp', path)
+    return path, data_fingerprint, False
+
+
+def split(y, test_size):
+    # The notebook's stratified hold-out, and 5 stratified folds over the training part.
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+    train, test = train_test_split(np.arange(len(y)), test_size=test_size, random_state=RANDOM_STATE, stratify=y)
+    folds = list(StratifiedKFold(n_splits=5, shuffle=True, random_state=RANDOM_STATE).split(train, y[train]))
+    return train, test, [(train[fit], train[val]) for fit, val in folds]
+
+
+def make_member(name, params, n_jobs=1):
+    if name == 'lgbm':
+        import lightgbm as lgb
+        return lgb.LGBMClassifier(random_state=RANDOM_STATE, verbosity=-1, n_jobs=n_jobs, **params)
+    if name == 'rf':
+        from sklearn.ensemble import RandomForestClassifier
+        return RandomForestClassifier(random_state=RANDOM_STATE, n_jobs=n_jobs, **params)
+    if name == 'xgb':
+        import xgboost as xgb
+        return xgb.XGBClassifier(eval_metric='logloss', random_state=RANDOM_STATE, n_jobs=n_jobs, **params)
+    raise ValueError(f"Unknown ensemble member {name}")
+
+
+def make_pipeline(classifier):
+    # One artifact from raw create_features output to probability: the notebook's scaling and
+    # drop-first dummies as a ColumnTransformer in front of the classifier.
+    from sklearn.compose import ColumnTransformer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
+    preprocessor = ColumnTransformer([
+        ('num', StandardScaler(), NUMERIC_FEATURES),
+        ('cat', OneHotEncoder(drop='first', handle_unknown='ignore'), CATEGORICAL_FEATURES),
+    ])
+    return Pipeline([('preprocessor', preprocessor), ('classifier', classifier)])
+
+
+_worker = {}
+
+
+def _init_worker(features_path, test_size):
+    # Each pool process reads the cached matrix once instead of receiving it with every task.
+    featured = pd.read_pickle(features_path)
+    y = featured.pop(TARGET).to_numpy()
+    _, _, folds = split(y, test_size)
+    _worker.update(X=featured, y=y, folds=folds)
+
+
+def _score_fold(task):
+    from sklearn.metrics import roc_auc_score
+    name, params, fold = task
+    X, y = _worker['X'], _worker['y']
+    fit, val = _worker['folds'][fold]
+    model = make_pipeline(make_member(name, params)).fit(X.iloc[fit], y[fit])
+    return roc_auc_score(y[val], model.predict_proba(X.iloc[val])[:, 1])
+
+
+def race(pool, grids, folds=5, keep=0.5):
+    # Successive halving over CV folds for every member's grid at once: all candidates are
+    # scored on the first fold, the better half (by mean AUC so far) goes on to the next fold,
+    # and so on. Every task of a round runs in parallel across the pool.
+    candidates = [(name, params) for name, grid in grids.items()
+                  for params in (dict(zip(grid, values)) for values in itertools.product(*grid.values()))]
+    scores = {i: [] for i in range(len(candidates))}
+    alive = {name: [i for i, (member, _) in enumerate(candidates) if member == name] for name in grids}
+    fits = 0
+    for fold in range(folds):
+        ids = [i for members in alive.values() for i in members]
+        for i, auc in zip(ids, pool.map(_score_fold, [(*candidates[i], fold) for i in ids])):
+            scores[i].append(auc)
+        fits += len(ids)
+        if fold < folds - 1:
+            for name, members in alive.items():
+                members.sort(key=lambda i: -np.mean(scores[i]))
+                del members[max(1, int(np.ceil(len(members) * keep))):]
+    best = {}
+    for name, members in alive.items():
+        i = max(members, key=lambda i: np.mean(scores[i]))
+        best[name] = {'params': candidates[i][1], 'cv_auc': float(np.mean(scores[i])),
+                      'cv_auc_std': float(np.std(scores[i]))}
+    return best, {'candidates': len(candidates), 'fits': fits, 'full_grid_fits': len(candidates) * folds}
+
+
+def retrain(data_path, workers=None, test_size=0.25, weights=ENSEMBLE_WEIGHTS, cache_dir=FEATURE_CACHE_DIR):
+    # Returns (pipeline, drift baseline); save_pipeline writes both.
+    from sklearn.ensemble import VotingClassifier
+    from sklearn.metrics import accuracy_score, roc_auc_score
+    started = time.perf_counter()
+    features_path, data_fingerprint, cache_hit = load_features(data_path, cache_dir)
+    featured = pd.read_pickle(features_path)
+    y = featured.pop(TARGET).to_numpy()
+    train, test, _ = split(y, test_size)
+    features_seconds = time.perf_counter() - started
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(features_path, test_size)) as pool:
+        best, search = race(pool, PARAM_GRIDS)
+    search_seconds = time.perf_counter() - started - features_seconds
+
+    # The notebook's final model: a soft vote of the tuned members, fitted on the training split.
+    ensemble = VotingClassifier([(name, make_member(name, best[name]['params'], n_jobs=-1)) for name in best],
+                                voting='soft', weights=[weights[name] for name in best])
+    pipeline = make_pipeline(ensemble).fit(featured.iloc[train], y[train])
+    probability = pipeline.predict_proba(featured.iloc[test])[:, 1]
+    # Training inputs, and held-out scores (in-sample forest scores are overconfident). The
+    # fingerprint is the saved model file's, filled in by save_pipeline.
+    baseline = drift.build_drift_baseline(featured.iloc[train], probability, None)
+    created = datetime.now(timezone.utc)
+    pipeline.finbot_metadata = {
+        'version': f"{created:%Y%m%dT%H%M%SZ}-{data_fingerprint[:8]}",
+        'created': created.isoformat(),
+        'data_path': os.path.basename(data_path),
+        'data_fingerprint': data_fingerprint,
+        'rows': int(len(y)),
+        'test_size': test_size,
+        'members': best,
+        'weights': {name: weights[name] for name in best},
+        'metrics': {'test_auc': float(roc_auc_score(y[test], probability)),
+                    'test_accuracy': float(accuracy_score(y[test], probability >= 0.5))},
+        'search': search,
+        'timings': {'features_s': features_seconds, 'feature_cache_hit': cache_hit, 'search_s': search_seconds,
+                    'total_s': time.perf_counter() - started, 'workers': workers},
+    }
+    return pipeline, baseline
+
+
+def save_pipeline(pipeline, out, versions_dir=None, baseline=None):
+    # Writes the pipeline (atomically, so a running app never loads half a file) plus a JSON copy
+    # of its metadata; with versions_dir, a copy named by version is kept there too. The drift
+    # baseline goes next to each copy, keyed on that file's fingerprint.
+    import joblib
+    metadata = pipeline.finbot_metadata
+    targets = [out]
+    if versions_dir:
+        os.makedirs(versions_dir, exist_ok=True)
+        targets.insert(0, os.path.join(versions_dir, f"prediction_pipeline-{metadata['version']}.pkl"))
+    for path in targets:
+        joblib.dump(pipeline, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        with open(os.path.splitext(path)[0] + '.json', 'w') as f:
+            json.dump(metadata, f, indent=2)
+        if baseline is not None:
+            baseline.fingerprint = fingerprint(path)
+            baseline.save(drift.baseline_path(path))
+    return targets
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Retrain the default-risk ensemble into prediction_pipeline.pkl.")
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--out', default='prediction_pipeline.pkl')
+    parser.add_argument('--versions-dir', default='models', help="also keep a copy per version here ('' to skip)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="processes for the CV search")
+    parser.add_argument('--test-size', type=float, default=0.25)
+    parser.add_argument('--cache-dir', default=FEATURE_CACHE_DIR, help="where engineered feature matrices are cached")
+    args = parser.parse_args()
+
+    pipeline, baseline = retrain(args.data, args.workers, args.test_size, cache_dir=args.cache_dir)
+    written = save_pipeline(pipeline, args.out, args.versions_dir, baseline)
+    print(json.dumps({'written': written, **pipeline.finbot_metadata}, indent=2))
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import numpy as np
+from features import assign_intelligent_personas, PERSONA_LABELS
+from feature_engine import create_features_fast
+
+CHUNK_SIZE = 50_000
+FINGERPRINT_FILE = 'fingerprint.txt'
+HASH_SUFFIX = '.fingerprint'
+
+
+def file_hash(path):
+    # SHA-256 of one file, remembered next to it with the size and mtime it was taken at, so an
+    # unchanged file is only stat'ed. The sidecar is optional: a read-only directory just hashes.
+    stat = os.stat(path)
+    sidecar = path + HASH_SUFFIX
+    try:
+        with open(sidecar) as f:
+            cached = json.load(f)
+        if cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+            return cached['sha256']
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    try:
+        with open(sidecar + '.tmp', 'w') as f:
+            json.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest.hexdigest()}, f)
+        os.replace(sidecar + '.tmp', sidecar)
+    except OSError:
+        pass
+    return digest.hexdigest()
+
+
+def fingerprint(*paths):
+    # One file's SHA-256, or a SHA-256 over the files' hashes.
+    hashes = [file_hash(path) for path in paths]
+    if len(hashes) == 1:
+        return hashes[0]
+    return hashlib.sha256("".join(hashes).encode()).hexdigest()
+
+
+def _persona_codes(labels):
+    lookup = {label: code for code, label in enumerate(PERSONA_LABELS)}
+    return np.fromiter((lookup[label] for label in labels), dtype=np.int8, count=len(labels))
+
+
+class RiskTable:
+    # CustomerID -> (probability, base persona, final persona), sorted by CustomerID.
+
+    def __init__(self, keys, probability, base_persona, final_persona, fingerprint):
+        self.keys = keys
+        self.probability = probability
+        self.base_persona = base_persona
+        self.final_persona = final_persona
+        self.fingerprint = fingerprint
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, customer_id):
+        i = np.searchsorted(self.keys, customer_id)
+        if i >= len(self.keys) or self.keys[i] != customer_id:
+            return None
+        return (float(self.probability[i]),
+                PERSONA_LABELS[self.base_persona[i]],
+                PERSONA_LABELS[self.final_persona[i]])
+
+    def save(self, path):
+        # A .npz path gives a single file; any other path a directory of .npy files that load()
+        # memory-maps, so worker processes share one copy through the page cache.
+        arrays = {'keys': self.keys, 'probability': self.probability, 'base_persona': self.base_persona,
+                  'final_persona': self.final_persona}
+        if path.endswith('.npz'):
+            with open(path, 'wb') as f:
+                np.savez(f, fingerprint=np.array(self.fingerprint), **arrays)
+            return
+        os.makedirs(path, exist_ok=True)
+        for name, values in arrays.items():
+            # Replaced rather than rewritten in place: other processes may have the old file mapped.
+            target = os.path.join(path, f"{name}.npy")
+            with open(target + '.tmp', 'wb') as f:
+                np.save(f, values)
+            os.replace(target + '.tmp', target)
+        with open(os.path.join(path, FINGERPRINT_FILE), 'w') as f:
+            f.write(self.fingerprint)
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                return cls(data['keys'], data['probability'], data['base_persona'],
+                           data['final_persona'], str(data['fingerprint']))
+        with open(os.path.join(path, FINGERPRINT_FILE)) as f:
+            fingerprint = f.read()
+        arrays = [np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+                  for name in ('keys', 'probability', 'base_persona', 'final_persona')]
+        return cls(*arrays, fingerprint)
+
+
+def score_frame(pipeline, df):
+    return score_features(pipeline, create_features_fast(df))
+
+
+def score_features(pipeline, featured):
+    probability = pipeline.predict_proba(featured)[:, 1]
+    base_persona = featured['CustomerPersona'].to_numpy(dtype=object)
+    return probability, base_persona, assign_intelligent_personas(base_persona, probability)
+
+
+def build_risk_table(pipeline, store, fingerprint, chunk_size=CHUNK_SIZE, on_scored=None):
+    # Scores in key order so the table shares the store's sorted index. on_scored(featured,
+    # probability) sees each chunk, e.g. DriftMonitor.observe_features.
+    n = len(store)
+    probability = np.empty(n, dtype=np.float32)
+    base_persona = np.empty(n, dtype=np.int8)
+    final_persona = np.empty(n, dtype=np.int8)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk = store.rows(store.order[start:stop], store.keys[start:stop])
+        featured = create_features_fast(chunk)
+        p, base, final = score_features(pipeline, featured)
+        if on_scored is not None:
+            on_scored(featured, p)
+        probability[start:stop] = p
+        base_persona[start:stop] = _persona_codes(base)
+        final_persona[start:stop] = _persona_codes(final)
+    return RiskTable(np.asarray(store.keys), probability, base_persona, final_persona, fingerprint)
+
+
+def load_risk_table(path, pipeline, store, data_path, model_path, on_scored=None):
+    # Reuses the table on disk unless the dataset or the pipeline file has changed.
+    current = fingerprint(data_path, model_path)
+    if path and os.path.exists(path):
+        table = RiskTable.load(path)
+        if table.fingerprint == current and len(table) == len(store):
+            return table
+    table = build_risk_table(pipeline, store, current, on_scored=on_scored)
+    if path:
+        try:
+            table.save(path)
+        except OSError as e:
+            print(f"Warning: could not write risk table to {path}: {e}")
+    return table
+
+
+if __name__ == '__main__':
+    import argparse
+    import joblib
+    from customer_store import load_customer_store
+
+    parser = argparse.ArgumentParser(description="Batch-score the portfolio into a risk table.")
+    parser.add_argument('--data', default='Analytics_loan_collection_dataset.csv')
+    parser.add_argument('--model', default='prediction_pipeline.pkl')
+    parser.add_argument('--out', default='risk_table.npz')
+    parser.add_argument('--store-dir', default=os.environ.get('FINBOT_STORE_DIR'))
+    args = parser.parse_args()
+
+    table = load_risk_table(args.out, joblib.load(args.model), load_customer_store(args.data, args.store_dir),
+                            args.data, args.model)
+    print(f"Risk table ready: {len(table)} customers, fingerprint {table.fingerprint[:12]}")
@@ -0,0 +1,207 @@
+import argparse
+import asyncio
+import gc
+import itertools
+import os
+import re
+import signal
+import sys
+import time
+
+# Defaults that make every worker share one copy of the data: the customer store and risk
+# table are memory-mapped from disk, and events go through a shared append-only log.
+SHARED_DEFAULTS = {
+    'FINBOT_STORE_DIR': '.finbot_store',
+    'FINBOT_RISK_TABLE': '.finbot_risk_table',
+    'FINBOT_EXPLANATIONS': '.finbot_explanations',
+    'FINBOT_EVENT_LOG': '.finbot_events.log',
+}
+STICKY_COOKIE = 'finbot_worker'
+_STICKY = re.compile(rb'(?im)^cookie:[^\r\n]*\b' + STICKY_COOKIE.encode() + rb'=(\d+)')
+
+
+def pss_mb(pid):
+    # Proportional set size: shared pages are split between the processes mapping them.
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Pss:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def preload():
+    for name, value in SHARED_DEFAULTS.items():
+        os.environ.setdefault(name, value)
+    os.environ['FINBOT_STARTUP'] = 'eager'  # no start-up thread may be running at fork time
+    os.environ['FINBOT_LLM_PER_WORKER'] = '1'  # the LLM client is made after fork, in run_worker
+    # Per-worker listeners: worker i takes base port + i, so they're started after fork, not here.
+    side_ports = {name: int(os.environ.pop(f'FINBOT_{name.upper()}_PORT', 0) or 0) for name in ('metrics', 'internal')}
+    import app
+    if app.initial_error_message:
+        raise SystemExit(app.initial_error_message)
+    if app.collection_queue is not None:
+        app.collection_queue.share()
+    # Keep the preloaded objects out of the cyclic GC so workers don't touch (and copy) their pages.
+    gc.collect()
+    gc.freeze()
+    return app, side_ports
+
+
+def run_worker(app, index, host, port, side_ports):
+    # Workers leave through os._exit, which skips atexit, so the audit log is closed here: the
+    # buffered turns reach disk and the live file gets its index before the process goes.
+    def stop(signum, frame):
+        if app.audit_log is not None:
+            app.audit_log.close()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if side_ports['metrics']:
+        app.metrics.start_http_server(side_ports['metrics'] + index)
+    if side_ports['internal']:
+        app.start_internal_api(app.INTERNAL_ROUTES, side_ports['internal'] + index)
+    app.create_llm_client()
+    print(f"FinBot worker {index} (pid {os.getpid()}) serving on {host}:{port}")
+    app.demo.launch(server_name=host, server_port=port, show_api=False)
+
+
+def spawn(app, index, host, port, side_ports):
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, index, host, port, side_ports)
+        except BaseException as e:
+            print(f"FinBot worker {index} exited: {e!r}", file=sys.stderr)
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+async def pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def set_cookie(reader, writer, index):
+    # Adds the worker cookie to the first response on the connection, then passes the rest through.
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        writer.close()
+        return
+    cookie = f"Set-Cookie: {STICKY_COOKIE}={index}; Path=/; HttpOnly; SameSite=Lax\r\n".encode()
+    writer.write(head[:-2] + cookie + b'\r\n')
+    await pipe(reader, writer)
+
+
+async def proxy(host, port, backend_ports):
+    # HTTP pass-through that keeps each browser on one worker. Gradio keeps session state in the
+    # worker process, so all of a session's requests must land on the same one. A connection
+    # goes to the worker named in its finbot_worker cookie; one without the cookie (a browser's
+    # first page load) takes the next worker in turn and is given the cookie. Routing on the
+    # cookie rather than the peer address also spreads clients behind a load balancer or NAT,
+    # which all share one address. Plain HTTP only: terminate TLS in front of it.
+    rotation = itertools.cycle(range(len(backend_ports)))
+
+    async def handle(client_reader, client_writer):
+        try:
+            head = await client_reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            client_writer.close()
+            return
+        sticky = _STICKY.search(head)
+        index = int(sticky.group(1)) if sticky else None
+        assign = index is None or index >= len(backend_ports)
+        if assign:
+            index = next(rotation)
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection('127.0.0.1', backend_ports[index])
+        except OSError:
+            client_writer.close()
+            return
+        upstream_writer.write(head)
+        downstream = set_cookie(upstream_reader, client_writer, index) if assign else pipe(upstream_reader, client_writer)
+        await asyncio.gather(pipe(client_reader, upstream_writer), downstream)
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def supervise(app, workers, host, side_ports, report_after):
+    # Restarts workers that die; they fork from the same preloaded parent, so restarts are fast.
+    started = time.monotonic()
+    reported = False
+    while True:
+        await asyncio.sleep(1)
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            pid = 0
+        if pid and pid in workers:
+            index, port = workers.pop(pid)
+            print(f"FinBot worker {index} (pid {pid}) exited with status {status}; restarting")
+            workers[spawn(app, index, host, port, side_ports)] = (index, port)
+        if not reported and time.monotonic() - started >= report_after:
+            reported = True
+            sizes = {pid: pss_mb(pid) for pid in [os.getpid(), *workers]}
+            if all(size is not None for size in sizes.values()):
+                print(f"FinBot memory (PSS): total {sum(sizes.values()):.0f}MB, "
+                      + ", ".join(f"pid {pid} {size:.0f}MB" for pid, size in sizes.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve FinBot from several pre-forked worker processes.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=7860)
+    parser.add_argument('--no-proxy', action='store_true',
+                        help="skip the built-in sticky proxy; workers listen on port+1.. and the external balancer "
+                             "must keep each client on one worker (sticky sessions by cookie, not by source IP "
+                             "when clients arrive through another proxy)")
+    parser.add_argument('--memory-report-after', type=float, default=15, help="seconds until the PSS report")
+    args = parser.parse_args()
+
+    app, side_ports = preload()
+    worker_host = args.host if args.no_proxy else '127.0.0.1'
+    workers = {}
+    for index in range(args.workers):
+        port = args.port + 1 + index
+        workers[spawn(app, index, worker_host, port, side_ports)] = (index, port)
+
+    def shutdown(*_):
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    async def run():
+        tasks = [supervise(app, workers, worker_host, side_ports, args.memory_report_after)]
+        if not args.no_proxy:
+            ports = [port for _, port in sorted(workers.values())]
+            print(f"FinBot proxy on {args.host}:{args.port} -> {len(ports)} workers")
+            tasks.append(proxy(args.host, args.port, ports))
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_TTL_SECONDS = float(os.environ.get('FINBOT_SESSION_TTL', 1800))
+SESSION_MAX = int(os.environ.get('FINBOT_SESSION_MAX', 10_000))
+SESSION_MEMORY_MB = float(os.environ.get('FINBOT_SESSION_MEMORY_MB', 256))
+
+# Rough per-session cost beyond the chat text: the profile dict with the customer's raw row,
+# its ConversationMemory window and the bookkeeping objects below.
+SESSION_OVERHEAD_BYTES = 16384
+TURN_OVERHEAD_BYTES = sys.getsizeof(object()) + 2 * 8
+
+
+def _text_bytes(text):
+    return sys.getsizeof(text) if text else 0
+
+
+class Turn:
+    __slots__ = ('user', 'bot')
+
+    def __init__(self, user, bot):
+        self.user = user
+        self.bot = bot
+
+    def nbytes(self):
+        return TURN_OVERHEAD_BYTES + _text_bytes(self.user) + _text_bytes(self.bot)
+
+
+class Session:
+    __slots__ = ('profile', 'turns', 'nbytes', 'last_seen')
+
+    def __init__(self, profile, turns, now):
+        self.profile = profile
+        self.turns = turns
+        self.nbytes = SESSION_OVERHEAD_BYTES + sum(turn.nbytes() for turn in turns)
+        self.last_seen = now
+
+    def history(self):
+        # The [user, bot] pairs gr.Chatbot renders and ConversationMemory.sync consumes.
+        return [[turn.user, turn.bot] for turn in self.turns]
+
+
+class SessionStore:
+    # Server-side chat sessions keyed by Gradio session id, so a turn only sends the new message
+    # up instead of the whole transcript. Kept in last-use order: idle sessions expire after the
+    # TTL, and the least recently used go first once the session count or memory cap is exceeded.
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS, max_sessions=SESSION_MAX, memory_mb=SESSION_MEMORY_MB):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = int(memory_mb * 2 ** 20)
+        self.nbytes = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {'opened': 0, 'closed': 0, 'expired': 0, 'evicted_count': 0, 'evicted_memory': 0}
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self.nbytes -= session.nbytes
+        return session
+
+    def _evict(self, now):
+        # Sessions are in last-use order, so expired and least recently used ones are at the front.
+        while self._sessions:
+            session_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_seen > self.ttl:
+                reason = 'expired'
+            elif len(self._sessions) > self.max_sessions:
+                reason = 'evicted_count'
+            elif self.nbytes > self.max_bytes and len(self._sessions) > 1:
+                reason = 'evicted_memory'
+            else:
+                return
+            self._drop(session_id)
+            self.metrics[reason] += 1
+
+    def open(self, session_id, profile, greeting):
+        # Starts (or restarts, on a new profile load) the session with FinBot's greeting.
+        now = time.monotonic()
+        session = Session(profile, [Turn(None, greeting)], now)
+        with self._lock:
+            self._drop(session_id)
+            self._sessions[session_id] = session
+            self.nbytes += session.nbytes
+            self.metrics['opened'] += 1
+            self._evict(now)
+        return session
+
+    def get(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_seen = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def add_turn(self, session_id, user, bot=None):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            turn = Turn(user, bot)
+            session.turns.append(turn)
+            session.nbytes += turn.nbytes()
+            self.nbytes += turn.nbytes()
+            self._evict(time.monotonic())
+            return session
+
+    def set_reply(self, session_id, index, bot):
+        # Fills in FinBot's reply to turn `index` once it has finished (or stopped) streaming.
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or index >= len(session.turns):
+                return
+            turn = session.turns[index]
+            before = turn.nbytes()
+            turn.bot = bot
+            session.nbytes += turn.nbytes() - before
+            self.nbytes += turn.nbytes() - before
+
+    def close(self, session_id):
+        with self._lock:
+            if self._drop(session_id) is not None:
+                self.metrics['closed'] += 1
+
+    def stats(self):
+        with self._lock:
+            self._evict(time.monotonic())
+            return dict(self.metrics, sessions=len(self._sessions), memory_mb=self.nbytes / 2 ** 20)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import random
+    import tracemalloc
+
+    parser = argparse.ArgumentParser(description="Fill a session store with synthetic chats and report its footprint.")
+    parser.add_argument('--sessions', type=int, default=20_000)
+    parser.add_argument('--turns', type=int, default=12)
+    parser.add_argument('--memory-mb', type=float, default=SESSION_MEMORY_MB)
+    parser.add_argument('--max-sessions', type=int, default=SESSION_MAX)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    words = "payment emi link split defer job lost salary week month today waiver fee charged twice".split()
+    tracemalloc.start()
+    store = SessionStore(max_sessions=args.max_sessions, memory_mb=args.memory_mb)
+    start = time.perf_counter()
+    for s in range(args.sessions):
+        session_id = f"session-{s}"
+        store.open(session_id, {'customer_id': f"CUST{s:07d}"}, "FinBot: Hello, I'm FinBot. How can I help you today?")
+        for _ in range(args.turns):
+            store.add_turn(session_id, " ".join(rng.choices(words, k=10)))
+            store.set_reply(session_id, -1, " ".join(rng.choices(words, k=40)))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    print(json.dumps({
+        'sessions_opened': args.sessions,
+        'turns_per_session': args.turns,
+        'turns_per_s': args.sessions * args.turns / elapsed,
+        'traced_peak_mb': peak / 2 ** 20,
+        **store.stats(),
+    }, indent=2))
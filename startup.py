@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+STARTUP_WAIT = float(os.environ.get('FINBOT_STARTUP_WAIT', 30))
+
+
+class StagedStartup:
+    # Runs the slow parts of app start-up (model, data, LLM client and their imports) in order
+    # on a background thread so the UI can be served while they load. Handlers check `ready`
+    # or `wait()` before touching anything a stage sets up.
+
+    def __init__(self, stages):
+        self.stages = stages
+        self.timings = {}
+        self.current = None
+        self.error = None
+        self.failed_stage = None
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._thread = None
+
+    def start(self, background=True):
+        if self.started_at is not None:
+            return self
+        self.started_at = time.perf_counter()
+        if background:
+            self._thread = threading.Thread(target=self._run, name='finbot-startup', daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+        return self
+
+    def _run(self):
+        try:
+            for name, stage in self.stages:
+                self.current = name
+                start = time.perf_counter()
+                stage()
+                self.timings[name] = time.perf_counter() - start
+        except Exception as e:
+            self.error = e
+            self.failed_stage = self.current
+            print(f"FinBot startup failed during '{self.current}': {e!r}")
+        finally:
+            self.finished_at = time.perf_counter()
+            self.current = None
+            stages = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.timings.items())
+            print(f"FinBot startup finished in {(self.finished_at - self.started_at) * 1000:.0f}ms: {stages}")
+            self._done.set()
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def status(self):
+        return {
+            'ready': self.ready,
+            'stage': self.current,
+            'error': repr(self.error) if self.error else None,
+            'failed_stage': self.failed_stage,
+            'stage_seconds': dict(self.timings),
+            'total_seconds': (self.finished_at - self.started_at) if self.finished_at else None,
+        }
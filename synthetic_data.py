@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+LOCATIONS = ['Rural', 'Suburban', 'Urban']
+EMPLOYMENT_STATUSES = ['Salaried', 'Self-Employed', 'Student', 'Unemployed']
+LOAN_TYPES = ['Business', 'Education', 'Home', 'Personal']
+
+
+def _categorical(rng, labels, n, categorical):
+    values = pd.Categorical.from_codes(rng.integers(0, len(labels), n), labels)
+    return values if categorical else np.asarray(values, dtype=object)
+
+
+def make_portfolio(n, seed=0, categorical=True, with_ids=True):
+    # Same columns and value ranges as Analytics_loan_collection_dataset.csv. categorical=False
+    # gives object string columns like pd.read_csv does, at a much higher memory cost.
+    rng = np.random.default_rng(seed)
+    data = {}
+    if with_ids:
+        data['CustomerID'] = 'CUST' + pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(max(4, len(str(n))))
+    data.update({
+        'Age': rng.integers(21, 66, n),
+        'Income': rng.integers(200_000, 2_000_000, n),
+        'Location': _categorical(rng, LOCATIONS, n, categorical),
+        'EmploymentStatus': _categorical(rng, EMPLOYMENT_STATUSES, n, categorical),
+        'LoanAmount': rng.integers(50_000, 1_000_000, n),
+        'TenureMonths': rng.integers(6, 61, n),
+        'InterestRate': np.round(rng.uniform(8, 16, n), 2),
+        'LoanType': _categorical(rng, LOAN_TYPES, n, categorical),
+        'MissedPayments': rng.integers(0, 5, n),
+        'DelaysDays': rng.integers(0, 181, n),
+        'PartialPayments': rng.integers(0, 5, n),
+        'InteractionAttempts': rng.integers(0, 10, n),
+        'SentimentScore': np.round(rng.uniform(-1, 1, n), 2),
+        'ResponseTimeHours': np.round(rng.uniform(1, 72, n), 2),
+        'AppUsageFrequency': np.round(rng.uniform(0, 1, n), 2),
+        'WebsiteVisits': rng.integers(0, 40, n),
+        'Complaints': rng.integers(0, 4, n),
+        'Target': rng.integers(0, 2, n),
+    })
+    return pd.DataFrame(data)
@@ -0,0 +1,36 @@
+import os
+import sys
+
+# The modules live flat at the repository root.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pytest
+from customer_store import CustomerStore
+from synthetic_data import make_portfolio
+
+
+class DelinquencyModel:
+    # A fixed logistic score over a few engineered features: deterministic and fast, with the
+    # predict_proba interface the app, risk table and event ingestor call.
+
+    def predict_proba(self, featured):
+        z = (0.02 * featured['DelaysDays'].to_numpy(dtype=float) + 0.5 * featured['MissedPayments'].to_numpy(dtype=float)
+             + 0.3 * featured['Complaints'].to_numpy(dtype=float) - 0.5 * featured['SentimentScore'].to_numpy(dtype=float) - 3)
+        p = 1 / (1 + np.exp(-z))
+        return np.column_stack([1 - p, p])
+
+
+@pytest.fixture
+def model():
+    return DelinquencyModel()
+
+
+@pytest.fixture
+def portfolio():
+    return make_portfolio(300)
+
+
+@pytest.fixture
+def store(portfolio):
+    return CustomerStore.from_frame(portfolio)
@@ -0,0 +1,49 @@
+import glob
+import gzip
+import json
+import os
+from audit_log import INDEX_SUFFIX, AuditLog, customer_history
+
+
+def audit_files(directory):
+    return sorted(glob.glob(os.path.join(directory, 'audit-*.jsonl.gz')))
+
+
+def test_close_flushes_buffered_turns_and_writes_the_index(tmp_path):
+    log = AuditLog(str(tmp_path), batch_size=100, flush_seconds=60)
+    for i in range(10):
+        log.record(customer_id=f"C{i % 2}", user=f"message {i}", response="reply")
+    assert log.stats()['buffered'] == 10
+    log.close()
+    [path] = audit_files(tmp_path)
+    assert os.path.exists(path + INDEX_SUFFIX)
+    with gzip.open(path, 'rt') as f:
+        users = [user for line in f for user in json.loads(line)['user']]
+    assert users == [f"message {i}" for i in range(10)]
+    assert [turn['user'] for turn in customer_history('C1', str(tmp_path))] == [f"message {i}" for i in range(1, 10, 2)]
+
+
+def test_full_buffer_writes_instead_of_dropping(tmp_path):
+    log = AuditLog(str(tmp_path), capacity=20, batch_size=8, flush_seconds=60)
+    for i in range(100):
+        log.record(customer_id='C', user=str(i))
+    stats = log.stats()
+    assert stats['inline_writes'] > 0
+    assert stats['buffered'] < 20
+    log.close()
+    assert log.stats()['written'] == 100
+    assert [turn['user'] for turn in customer_history('C', str(tmp_path))] == [str(i) for i in range(100)]
+
+
+def test_failed_writes_keep_the_turns(tmp_path):
+    blocker = tmp_path / 'not-a-directory'
+    blocker.write_text("")
+    log = AuditLog(str(blocker / 'audit'), capacity=5, batch_size=2, flush_seconds=60)
+    for i in range(12):
+        log.record(customer_id='C', user=str(i))
+    stats = log.stats()
+    assert stats['write_errors'] >= 1
+    assert stats['written'] == 0 and stats['buffered'] == 12
+    log.directory = str(tmp_path / 'audit')
+    log.close()
+    assert [turn['user'] for turn in customer_history('C', log.directory)] == [str(i) for i in range(12)]
@@ -0,0 +1,61 @@
+import time
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from collection_queue import CollectionQueue, build_collection_queue
+from risk_table import score_frame
+
+KEYS = np.array(['A', 'B', 'C', 'D', 'E'])
+
+
+def make_queue(lease_seconds=3600):
+    return CollectionQueue(KEYS, [5.0, 1.0, 4.0, 2.0, 3.0], lease_seconds=lease_seconds)
+
+
+def test_pop_hands_out_the_highest_priority_first():
+    queue = make_queue()
+    assert queue.top(3) == [('A', 5.0), ('C', 4.0), ('E', 3.0)]
+    assert queue.pop(2) == [('A', 5.0), ('C', 4.0)]
+    assert len(queue) == 3
+    assert queue.top(5) == [('E', 3.0), ('D', 2.0), ('B', 1.0)]
+
+
+def test_release_requeues_a_claimed_account():
+    queue = make_queue()
+    queue.pop(1)
+    assert queue.release('A')
+    assert not queue.release('A')
+    assert queue.pop(1) == [('A', 5.0)]
+
+
+def test_expired_lease_requeues_the_account():
+    queue = make_queue(lease_seconds=0.05)
+    assert queue.pop(1) == [('A', 5.0)]
+    assert 'A' not in dict(queue.top(5))
+    time.sleep(1.1)  # leases are checked at most once a second
+    assert queue.top(1) == [('A', 5.0)]
+    assert len(queue) == 5
+
+
+def test_update_reprioritises_queued_accounts():
+    queue = make_queue()
+    queue.update('B', 10.0)
+    assert queue.top(1) == [('B', 10.0)]
+    assert not queue.update('Z', 1.0)
+
+
+def test_rescore_requeues_a_claimed_account_at_its_new_priority():
+    queue = make_queue()
+    queue.pop(1)
+    queue.update('A', 0.5)
+    assert 'A' not in dict(queue.top(5))
+    queue.update('A', 0.5, requeue=True)
+    assert queue.top(5)[-1] == ('A', 0.5)
+
+
+def test_built_queue_orders_by_expected_recovery(store, model):
+    probability = score_frame(model, store.rows(store.order, store.keys))[0]
+    queue = build_collection_queue(store, SimpleNamespace(probability=probability))
+    top = queue.top(20)
+    assert [priority for _, priority in top] == sorted((priority for _, priority in top), reverse=True)
+    assert top[0][1] == pytest.approx(queue.priority.max())
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from customer_store import KEY_COLUMN, CustomerStore, load_customer_store
+from synthetic_data import make_portfolio
+
+
+def portfolio_with_gaps(n=500):
+    df = make_portfolio(n, categorical=False)
+    rng = np.random.default_rng(0)
+    for name in ['Location', 'EmploymentStatus', 'LoanType', 'SentimentScore']:
+        df.loc[rng.random(len(df)) < 0.1, name] = np.nan
+    return df
+
+
+def restored_frame(store):
+    return store.rows(store.order, store.keys).set_index(KEY_COLUMN)
+
+
+def assert_same_rows(store, df):
+    restored = restored_frame(store)
+    expected = df.set_index(KEY_COLUMN).loc[restored.index]
+    for name in expected.columns:
+        assert expected[name].reset_index(drop=True).equals(restored[name].reset_index(drop=True)), name
+
+
+def test_round_trip_in_memory_keeps_missing_values():
+    df = portfolio_with_gaps()
+    assert_same_rows(CustomerStore.from_frame(df), df)
+
+
+def test_round_trip_on_disk_keeps_missing_values(tmp_path):
+    df = portfolio_with_gaps()
+    CustomerStore.from_frame(df).save(tmp_path)
+    store = CustomerStore.open(tmp_path)
+    assert_same_rows(store, df)
+    assert restored_frame(store)['Location'].isna().sum() == df['Location'].isna().sum()
+
+
+def test_missing_category_decodes_to_nan_not_last_label():
+    df = pd.DataFrame({KEY_COLUMN: ['C2', 'C1', 'C3'], 'Location': ['Urban', np.nan, 'Rural'], 'Age': [30, 40, 50]})
+    store = CustomerStore.from_frame(df)
+    row = store.get('C1')
+    assert pd.isna(row['Location'].iat[0])
+    assert store.get('C3')['Location'].iat[0] == 'Rural'
+
+
+def test_lookup_by_customer_id():
+    df = portfolio_with_gaps(50)
+    store = CustomerStore.from_frame(df)
+    customer_id = df[KEY_COLUMN].iat[17]
+    row = store.get(customer_id)
+    assert row[KEY_COLUMN].iat[0] == customer_id
+    assert row['Age'].iat[0] == df['Age'].iat[17]
+    assert store.get('NOPE') is None
+    assert 'NOPE' not in store
+
+
+def test_load_customer_store_matches_csv(tmp_path):
+    df = portfolio_with_gaps(200)
+    csv_path = tmp_path / 'data.csv'
+    df.to_csv(csv_path, index=False)
+    expected = pd.read_csv(csv_path)
+    memory = load_customer_store(str(csv_path))
+    disk = load_customer_store(str(csv_path), str(tmp_path / 'store'))
+    for store in (memory, disk):
+        assert_same_rows(store, expected)
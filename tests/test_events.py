@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+from events import EventIngestor, EventLog, validate_event
+from risk_table import score_frame
+
+
+def customer(store, i=0):
+    return str(store.keys[i])
+
+
+def assert_scored_from_current_row(ingestor, model, customer_id):
+    probability, base, final = score_frame(model, ingestor.current_row(customer_id))
+    assert ingestor.lookup(customer_id) == pytest.approx((float(probability[0]), base[0], final[0]))
+
+
+def test_add_events_accumulate_in_the_overlay(store, model):
+    ingestor = EventIngestor(store, model)
+    customer_id = customer(store)
+    before = int(store.get(customer_id)['MissedPayments'].iat[0])
+    ingestor.submit([{'customer_id': customer_id, 'type': 'payment_missed'}] * 2)
+    assert int(ingestor.current_row(customer_id)['MissedPayments'].iat[0]) == before + 2
+    ingestor.submit([{'customer_id': customer_id, 'type': 'payment_missed'}])
+    assert int(ingestor.current_row(customer_id)['MissedPayments'].iat[0]) == before + 3
+    assert_scored_from_current_row(ingestor, model, customer_id)
+
+
+def test_set_events_apply_in_arrival_order(store, model):
+    ingestor = EventIngestor(store, model)
+    customer_id = customer(store, 5)
+    ingestor.submit([{'customer_id': customer_id, 'type': 'delay_updated', 'delay_days': 45},
+                     {'customer_id': customer_id, 'type': 'payment_posted'}])
+    assert int(ingestor.current_row(customer_id)['DelaysDays'].iat[0]) == 0
+    ingestor.submit([{'customer_id': customer_id, 'type': 'delay_updated', 'delay_days': 12}])
+    assert int(ingestor.current_row(customer_id)['DelaysDays'].iat[0]) == 12
+    assert_scored_from_current_row(ingestor, model, customer_id)
+
+
+def test_overlays_leave_other_customers_and_the_store_alone(store, model):
+    ingestor = EventIngestor(store, model)
+    touched, untouched = customer(store, 1), customer(store, 2)
+    stored = store.get(touched)['Complaints'].iat[0]
+    ingestor.submit([{'customer_id': touched, 'type': 'complaint_logged'}])
+    ingestor.flush()
+    assert ingestor.lookup(untouched) is None
+    assert store.get(touched)['Complaints'].iat[0] == stored
+    overrides, scores = ingestor.snapshot()
+    assert overrides == {touched: {'Complaints': stored + 1}}
+    assert set(scores) == {touched}
+
+
+def test_listeners_see_each_rescored_batch(store, model):
+    ingestor = EventIngestor(store, model)
+    seen = []
+    ingestor.listeners.append(lambda ids, frame, probability: seen.append((list(ids), len(frame), len(probability))))
+    ids = [customer(store, i) for i in range(3)]
+    ingestor.submit([{'customer_id': c, 'type': 'website_visit'} for c in ids])
+    ingestor.flush()
+    assert seen == [(ids, 3, 3)]
+
+
+def test_invalid_events_are_rejected(store, model):
+    ingestor = EventIngestor(store, model)
+    result = ingestor.submit([
+        {'customer_id': 'NOPE', 'type': 'payment_missed'},
+        {'customer_id': customer(store), 'type': 'teleported'},
+        {'customer_id': customer(store), 'type': 'delay_updated'},
+        {'customer_id': customer(store), 'type': 'sentiment', 'score': True},
+        {'customer_id': customer(store), 'type': 'sentiment', 'score': -0.5},
+    ])
+    assert result['accepted'] == 1
+    assert [r['index'] for r in result['rejected']] == [0, 1, 2, 3]
+    assert validate_event("not an object") == "event must be an object"
+
+
+def test_shared_log_reaches_every_ingestor(store, model, tmp_path):
+    path = str(tmp_path / 'events.log')
+    writer = EventIngestor(store, model, log=EventLog(path))
+    reader = EventIngestor(store, model, log=EventLog(path))
+    customer_id = customer(store, 7)
+    writer.submit([{'customer_id': customer_id, 'type': 'sentiment', 'score': -0.9}])
+    assert reader.lookup(customer_id) == pytest.approx(writer.lookup(customer_id))
+    assert np.isclose(reader.current_row(customer_id)['SentimentScore'].iat[0], -0.9)
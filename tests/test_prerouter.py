@@ -0,0 +1,47 @@
+import pytest
+from prerouter import PHASE0_CLOSED_RESPONSE, PHASE0_RESPONSE, preroute, route_message
+from prompts import PromptBuilder, static_prefix
+
+HIGH_RISK = {'persona': 'Aggrieved High-Risk', 'probability': 0.8}
+LOW_RISK = {'persona': 'Reliable Payer', 'probability': 0.1}
+
+
+def test_critical_trigger_answers_without_the_llm():
+    profile = dict(LOW_RISK)
+    assert preroute("I am recording this conversation for my lawyer", profile) == ('P0_CRITICAL', PHASE0_RESPONSE)
+    assert profile['phase'] == 'P0_CRITICAL'
+
+
+def test_session_stays_closed_after_a_hard_stop():
+    profile = dict(LOW_RISK)
+    preroute("I will file a formal complaint with the ombudsman", profile)
+    assert preroute("ok, so how much do I pay?", profile) == ('P0_CRITICAL', PHASE0_CLOSED_RESPONSE)
+
+
+@pytest.mark.parametrize('message, phase', [
+    ("I have a power of attorney for this account", 'P0_LEGAL'),
+    ("please pay into my friend's account", 'P0_3_PHISH'),
+    ("this is my father's loan", 'P0_2_PRIVACY'),
+    ("your interest rates are predatory", 'P0_1_ETHICS'),
+    ("I was charged twice this month", 'P1_COMPLAINT'),
+    ("when is my next payment due?", None),
+])
+def test_other_phases_go_to_the_llm(message, phase):
+    assert preroute(message, dict(LOW_RISK)) == (phase, None)
+
+
+def test_concession_blocker_only_for_high_risk_personas():
+    assert route_message("can you waive the late fee", HIGH_RISK) == 'P0_9_HR_BLOCK'
+    assert route_message("can you waive the late fee", LOW_RISK) is None
+
+
+def test_critical_outranks_other_phases():
+    assert route_message("my lawyer says the interest is predatory", LOW_RISK) == 'P0_CRITICAL'
+
+
+def test_scripted_phases_get_the_prompt_without_playbooks():
+    builder = PromptBuilder(scope='persona')
+    policy_only = static_prefix(())
+    assert builder.prefix('General', 'P0_2_PRIVACY') == policy_only
+    assert builder.prefix('General', 'P1_COMPLAINT') == builder.prefix('General')
+    assert len(policy_only[0]) < len(builder.prefix('General')[0])
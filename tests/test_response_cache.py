@@ -0,0 +1,63 @@
+from datetime import date
+from response_cache import ResponseCache, render_fields, templatize_fields
+
+TODAY = date(2026, 10, 17)
+PROFILE = {'persona': 'General', 'probability': 0.5, 'plan_shape': (True, True, True, False)}
+STATE = {'offer_level': 1}
+
+
+def fields(emi, due_day):
+    return {'emi': emi, 'pay_now': emi + 200, 'late_fee': 200, 'grace_days': 5, 'due': date(2026, 10, due_day)}
+
+
+def test_different_histories_never_share_a_reply():
+    cache = ResponseCache()
+    first = cache.make_key(PROFILE, None, "ok", STATE, "User: my salary is late this month")
+    second = cache.make_key(PROFILE, None, "ok", STATE, "User: I was in hospital last week")
+    assert first != second
+    cache.put(first, "Sorry to hear about the salary delay.", TODAY, fields(8000, 3))
+    assert cache.get(second, TODAY, fields(4500, 1)) is None
+    assert cache.get(first, TODAY, fields(8000, 3)) == "Sorry to hear about the salary delay."
+
+
+def test_turns_without_history_share_a_reply():
+    cache = ResponseCache()
+    key = cache.make_key(PROFILE, None, "Hello!", STATE)
+    assert key == cache.make_key(dict(PROFILE, customer_id='other'), None, "hello", STATE, "")
+    cache.put(key, "Hello, how can I help?", TODAY)
+    assert cache.get(key, TODAY) == "Hello, how can I help?"
+
+
+def test_key_separates_persona_risk_bucket_phase_and_plan_shape():
+    cache = ResponseCache()
+    key = cache.make_key(PROFILE, None, "hi", STATE)
+    assert key != cache.make_key(dict(PROFILE, persona='Critical Risk'), None, "hi", STATE)
+    assert key != cache.make_key(dict(PROFILE, probability=0.9), None, "hi", STATE)
+    assert key != cache.make_key(PROFILE, 'P1_COMPLAINT', "hi", STATE)
+    assert key != cache.make_key(dict(PROFILE, plan_shape=(False, False, False, False)), None, "hi", STATE)
+
+
+def test_plan_amounts_are_filled_in_for_the_asking_customer():
+    cache = ResponseCache()
+    key = cache.make_key(PROFILE, None, "how much do i owe", STATE)
+    cache.put(key, "Your EMI is ₹8,000; pay 8200 today (8000 rupees plus the fee) by October 3rd.",
+              TODAY, fields(8000, 3))
+    assert cache.get(key, TODAY, fields(4500, 1)) == \
+        "Your EMI is ₹4,500; pay 4700 today (4500 rupees plus the fee) by October 1st."
+
+
+def test_replies_with_unknown_numbers_are_not_cached():
+    cache = ResponseCache()
+    key = cache.make_key(PROFILE, None, "can i pay less", STATE)
+    cache.put(key, "You could pay 3500 now.", TODAY, fields(8000, 3))
+    assert cache.get(key, TODAY, fields(8000, 3)) is None
+    assert cache.stats()['uncacheable'] == 1
+
+
+def test_numbers_the_customer_said_are_kept():
+    template = templatize_fields("Yes, 3500 now works.", fields(8000, 3), "can i pay 3500 now")
+    assert template == "Yes, 3500 now works."
+
+
+def test_render_fails_when_the_plan_lacks_a_value():
+    assert render_fields("Defer until [[deferral_by:full]].", {'emi': 100}) is None